@@ -0,0 +1,357 @@
+"""
+Compares a `benchmarks/suite.py` run against a stored baseline, and exits
+non-zero if anything regressed:
+
+    * latency -- the median is slower by more than `--latency`, and the samples
+      are slower with a one-sided Mann-Whitney U test at `--alpha`
+    * throughput -- the same test, on the ops/sec and MB/sec
+    * peak RSS -- grew by more than `--rss`, and by at least `--rss-min-bytes`;
+      there is one measurement per run, so there is no test
+    * output bytes -- any size grew by more than `--bytes`, or is missing; the
+      encoders are deterministic, so there is no test either
+    * a benchmark that errors in the run but not in the baseline
+
+A benchmark in the baseline but not in the run (e.g. a `-k` run) is a warning.
+
+Thresholds are fractions; `--bytes 0.02` allows 2%.
+
+If the corpus digests differ (a new Pillow can encode the corpus differently),
+a warning is printed; the results are still compared.
+
+usage:
+
+    python benchmarks/suite.py --output baseline.json
+    # ... upgrade, change code ...
+    python benchmarks/suite.py --output current.json
+    python benchmarks/compare.py baseline.json current.json --bytes 0.01
+
+exit codes: 0, no regressions; 1, regressions; 2, the files are unusable.
+"""
+
+# stdlib
+import argparse
+import itertools
+import json
+import math
+import sys
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Sequence
+
+# ==============================================================================
+
+# above this many orderings, `mann_whitney_u` uses the normal approximation
+EXACT_PERMUTATIONS_MAX = 20000
+
+
+def _ranks(values: Sequence[float]) -> List[float]:
+    """ranks, starting at 1; ties get the mean of their ranks"""
+    ordered = sorted(range(len(values)), key=lambda idx: values[idx])
+    ranks = [0.0] * len(values)
+    idx = 0
+    while idx < len(ordered):
+        end = idx
+        while (end + 1 < len(ordered)) and (
+            values[ordered[end + 1]] == values[ordered[idx]]
+        ):
+            end += 1
+        for _idx in range(idx, end + 1):
+            ranks[ordered[_idx]] = (idx + end) / 2 + 1
+        idx = end + 1
+    return ranks
+
+
+def _binomial(n: int, k: int) -> int:
+    """`math.comb`, which is not in Python 3.7"""
+    k = min(k, n - k)
+    if k < 0:
+        return 0
+    result = 1
+    for idx in range(1, k + 1):
+        result = result * (n - k + idx) // idx
+    return result
+
+
+def mann_whitney_u(baseline: Sequence[float], current: Sequence[float]) -> float:
+    """
+    one-sided Mann-Whitney U test; returns the p-value of `current` being
+    larger than `baseline`.
+
+    exact (by enumerating the orderings of the pooled ranks) for small samples,
+    otherwise the normal approximation with a tie correction
+    """
+    n1 = len(baseline)
+    n2 = len(current)
+    if not n1 or not n2:
+        return 1.0
+    ranks = _ranks(list(baseline) + list(current))
+    # U of `current`; large if `current` ranks above `baseline`
+    u_current = sum(ranks[n1:]) - n2 * (n2 + 1) / 2
+
+    if _binomial(n1 + n2, n2) <= EXACT_PERMUTATIONS_MAX:
+        extreme = 0
+        total = 0
+        for combination in itertools.combinations(ranks, n2):
+            total += 1
+            if sum(combination) - n2 * (n2 + 1) / 2 >= u_current - 1e-9:
+                extreme += 1
+        return extreme / total
+
+    n = n1 + n2
+    mean = n1 * n2 / 2
+    ties = 0.0
+    for rank in set(ranks):
+        t = ranks.count(rank)
+        ties += t**3 - t
+    variance = (n1 * n2 / 12) * ((n + 1) - ties / (n * (n - 1)))
+    if variance <= 0:
+        return 1.0
+    # continuity correction
+    z = (u_current - mean - 0.5) / math.sqrt(variance)
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def _change(baseline: Optional[float], current: Optional[float]) -> Optional[float]:
+    """the relative change, `0.05` is 5% larger"""
+    if (baseline is None) or (current is None) or not baseline:
+        return None
+    return (current - baseline) / baseline
+
+
+class Thresholds(object):
+    def __init__(
+        self,
+        latency: float = 0.05,
+        throughput: float = 0.05,
+        rss: float = 0.10,
+        rss_min_bytes: int = 1048576,
+        bytes: float = 0.02,
+        alpha: float = 0.05,
+    ):
+        self.latency = latency
+        self.throughput = throughput
+        self.rss = rss
+        self.rss_min_bytes = rss_min_bytes
+        self.bytes = bytes
+        self.alpha = alpha
+
+
+def compare_benchmark(
+    baseline: Dict[str, Any],
+    current: Dict[str, Any],
+    thresholds: Thresholds,
+) -> List[Dict[str, Any]]:
+    """
+    compares one benchmark; returns a list of findings, each a `dict` of
+    `{"metric", "baseline", "current", "change", "regression"}`, with a
+    `p_value` if the samples were tested
+    """
+    findings: List[Dict[str, Any]] = []
+    if "samples" not in baseline:
+        # skipped or failed in the baseline; nothing to compare
+        return findings
+    if "samples" not in current:
+        findings.append(
+            {
+                "metric": "status",
+                "baseline": "ok",
+                "current": current.get("error") or current.get("skipped"),
+                "change": None,
+                # a tool that is not installed here is not a regression
+                "regression": "error" in current,
+            }
+        )
+        return findings
+
+    # `current` is slower; the same ranks, so the same p-value, for throughput
+    p_value = mann_whitney_u(baseline["samples"], current["samples"])
+    significant = p_value < thresholds.alpha
+
+    change = _change(baseline["median"], current["median"])
+    findings.append(
+        {
+            "metric": "latency",
+            "baseline": baseline["median"],
+            "current": current["median"],
+            "change": change,
+            "p_value": p_value,
+            "regression": bool(
+                significant and (change is not None) and change > thresholds.latency
+            ),
+        }
+    )
+    for metric in ("ops_per_second", "mb_per_second"):
+        change = _change(baseline.get(metric), current.get(metric))
+        if change is None:
+            continue
+        findings.append(
+            {
+                "metric": metric,
+                "baseline": baseline[metric],
+                "current": current[metric],
+                "change": change,
+                "p_value": p_value,
+                "regression": significant and -change > thresholds.throughput,
+            }
+        )
+
+    change = _change(baseline.get("peak_rss"), current.get("peak_rss"))
+    if change is not None:
+        grew = current["peak_rss"] - baseline["peak_rss"]
+        findings.append(
+            {
+                "metric": "peak_rss",
+                "baseline": baseline["peak_rss"],
+                "current": current["peak_rss"],
+                "change": change,
+                "regression": (change > thresholds.rss)
+                and (grew >= thresholds.rss_min_bytes),
+            }
+        )
+
+    output_baseline = baseline.get("output_bytes") or {}
+    output_current = current.get("output_bytes") or {}
+    for size in sorted(output_baseline):
+        if size not in output_current:
+            # the size was not written at all
+            findings.append(
+                {
+                    "metric": "output_bytes/%s" % size,
+                    "baseline": output_baseline[size],
+                    "current": None,
+                    "change": None,
+                    "regression": True,
+                }
+            )
+            continue
+        change = _change(output_baseline[size], output_current[size])
+        if change is None:
+            continue
+        findings.append(
+            {
+                "metric": "output_bytes/%s" % size,
+                "baseline": output_baseline[size],
+                "current": output_current[size],
+                "change": change,
+                "regression": change > thresholds.bytes,
+            }
+        )
+    return findings
+
+
+def compare(
+    baseline: Dict[str, Any],
+    current: Dict[str, Any],
+    thresholds: Thresholds,
+) -> Dict[str, Any]:
+    """
+    compares two runs of `suite.py`; returns
+    `{"warnings": [...], "benchmarks": {name: [finding, ...]}, "regressions": int}`
+    """
+    warnings = []
+    digest_baseline = baseline.get("meta", {}).get("corpus_digest")
+    digest_current = current.get("meta", {}).get("corpus_digest")
+    if digest_baseline != digest_current:
+        warnings.append(
+            "the corpus differs from the baseline's (%s != %s)"
+            % (digest_baseline, digest_current)
+        )
+    results = {}
+    regressions = 0
+    benchmarks_current = current.get("benchmarks", {})
+    for name, result in sorted(baseline.get("benchmarks", {}).items()):
+        if name not in benchmarks_current:
+            if "samples" in result:
+                warnings.append("`%s` is not in the run" % name)
+            continue
+        findings = compare_benchmark(result, benchmarks_current[name], thresholds)
+        regressions += sum(1 for finding in findings if finding["regression"])
+        results[name] = findings
+    return {"warnings": warnings, "benchmarks": results, "regressions": regressions}
+
+
+def _format_value(metric: str, value: Any) -> str:
+    if isinstance(value, float):
+        if metric == "latency":
+            return "%.2fms" % (value * 1000)
+        return "%.2f" % value
+    return str(value)
+
+
+def report(comparison: Dict[str, Any], verbose: bool = False) -> str:
+    """a human readable summary; only the regressions, unless `verbose`"""
+    lines = ["warning: %s" % warning for warning in comparison["warnings"]]
+    for name, findings in comparison["benchmarks"].items():
+        for finding in findings:
+            if not (finding["regression"] or verbose):
+                continue
+            change = finding["change"]
+            line = "%s %s %s: %s -> %s" % (
+                "REGRESSION" if finding["regression"] else "ok        ",
+                name,
+                finding["metric"],
+                _format_value(finding["metric"], finding["baseline"]),
+                _format_value(finding["metric"], finding["current"]),
+            )
+            if change is not None:
+                line += " (%+.1f%%)" % (change * 100)
+            if "p_value" in finding:
+                line += " p=%.3f" % finding["p_value"]
+            lines.append(line)
+    lines.append("%s regression(s)" % comparison["regressions"])
+    return "\n".join(lines)
+
+
+def _load(path: str) -> Dict[str, Any]:
+    with open(path, "r") as fh:
+        data = json.load(fh)
+    if not isinstance(data, dict) or not isinstance(data.get("benchmarks"), dict):
+        raise ValueError("not the output of `benchmarks/suite.py`")
+    return data
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("baseline", help="the stored baseline JSON")
+    parser.add_argument("current", help="the JSON of the run to check")
+    parser.add_argument("--latency", type=float, default=Thresholds().latency)
+    parser.add_argument("--throughput", type=float, default=Thresholds().throughput)
+    parser.add_argument("--rss", type=float, default=Thresholds().rss)
+    parser.add_argument("--rss-min-bytes", type=int, default=Thresholds().rss_min_bytes)
+    parser.add_argument("--bytes", type=float, default=Thresholds().bytes)
+    parser.add_argument("--alpha", type=float, default=Thresholds().alpha)
+    parser.add_argument("--json", action="store_true", help="print JSON")
+    parser.add_argument(
+        "-v", "--verbose", action="store_true", help="print every comparison"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    try:
+        baseline = _load(args.baseline)
+        current = _load(args.current)
+    except (OSError, ValueError) as exc:
+        print("compare: %s" % exc, file=sys.stderr)
+        return 2
+    thresholds = Thresholds(
+        latency=args.latency,
+        throughput=args.throughput,
+        rss=args.rss,
+        rss_min_bytes=args.rss_min_bytes,
+        bytes=args.bytes,
+        alpha=args.alpha,
+    )
+    comparison = compare(baseline, current, thresholds)
+    if args.json:
+        print(json.dumps(comparison, indent=2, sort_keys=True))
+    else:
+        print(report(comparison, verbose=args.verbose))
+    return 1 if comparison["regressions"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
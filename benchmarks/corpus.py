@@ -0,0 +1,171 @@
+"""
+A synthetic, deterministic image corpus for the benchmarks.
+
+Every image is drawn from a seeded `random.Random`, so the same Pillow version
+always encodes the same bytes; `corpus_digest` identifies a corpus, so results
+from different corpora are not compared.
+
+usage:
+
+    python benchmarks/corpus.py /tmp/corpus
+"""
+
+# stdlib
+import hashlib
+import io
+import json
+import os
+import random
+import sys
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Tuple
+
+# pypi
+from PIL import Image
+from PIL import ImageDraw
+
+# ==============================================================================
+
+SEED = 1138
+
+
+def _scene(size: Tuple[int, int], seed: int, shapes: int = 48) -> Image.Image:
+    """gradients with random shapes, so encoders see both flat areas and edges"""
+    (width, height) = size
+    _random = random.Random(seed)
+    gradient = Image.linear_gradient("L")
+    im = Image.merge(
+        "RGB",
+        (
+            gradient.resize(size),
+            gradient.rotate(90).resize(size),
+            Image.radial_gradient("L").resize(size),
+        ),
+    )
+    draw = ImageDraw.Draw(im)
+    for _ in range(shapes):
+        x0 = _random.randrange(width)
+        y0 = _random.randrange(height)
+        x1 = min(width - 1, x0 + _random.randrange(1, max(2, width // 4)))
+        y1 = min(height - 1, y0 + _random.randrange(1, max(2, height // 4)))
+        fill = (
+            _random.randrange(256),
+            _random.randrange(256),
+            _random.randrange(256),
+        )
+        if _random.random() < 0.5:
+            draw.ellipse((x0, y0, x1, y1), fill=fill)
+        else:
+            draw.rectangle((x0, y0, x1, y1), fill=fill)
+    return im
+
+
+def _encode(im: Image.Image, format: str, **kwargs: Any) -> bytes:
+    fileobj = io.BytesIO()
+    im.save(fileobj, format, **kwargs)
+    return fileobj.getvalue()
+
+
+def jpeg_photo() -> bytes:
+    return _encode(_scene((1600, 1200), SEED), "JPEG", quality=90)
+
+
+def jpeg_huge() -> bytes:
+    # drawn small and scaled up; drawing 24 megapixels is slow
+    im = _scene((1500, 1000), SEED + 1, shapes=96).resize(
+        (6000, 4000), Image.Resampling.BICUBIC
+    )
+    return _encode(im, "JPEG", quality=90)
+
+
+def jpeg_tiny() -> bytes:
+    return _encode(_scene((8, 8), SEED + 2, shapes=2), "JPEG", quality=90)
+
+
+def png_rgba() -> bytes:
+    im = _scene((800, 600), SEED + 3)
+    alpha = Image.radial_gradient("L").resize(im.size)
+    im.putalpha(alpha)
+    return _encode(im, "PNG")
+
+
+def png_tiny() -> bytes:
+    return _encode(_scene((16, 16), SEED + 4, shapes=4), "PNG")
+
+
+def gif_palette() -> bytes:
+    im = _scene((480, 360), SEED + 5).quantize(colors=64)
+    return _encode(im, "GIF")
+
+
+def gif_animated() -> bytes:
+    frames = [
+        _scene((240, 240), SEED + 6 + idx, shapes=12).quantize(colors=32)
+        for idx in range(8)
+    ]
+    return _encode(
+        frames[0],
+        "GIF",
+        save_all=True,
+        append_images=frames[1:],
+        duration=100,
+        loop=0,
+    )
+
+
+# name -> (builder, file extension)
+CORPUS: Dict[str, Tuple[Callable[[], bytes], str]] = {
+    "jpeg_photo": (jpeg_photo, "jpg"),
+    "jpeg_huge": (jpeg_huge, "jpg"),
+    "jpeg_tiny": (jpeg_tiny, "jpg"),
+    "png_rgba": (png_rgba, "png"),
+    "png_tiny": (png_tiny, "png"),
+    "gif_palette": (gif_palette, "gif"),
+    "gif_animated": (gif_animated, "gif"),
+}
+
+# slow to build and to benchmark; skipped by `--quick`
+HUGE = ("jpeg_huge",)
+
+
+def build(directory: str, names: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    writes the `names` images into `directory`, and returns a manifest of
+    `{name: {"path", "format", "width", "height", "bytes", "sha256"}}`
+    """
+    os.makedirs(directory, exist_ok=True)
+    manifest = {}
+    for name in names:
+        (builder, ext) = CORPUS[name]
+        data = builder()
+        path = os.path.join(directory, "%s.%s" % (name, ext))
+        with open(path, "wb") as fh:
+            fh.write(data)
+        with Image.open(io.BytesIO(data)) as im:
+            (width, height) = im.size
+            format = im.format
+        manifest[name] = {
+            "path": path,
+            "format": format,
+            "width": width,
+            "height": height,
+            "bytes": len(data),
+            "sha256": hashlib.sha256(data).hexdigest(),
+        }
+    return manifest
+
+
+def corpus_digest(manifest: Dict[str, Dict[str, Any]]) -> str:
+    """identifies the corpus; it changes if any image does"""
+    payload = json.dumps(
+        {name: entry["sha256"] for name, entry in manifest.items()}, sort_keys=True
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+if __name__ == "__main__":
+    _manifest = build(sys.argv[1], list(CORPUS.keys()))
+    print(json.dumps(_manifest, indent=2, sort_keys=True))
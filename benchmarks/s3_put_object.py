@@ -0,0 +1,157 @@
+"""
+Compares the two upload paths in `imagehelper.saver.s3` for small files:
+
+    * `put_object` -- a single request, used below `put_object_threshold`
+    * `upload_fileobj` -- the boto3 transfer manager
+
+The uploads are sent to a local S3 stand-in, so this measures the client-side
+cost of each path rather than the network.
+
+usage:
+
+    python benchmarks/s3_put_object.py --requests 500 --width 160
+"""
+
+# stdlib
+import argparse
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+import io
+import hashlib
+import json
+import threading
+import time
+
+# pypi
+import boto3
+import botocore.config
+from PIL import Image
+
+# local
+import imagehelper
+
+# ==============================================================================
+
+
+class _S3StandInHandler(BaseHTTPRequestHandler):
+    """accepts any PUT; only what boto3 needs for `PutObject` is implemented"""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_PUT(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+        self.server.requests += 1  # type: ignore[attr-defined]
+        self.send_response(200)
+        self.send_header("ETag", '"%s"' % hashlib.md5(body).hexdigest())
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def s3_stand_in() -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _S3StandInHandler)
+    server.requests = 0  # type: ignore[attr-defined]
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def endpoint(server: ThreadingHTTPServer) -> str:
+    """the url of a running `s3_stand_in()`"""
+    (host, port) = server.server_address[:2]
+    if isinstance(host, bytes):
+        host = host.decode()
+    return "http://%s:%s" % (host, port)
+
+
+def synthetic_image(width: int) -> imagehelper.image_wrapper.BasicImage:
+    """a deterministic gradient, encoded as a JPEG thumbnail"""
+    im = Image.frombytes(
+        "RGB",
+        (width, width),
+        bytes(
+            channel
+            for y in range(width)
+            for x in range(width)
+            for channel in ((x * 7) % 256, (y * 5) % 256, (x * y) % 256)
+        ),
+    )
+    fileobj = io.BytesIO()
+    im.save(fileobj, "JPEG", quality=85)
+    wrapped = imagehelper.image_wrapper.ImageWrapper(fileobj)
+    return wrapped.get_original()
+
+
+def run(
+    endpoint_url: str,
+    wrapped: imagehelper.image_wrapper.BasicImage,
+    requests: int,
+    put_object_threshold: int,
+) -> float:
+    """returns requests per second"""
+    saverConfig = imagehelper.saver.s3.SaverConfig(
+        key_public="benchmark",
+        key_private="benchmark",
+        bucket_public_name="benchmark",
+        put_object_threshold=put_object_threshold,
+    )
+    simpleAccess = imagehelper.saver.s3.SaverSimpleAccess(
+        saverConfig=saverConfig,
+        saverLogger=imagehelper.saver.s3.SaverLogger(),
+        resizerConfig=imagehelper.saver.s3.ResizerConfig_S3(
+            resizesSchema={
+                "x": {
+                    "width": 1,
+                    "height": 1,
+                    "constraint-method": "fit-within",
+                    "format": "JPEG",
+                }
+            },
+        ),
+    )
+    simpleAccess._s3_client = boto3.client(
+        "s3",
+        endpoint_url=endpoint_url,
+        region_name="us-east-1",
+        aws_access_key_id="benchmark",
+        aws_secret_access_key="benchmark",
+        config=botocore.config.Config(s3={"addressing_style": "path"}),
+    )
+    # warm up the connection
+    simpleAccess.file_save("benchmark", "warmup.jpg", wrapped)
+
+    t_start = time.perf_counter()
+    for idx in range(requests):
+        simpleAccess.file_save("benchmark", "%s.jpg" % idx, wrapped)
+    return requests / (time.perf_counter() - t_start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--width", type=int, default=160)
+    args = parser.parse_args()
+
+    server = s3_stand_in()
+    endpoint_url = endpoint(server)
+    wrapped = synthetic_image(args.width)
+    try:
+        results = {
+            "file_size": wrapped.file_size,
+            "requests": args.requests,
+            "put_object": run(
+                endpoint_url, wrapped, args.requests, wrapped.file_size + 1
+            ),
+            "upload_fileobj": run(endpoint_url, wrapped, args.requests, 0),
+        }
+    finally:
+        server.shutdown()
+    results["speedup"] = results["put_object"] / results["upload_fileobj"]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,518 @@
+"""
+Benchmarks of the hot paths, on the synthetic corpus in `corpus.py`:
+
+    * `image_wrapper.init/<image>` -- `ImageWrapper.__init__`
+    * `image_wrapper.resize/<constraint-method>` -- `ImageWrapper.resize`, for
+      each constraint method, on `jpeg_photo`
+    * `optimize/<tool>` -- `BasicImage.optimize` with only `<tool>` enabled;
+      skipped if the tool is not installed
+    * `resizer.resize/<image>` -- `Resizer.resize` end to end
+    * `saver.localfile/files_save` -- into a temporary directory
+    * `saver.s3/files_save` -- against a local S3 stand-in; requires `boto3`
+
+Each benchmark runs in a new process, so its peak RSS is its own. The results
+are printed, or written to `--output`, as JSON:
+
+    {
+        "meta": {"python": ..., "pillow": ..., "corpus_digest": ..., ...},
+        "benchmarks": {
+            "resizer.resize/jpeg_photo": {
+                "samples": [0.0213, ...],  # seconds, every repeat
+                "median": ..., "mean": ..., "stdev": ..., "min": ..., "max": ...,
+                "ops_per_second": ..., "mb_per_second": ...,
+                "peak_rss": ..., "peak_rss_delta": ...,  # bytes
+                "output_bytes": {"thumb": 4211, ...}
+            },
+            "optimize/advpng": {"skipped": "`advpng` is not installed"},
+            ...
+        }
+    }
+
+Compare two runs with `benchmarks/compare.py`.
+
+usage:
+
+    python benchmarks/suite.py --output results.json
+    python benchmarks/suite.py -k resize --repeat 20 --quick
+"""
+
+# stdlib
+import argparse
+import concurrent.futures
+import datetime
+import gc
+import io
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+
+# pypi
+import PIL
+
+# local
+import imagehelper
+
+try:
+    import resource
+except ImportError:
+    resource = None  # type: ignore[assignment]
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import corpus  # noqa: E402
+
+# ==============================================================================
+
+# returns the `output_bytes` of a run, if there are any
+TYPE_timed = Callable[[], Optional[Dict[str, int]]]
+
+CONSTRAINT_METHODS = {
+    "fit-within": (400, 400),
+    "fit-within:crop-to": (400, 400),
+    "fit-within:ensure-width": (400, 400),
+    "fit-within:ensure-height": (400, 400),
+    "smallest:ensure-minimum": (400, 400),
+    "exact:proportion": (400, 300),
+    # the size of `jpeg_photo`
+    "exact:no-resize": (1600, 1200),
+    "passthrough:no-resize": (None, None),
+}
+
+# tool -> the corpus image it optimizes
+OPTIMIZE_TOOLS = {
+    "advpng": "png_rgba",
+    "gifsicle": "gif_palette",
+    "jpegoptim": "jpeg_photo",
+    "jpegtran": "jpeg_photo",
+    "optipng": "png_rgba",
+    "pngcrush": "png_rgba",
+}
+
+# "auto" keeps PNG and GIF lossless; an RGBA PNG can not be saved as a JPEG
+RESIZES_SCHEMA = {
+    "thumb": {
+        "width": 120,
+        "height": 120,
+        "format": "auto",
+        "save_quality": 50,
+        "constraint-method": "fit-within:crop-to",
+        "allow_animated": True,
+    },
+    "medium": {
+        "width": 640,
+        "height": 640,
+        "format": "auto",
+        "constraint-method": "fit-within",
+        "allow_animated": True,
+    },
+    "large": {
+        "width": 1280,
+        "height": 1280,
+        "format": "auto",
+        "save_quality": 85,
+        "constraint-method": "fit-within",
+        "allow_animated": True,
+    },
+}
+
+
+class SkipBenchmark(Exception):
+    pass
+
+
+def _read(manifest: Dict[str, Dict[str, Any]], name: str) -> bytes:
+    with open(manifest[name]["path"], "rb") as fh:
+        return fh.read()
+
+
+def _resizerConfig() -> imagehelper.resizer.ResizerConfig:
+    return imagehelper.resizer.ResizerConfig(
+        resizesSchema=RESIZES_SCHEMA,  # type: ignore[arg-type]
+        optimize_original=False,
+        optimize_resized=False,
+    )
+
+
+def _resultset(data: bytes) -> imagehelper.resizer.ResizerResultset:
+    resizer = imagehelper.resizer.Resizer(resizerConfig=_resizerConfig())
+    return resizer.resize(imagefile=io.BytesIO(data))
+
+
+# ------------------------------------------------------------------------------
+# each setup returns the function to time
+
+
+def setup_image_wrapper_init(manifest, image: str) -> TYPE_timed:
+    data = _read(manifest, image)
+
+    def timed():
+        imagehelper.image_wrapper.ImageWrapper(io.BytesIO(data))
+        return None
+
+    return timed
+
+
+def setup_image_wrapper_resize(manifest, constraint_method: str) -> TYPE_timed:
+    data = _read(manifest, "jpeg_photo")
+    imageWrapper = imagehelper.image_wrapper.ImageWrapper(io.BytesIO(data))
+    (width, height) = CONSTRAINT_METHODS[constraint_method]
+    instructions = {
+        "width": width,
+        "height": height,
+        "constraint-method": constraint_method,
+        "format": "JPEG",
+        "save_quality": 85,
+    }
+
+    def timed():
+        resized = imageWrapper.resize(instructions)  # type: ignore[arg-type]
+        return {constraint_method: resized.file_size}
+
+    return timed
+
+
+def setup_optimize(manifest, tool: str) -> TYPE_timed:
+    support = imagehelper.image_wrapper.OPTIMIZE_SUPPORT
+    imagehelper.image_wrapper.autodetect_support()
+    if not support[tool]["available"]:
+        raise SkipBenchmark("`%s` is not installed" % tool)
+    for _tool in support:
+        support[_tool]["use"] = _tool == tool
+    image = OPTIMIZE_TOOLS[tool]
+    original = imagehelper.image_wrapper.ImageWrapper(
+        io.BytesIO(_read(manifest, image))
+    ).get_original()
+    data = original.file.getvalue()
+
+    def timed():
+        basicImage = imagehelper.image_wrapper.BasicImage(
+            io.BytesIO(data),
+            format=original.format,
+            width=original.width,
+            height=original.height,
+        )
+        basicImage.optimize()
+        return {image: basicImage.file_size}
+
+    return timed
+
+
+def setup_resizer_resize(manifest, image: str) -> TYPE_timed:
+    data = _read(manifest, image)
+
+    def timed():
+        resizerResultset = _resultset(data)
+        return {
+            size: resized.file_size
+            for size, resized in resizerResultset.resized.items()
+        }
+
+    return timed
+
+
+def setup_saver_localfile(manifest) -> TYPE_timed:
+    resizerResultset = _resultset(_read(manifest, "jpeg_photo"))
+    directory = tempfile.mkdtemp()
+    saverManager = imagehelper.saver.localfile.SaverManager(
+        saverConfig=imagehelper.saver.localfile.SaverConfig(filedir=directory),
+        saverLogger=imagehelper.saver.localfile.SaverLogger(),
+        resizerConfig=_resizerConfig(),  # type: ignore[arg-type]
+    )
+
+    def timed():
+        saverManager.files_save(resizerResultset, "benchmark", archive_original=True)
+        return None
+
+    return timed
+
+
+def setup_saver_s3(manifest) -> TYPE_timed:
+    try:
+        import boto3
+        import botocore.config
+
+        from s3_put_object import endpoint
+        from s3_put_object import s3_stand_in
+    except ImportError:
+        raise SkipBenchmark("`boto3` is not installed")
+    resizerResultset = _resultset(_read(manifest, "jpeg_photo"))
+    server = s3_stand_in()
+    endpoint_url = endpoint(server)
+    saverManager = imagehelper.saver.s3.SaverManager(
+        saverConfig=imagehelper.saver.s3.SaverConfig(
+            key_public="benchmark",
+            key_private="benchmark",
+            bucket_public_name="benchmark",
+            bucket_archive_name="benchmark-archive",
+        ),
+        saverLogger=imagehelper.saver.s3.SaverLogger(),
+        resizerConfig=_resizerConfig(),  # type: ignore[arg-type]
+    )
+    saverManager._s3_client = boto3.client(
+        "s3",
+        endpoint_url=endpoint_url,
+        region_name="us-east-1",
+        aws_access_key_id="benchmark",
+        aws_secret_access_key="benchmark",
+        config=botocore.config.Config(s3={"addressing_style": "path"}),
+    )
+
+    def timed():
+        saverManager.files_save(resizerResultset, "benchmark", archive_original=True)
+        return None
+
+    return timed
+
+
+class Benchmark(object):
+    """
+    `setup`
+        called with the corpus manifest and `args`; returns the function to time
+    `images`
+        the corpus images used; their size is the input for `mb_per_second`
+    `repeat`
+        optional; overrides `--repeat`, for slow benchmarks
+    """
+
+    def __init__(
+        self,
+        name: str,
+        setup: Callable[..., TYPE_timed],
+        args: tuple = (),
+        images: tuple = (),
+        repeat: Optional[int] = None,
+    ):
+        self.name = name
+        self.setup = setup
+        self.args = args
+        self.images = images
+        self.repeat = repeat
+
+
+def benchmarks() -> Dict[str, Benchmark]:
+    _benchmarks = []
+    for image in corpus.CORPUS:
+        repeat = 3 if image in corpus.HUGE else None
+        _benchmarks.append(
+            Benchmark(
+                "image_wrapper.init/%s" % image,
+                setup_image_wrapper_init,
+                (image,),
+                images=(image,),
+                repeat=repeat,
+            )
+        )
+    for constraint_method in CONSTRAINT_METHODS:
+        _benchmarks.append(
+            Benchmark(
+                "image_wrapper.resize/%s" % constraint_method,
+                setup_image_wrapper_resize,
+                (constraint_method,),
+                images=("jpeg_photo",),
+            )
+        )
+    for tool, image in OPTIMIZE_TOOLS.items():
+        _benchmarks.append(
+            Benchmark("optimize/%s" % tool, setup_optimize, (tool,), images=(image,))
+        )
+    for image in corpus.CORPUS:
+        repeat = 3 if image in corpus.HUGE else None
+        _benchmarks.append(
+            Benchmark(
+                "resizer.resize/%s" % image,
+                setup_resizer_resize,
+                (image,),
+                images=(image,),
+                repeat=repeat,
+            )
+        )
+    _benchmarks.append(Benchmark("saver.localfile/files_save", setup_saver_localfile))
+    _benchmarks.append(Benchmark("saver.s3/files_save", setup_saver_s3))
+    return {benchmark.name: benchmark for benchmark in _benchmarks}
+
+
+# ------------------------------------------------------------------------------
+
+
+def peak_rss() -> Optional[int]:
+    """the peak RSS of this process, in bytes"""
+    if resource is None:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes elsewhere
+    return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+def run_benchmark(
+    name: str,
+    manifest: Dict[str, Dict[str, Any]],
+    repeat: int,
+    warmup: int,
+) -> Dict[str, Any]:
+    """runs one benchmark; returns the raw result"""
+    benchmark = benchmarks()[name]
+    if benchmark.repeat is not None:
+        repeat = min(repeat, benchmark.repeat)
+    rss_start = peak_rss()
+    try:
+        timed = benchmark.setup(manifest, *benchmark.args)
+    except SkipBenchmark as exc:
+        return {"skipped": str(exc)}
+    for _ in range(warmup):
+        timed()
+    samples: List[float] = []
+    output_bytes = None
+    gc.collect()
+    for _ in range(repeat):
+        t_start = time.perf_counter()
+        output_bytes = timed()
+        samples.append(time.perf_counter() - t_start)
+    rss_end = peak_rss()
+    result: Dict[str, Any] = {
+        "samples": samples,
+        "bytes_in": sum(manifest[image]["bytes"] for image in benchmark.images),
+        "output_bytes": output_bytes or {},
+        "peak_rss": rss_end,
+        "peak_rss_delta": None,
+    }
+    if (rss_start is not None) and (rss_end is not None):
+        result["peak_rss_delta"] = rss_end - rss_start
+    return result
+
+
+def summarize(raw: Dict[str, Any]) -> Dict[str, Any]:
+    """adds the statistics of the samples to a raw result"""
+    if "samples" not in raw:
+        return raw
+    samples = raw["samples"]
+    median = statistics.median(samples)
+    summary = dict(raw)
+    summary.update(
+        {
+            "median": median,
+            "mean": statistics.mean(samples),
+            "stdev": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+            "min": min(samples),
+            "max": max(samples),
+            "ops_per_second": (1 / median) if median else None,
+            "mb_per_second": None,
+        }
+    )
+    if raw["bytes_in"] and median:
+        summary["mb_per_second"] = (raw["bytes_in"] / 1048576) / median
+    return summary
+
+
+def run(
+    names: List[str],
+    manifest: Dict[str, Dict[str, Any]],
+    repeat: int,
+    warmup: int,
+    isolate: bool = True,
+) -> Dict[str, Any]:
+    results = {}
+    context = multiprocessing.get_context("spawn")
+    for name in names:
+        print("running %s" % name, file=sys.stderr)
+        try:
+            if isolate:
+                # a new process for each benchmark, so `peak_rss` is its own
+                with concurrent.futures.ProcessPoolExecutor(
+                    max_workers=1, mp_context=context
+                ) as executor:
+                    raw = executor.submit(
+                        run_benchmark, name, manifest, repeat, warmup
+                    ).result()
+            else:
+                raw = run_benchmark(name, manifest, repeat, warmup)
+        except Exception as exc:
+            raw = {"error": "%s: %s" % (exc.__class__.__name__, exc)}
+        results[name] = summarize(raw)
+    return results
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--output", help="write the JSON here; default stdout")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument(
+        "-k",
+        dest="filters",
+        action="append",
+        default=[],
+        help="only run benchmarks containing this; may be repeated",
+    )
+    parser.add_argument("--quick", action="store_true", help="skip the huge images")
+    parser.add_argument(
+        "--no-isolate",
+        dest="isolate",
+        action="store_false",
+        help="run in this process; faster, but `peak_rss` is cumulative",
+    )
+    parser.add_argument("--list", action="store_true", help="list the benchmarks")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    names = list(benchmarks().keys())
+    if args.filters:
+        names = [name for name in names if any(f in name for f in args.filters)]
+    if args.quick:
+        names = [name for name in names if not name.endswith(corpus.HUGE)]
+    if args.list:
+        print("\n".join(names))
+        return
+
+    images = [
+        image for image in corpus.CORPUS if not (args.quick and image in corpus.HUGE)
+    ]
+    directory = tempfile.mkdtemp()
+    try:
+        manifest = corpus.build(directory, images)
+        results = {
+            "meta": {
+                "imagehelper": imagehelper.__VERSION__,
+                "pillow": PIL.__version__,
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "machine": platform.machine(),
+                "cpu_count": os.cpu_count(),
+                "corpus_digest": corpus.corpus_digest(manifest),
+                "corpus": {
+                    image: {k: v for k, v in entry.items() if k != "path"}
+                    for image, entry in manifest.items()
+                },
+                "repeat": args.repeat,
+                "warmup": args.warmup,
+                "isolate": args.isolate,
+                "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            },
+            "benchmarks": run(
+                names, manifest, args.repeat, args.warmup, isolate=args.isolate
+            ),
+        }
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as fh:
+            fh.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
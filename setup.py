@@ -72,7 +72,14 @@ setup(
     install_requires=requires,
     tests_require=tests_require,
     extras_require={
+        "numpy": ["numpy"],
         "testing": testing_extras,
     },
     test_suite="tests",
+    entry_points={
+        "console_scripts": [
+            "imagehelper = imagehelper.commands.resize:main",
+            "imagehelper-rebuild = imagehelper.commands.rebuild:main",
+        ],
+    },
 )
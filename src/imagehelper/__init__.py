@@ -1,8 +1,12 @@
 __VERSION__ = "0.8.0"
 
 from . import _io
+from . import batch
+from . import cache
 from . import errors
 from . import image_wrapper
+from . import perceptual
 from . import resizer
 from . import saver
+from . import shared
 from . import utils
@@ -1,4 +1,5 @@
 # stdlib
+import io
 from typing import Any
 from typing import Dict
 from typing import List
@@ -50,3 +51,4 @@ ResizesSchema = Dict[str, ResizerInstructions]
 TYPE_files_mapping = Dict[str, Tuple[str, str]]
 TYPE_resizes = Dict[str, "BasicImage"]
 TYPE_selected_resizes = Union[List[str], Tuple[str]]
+TYPE_file_envelope = Union[bytes, io.IOBase]
@@ -0,0 +1,276 @@
+"""
+Batch resizing across a process pool.
+
+A `resizer.Resizer` handles exactly one image; `BatchResizer` handles an
+iterable of images with a shared `resizer.ResizerConfig`:
+
+    batchResizer = BatchResizer(resizerConfig, max_workers=4)
+    for (key, result) in batchResizer.resize(["a.jpg", "b.png"]):
+        if isinstance(result, Exception):
+            ...
+        else:
+            # result is a `resizer.ResizerResultset`
+            ...
+    print(batchResizer.stats.as_dict())
+
+Inputs may be:
+
+    * a path (`str` or `os.PathLike`); the key is the path.
+      the file is read by the worker, so it is never sent through the pipe.
+    * `bytes`; the key is the position in the input
+    * a file object; the key is the position in the input.
+      the file is read in the parent.
+    * a tuple of `(key, input)` to supply a key for any of the above
+"""
+
+# stdlib
+import concurrent.futures
+import io
+import os
+import time
+from typing import Any
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import Optional
+from typing import Tuple
+from typing import Union
+
+# local
+from . import _io
+from . import resizer
+
+# ==============================================================================
+
+TYPE_batch_result = Union[resizer.ResizerResultset, Exception]
+
+
+class BatchStats(object):
+    """throughput of a `BatchResizer` run"""
+
+    images: int = 0
+    errors: int = 0
+    bytes_in: int = 0
+    bytes_out: int = 0
+    seconds: float = 0
+    # seconds spent in each stage, summed across workers
+    stage_seconds: Dict[str, float]
+
+    def __init__(self):
+        self.stage_seconds = {}
+
+    @property
+    def images_per_second(self) -> float:
+        if not self.seconds:
+            return 0
+        return self.images / self.seconds
+
+    @property
+    def mb_per_second(self) -> float:
+        if not self.seconds:
+            return 0
+        return (self.bytes_in / 1048576) / self.seconds
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "images": self.images,
+            "errors": self.errors,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "seconds": self.seconds,
+            "images_per_second": self.images_per_second,
+            "mb_per_second": self.mb_per_second,
+            "stage_seconds": dict(self.stage_seconds),
+        }
+
+
+def _batch_resize(
+    resizerConfig: resizer.ResizerConfig,
+    payload: Union[str, bytes],
+) -> Tuple[resizer.ResizerResultset, int, Dict[str, float]]:
+    """
+    worker; returns a tuple of (resizerResultset, bytes_in, stage_seconds)
+    """
+    t_start = time.perf_counter()
+    if isinstance(payload, bytes):
+        data = payload
+    else:
+        with open(payload, _io.FileReadArgs) as fh:
+            data = fh.read()
+    imagefile = _io._FilelikePreference(data)
+    t_read = time.perf_counter()
+
+    _resizer = resizer.Resizer(resizerConfig=resizerConfig)
+    _resizer.register_image_file(imagefile=imagefile)
+    t_decode = time.perf_counter()
+
+    resizerResultset = _resizer.resize()
+    t_resize = time.perf_counter()
+
+    stage_seconds = {
+        "read": t_read - t_start,
+        "decode": t_decode - t_read,
+        "resize": t_resize - t_decode,
+    }
+    return (resizerResultset, len(data), stage_seconds)
+
+
+class BatchResizer(object):
+    """
+    Resizes many images across a process pool.
+
+    `resizerConfig`
+        a `resizer.ResizerConfig`; it must be picklable
+
+    `max_workers`
+        passed to the `ProcessPoolExecutor`
+
+    `max_inflight`
+        the maximum number of images that have been read from the input but
+        not yet yielded. the input is only consumed as results are yielded,
+        so memory is bounded no matter how large the input is.
+        default: `max_workers * 2`
+
+    `ordered`
+        default `False`; results are yielded in completion order.
+        if `True`, results are yielded in input order.
+
+    `executor`
+        an optional `concurrent.futures.Executor` to use instead of a new
+        `ProcessPoolExecutor`; it will not be shut down.
+    """
+
+    resizerConfig: resizer.ResizerConfig
+    stats: BatchStats
+
+    def __init__(
+        self,
+        resizerConfig: resizer.ResizerConfig,
+        max_workers: Optional[int] = None,
+        max_inflight: Optional[int] = None,
+        ordered: bool = False,
+        executor: Optional[concurrent.futures.Executor] = None,
+    ):
+        self.resizerConfig = resizerConfig
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_inflight = max_inflight or (self.max_workers * 2)
+        if self.max_inflight < 1:
+            raise ValueError("`max_inflight` must be 1 or more")
+        self.ordered = ordered
+        self._executor = executor
+        self.stats = BatchStats()
+
+    def _prepare(self, index: int, item: Any) -> Tuple[Any, Union[str, bytes]]:
+        key = None
+        if isinstance(item, tuple):
+            (key, item) = item
+        if isinstance(item, (str, os.PathLike)):
+            payload: Union[str, bytes] = os.fspath(item)
+            if key is None:
+                key = payload
+        elif isinstance(item, (bytes, bytearray, memoryview)):
+            payload = bytes(item)
+        elif isinstance(item, io.IOBase):
+            item.seek(0)
+            payload = item.read()
+            item.seek(0)
+        else:
+            raise ValueError("unsupported input: `%s`" % type(item))
+        if key is None:
+            key = index
+        return (key, payload)
+
+    def resize(
+        self,
+        inputs: Iterable[Any],
+    ) -> Iterator[Tuple[Any, TYPE_batch_result]]:
+        """
+        yields `(key, resizer.ResizerResultset | Exception)` for every input
+        """
+        self.stats = BatchStats()
+        t_start = time.perf_counter()
+        executor = self._executor
+        if executor is None:
+            executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.max_workers
+            )
+        try:
+            for result in self._resize(executor, inputs):
+                self.stats.seconds = time.perf_counter() - t_start
+                yield result
+        finally:
+            if self._executor is None:
+                executor.shutdown(wait=True)
+            self.stats.seconds = time.perf_counter() - t_start
+
+    def _resize(
+        self,
+        executor: concurrent.futures.Executor,
+        inputs: Iterable[Any],
+    ) -> Iterator[Tuple[Any, TYPE_batch_result]]:
+        inputs_iter = enumerate(inputs)
+        exhausted = False
+        # future -> (index, key)
+        pending: Dict[concurrent.futures.Future, Tuple[int, Any]] = {}
+        # index -> (key, result); completed but not yet yielded
+        completed: Dict[int, Tuple[Any, TYPE_batch_result]] = {}
+        next_index = 0  # next index to yield, when `ordered`
+        try:
+            while True:
+                # fill the pipeline; completed results count against the limit
+                while not exhausted and (len(pending) + len(completed)) < (
+                    self.max_inflight
+                ):
+                    try:
+                        (index, item) = next(inputs_iter)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    try:
+                        (key, payload) = self._prepare(index, item)
+                    except Exception as exc:
+                        key = item[0] if isinstance(item, tuple) else index
+                        completed[index] = (key, exc)
+                        self.stats.errors += 1
+                        continue
+                    future = executor.submit(_batch_resize, self.resizerConfig, payload)
+                    pending[future] = (index, key)
+
+                if not pending and not completed:
+                    return
+
+                if pending and (not self.ordered or next_index not in completed):
+                    (done, _not_done) = concurrent.futures.wait(
+                        pending, return_when=concurrent.futures.FIRST_COMPLETED
+                    )
+                    for future in done:
+                        (index, key) = pending.pop(future)
+                        completed[index] = (key, self._result(future))
+
+                if self.ordered:
+                    while next_index in completed:
+                        yield completed.pop(next_index)
+                        next_index += 1
+                else:
+                    for index in list(completed.keys()):
+                        yield completed.pop(index)
+        finally:
+            # the caller stopped early; drop whatever has not started
+            for future in pending:
+                future.cancel()
+
+    def _result(self, future: concurrent.futures.Future) -> TYPE_batch_result:
+        try:
+            (resizerResultset, bytes_in, stage_seconds) = future.result()
+        except Exception as exc:
+            self.stats.errors += 1
+            return exc
+        self.stats.images += 1
+        self.stats.bytes_in += bytes_in
+        for resized in resizerResultset.resized.values():
+            self.stats.bytes_out += resized.file_size
+        for stage, seconds in stage_seconds.items():
+            self.stats.stage_seconds[stage] = (
+                self.stats.stage_seconds.get(stage, 0) + seconds
+            )
+        return resizerResultset
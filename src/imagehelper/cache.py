@@ -0,0 +1,268 @@
+"""
+A cache of resize results, for byte-identical re-uploads.
+
+Entries are keyed by the digest of the source file and a fingerprint of the
+instructions that produced them. A `Resizer` given a `ResizeCache` looks up
+every selected size before decoding the image; if they are all cached, the
+image is never decoded:
+
+    resizeCache = ResizeCache(max_bytes=256 * 1048576, directory="/tmp/resized")
+    resizer = Resizer(resizerConfig=resizerConfig, resizeCache=resizeCache)
+    resizerResultset = resizer.resize(imagefile=imagefile)
+    print(resizeCache.stats.as_dict())
+
+Tiers:
+
+    * memory: a LRU bounded by `max_bytes`, the total size of the cached files
+    * disk: optional; each entry is a file in `directory`, stored as a binary
+      envelope (see `utils.envelope_encode`) so the digests are verified when
+      it is read. the disk tier is not bounded; prune it externally.
+
+A `ResizeCache` is threadsafe, and can be shared by many `Resizer`s.
+"""
+
+# stdlib
+import collections
+import hashlib
+import json
+import logging
+import os
+import threading
+from typing import Any
+from typing import Dict
+from typing import Optional
+from typing import Tuple
+from typing import Type
+from typing import TypeVar
+
+# local
+from . import _io
+from . import errors
+from . import utils
+from .image_wrapper import BasicImage
+
+# ==============================================================================
+
+log = logging.getLogger(__name__)
+
+T_BasicImage = TypeVar("T_BasicImage", bound=BasicImage)
+
+# (file data, metadata)
+TYPE_cache_entry = Tuple[bytes, Dict[str, Any]]
+
+
+def fingerprint(*parts: Any) -> str:
+    """a stable hexdigest of json-serializable `parts`"""
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class CacheStats(object):
+    """counters of a `ResizeCache`"""
+
+    # found in memory
+    hits: int = 0
+    # found on disk, and promoted into memory
+    disk_hits: int = 0
+    misses: int = 0
+    # entries dropped from memory to stay under `max_bytes`
+    evictions: int = 0
+    # entries written to disk
+    disk_writes: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.disk_hits + self.misses
+        if not lookups:
+            return 0
+        return (self.hits + self.disk_hits) / lookups
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "disk_writes": self.disk_writes,
+            "hit_rate": self.hit_rate,
+        }
+
+
+class ResizeCache(object):
+    """
+    Two-tier cache of encoded images.
+
+    `max_bytes`
+        the most bytes of file data held in memory; default 64MB.
+        `0` disables the memory tier.
+
+    `directory`
+        optional directory for the disk tier; it is created if needed
+
+    `digest_algorithm`
+        the algorithm for source digests; default `sha256`
+    """
+
+    stats: CacheStats
+
+    def __init__(
+        self,
+        max_bytes: int = 64 * 1048576,
+        directory: Optional[str] = None,
+        digest_algorithm: str = "sha256",
+    ):
+        if max_bytes < 0:
+            raise ValueError("`max_bytes` must be 0 or more")
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.digest_algorithm = digest_algorithm
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+        self.stats = CacheStats()
+        self._entries: "collections.OrderedDict[str, TYPE_cache_entry]" = (
+            collections.OrderedDict()
+        )
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def bytes(self) -> int:
+        """the bytes of file data held in memory"""
+        return self._bytes
+
+    def __len__(self) -> int:
+        """the number of entries held in memory"""
+        return len(self._entries)
+
+    def source_digest(self, fileobj) -> str:
+        """the digest of a source file"""
+        return utils.file_digest(fileobj, self.digest_algorithm)
+
+    def key(self, source_digest: str, instructions_fingerprint: str) -> str:
+        return "%s-%s" % (source_digest, instructions_fingerprint)
+
+    def get(
+        self,
+        key: str,
+        cls: Type[T_BasicImage],
+    ) -> Optional[T_BasicImage]:
+        """
+        returns a new `cls` (a `BasicImage` subclass) for `key`, or `None`.
+        each call returns a new object, so it may be optimized or otherwise
+        changed without affecting the cache.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.stats.hits += 1
+        if entry is None:
+            entry = self._disk_get(key)
+            with self._lock:
+                if entry is None:
+                    self.stats.misses += 1
+                    return None
+                self.stats.disk_hits += 1
+            self._memory_set(key, entry)
+        return self._image_new(cls, entry)
+
+    def set(self, key: str, image: BasicImage) -> None:
+        """stores a copy of `image`"""
+        data = image.file.getvalue()
+        entry: TYPE_cache_entry = (
+            data,
+            {
+                "format": image.format,
+                "width": image.width,
+                "height": image.height,
+                "digests": image.digests,
+                "is_optimized": image.is_optimized,
+            },
+        )
+        self._memory_set(key, entry)
+        self._disk_set(key, entry)
+
+    def clear(self) -> None:
+        """empties the memory tier; the disk tier is kept"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _image_new(
+        self,
+        cls: Type[T_BasicImage],
+        entry: TYPE_cache_entry,
+    ) -> T_BasicImage:
+        (data, metadata) = entry
+        image = cls(
+            _io._FilelikePreference(data),
+            format=metadata["format"],
+            width=metadata["width"],
+            height=metadata["height"],
+            file_size=len(data),
+            digests=metadata["digests"],
+        )
+        image.is_optimized = metadata.get("is_optimized")
+        return image
+
+    def _memory_set(self, key: str, entry: TYPE_cache_entry) -> None:
+        size = len(entry[0])
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous[0])
+            self._entries[key] = entry
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                (_key, _entry) = self._entries.popitem(last=False)
+                self._bytes -= len(_entry[0])
+                self.stats.evictions += 1
+
+    def _disk_path(self, key: str) -> str:
+        assert self.directory is not None
+        return os.path.join(self.directory, "%s.envelope" % key)
+
+    def _disk_get(self, key: str) -> Optional[TYPE_cache_entry]:
+        if self.directory is None:
+            return None
+        try:
+            with open(self._disk_path(key), _io.FileReadArgs) as fh:
+                (fileobj, header) = utils.envelope_decode(fh.read())
+        except FileNotFoundError:
+            return None
+        except errors.ImageError_Parsing as exc:
+            log.warning("invalid cache entry `%s`: %s", key, exc)
+            return None
+        return (
+            fileobj.getvalue(),
+            {
+                "format": header["format"],
+                "width": header["width"],
+                "height": header["height"],
+                "digests": header["digests"],
+                # not kept on disk
+                "is_optimized": None,
+            },
+        )
+
+    def _disk_set(self, key: str, entry: TYPE_cache_entry) -> None:
+        if self.directory is None:
+            return
+        (data, metadata) = entry
+        path = self._disk_path(key)
+        # write then rename, so readers never see a partial entry
+        path_tmp = "%s.%s.%s.tmp" % (path, os.getpid(), threading.get_ident())
+        with open(path_tmp, _io.FileWriteArgs) as fh:
+            utils.envelope_encode(
+                _io._FilelikePreference(data),
+                fh,
+                format=metadata["format"],
+                width=metadata["width"],
+                height=metadata["height"],
+                digests=metadata["digests"],
+            )
+        os.replace(path_tmp, path)
+        with self._lock:
+            self.stats.disk_writes += 1
@@ -0,0 +1,147 @@
+"""
+Console commands.
+
+Commands read a config file, in JSON or TOML (by extension), with the resizer
+schema and the saver to use:
+
+    {
+        "resizesSchema": {
+            "thumb": {
+                "width": 120,
+                "height": 120,
+                "format": "JPEG",
+                "save_quality": 50,
+                "suffix": "t1",
+                "constraint-method": "fit-within"
+            }
+        },
+        "selected_resizes": ["thumb"],
+        "optimize_original": false,
+        "optimize_resized": true,
+        "saver": {
+            "type": "localfile",
+            "filedir": "images"
+        }
+    }
+
+A file with only a `ResizesSchema`, without the other keys, is also accepted.
+`selected_resizes` defaults to every size. `saver.type` is `localfile` or
+`s3`; the other `saver` keys are passed to that `SaverConfig`. For `s3`, the
+`key_public` and `key_private` default to the `AWS_ACCESS_KEY_ID` and
+`AWS_SECRET_ACCESS_KEY` environment variables.
+"""
+
+# stdlib
+import json
+import os
+import sys
+from types import ModuleType
+from typing import Any
+from typing import Dict
+from typing import Optional
+from typing import Union
+
+# local
+from .. import errors
+from ..resizer import ResizerConfig
+from ..saver import localfile
+from ..saver import s3
+
+# conditional import; `tomllib` is in the stdlib from py3.11
+tomllib: Optional[ModuleType]
+if sys.version_info >= (3, 11):
+    import tomllib
+else:
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+# ==============================================================================
+
+SAVER_TYPES = ("localfile", "s3")
+
+TYPE_SaverManager = Union[localfile.SaverManager, s3.SaverManager]
+
+# options of `ResizerConfig`, which may be set in a config file
+_RESIZER_OPTIONS = (
+    "resizesSchema",
+    "selected_resizes",
+    "optimize_original",
+    "optimize_resized",
+    "icc_to_srgb",
+    "digest_algorithms",
+)
+
+
+def config_load(path: str) -> Dict[str, Any]:
+    """
+    reads a config file; `.toml` files are TOML, everything else is JSON.
+
+    raises `errors.ImageError_ConfigError` if it is invalid
+    """
+    try:
+        if path.endswith(".toml"):
+            if tomllib is None:
+                raise errors.ImageError_ConfigError(
+                    "TOML configs require python 3.11+ or `tomli`"
+                )
+            with open(path, "rb") as fh:
+                config = tomllib.load(fh)
+        else:
+            with open(path, "r") as fh:
+                config = json.load(fh)
+    except (OSError, ValueError) as exc:
+        raise errors.ImageError_ConfigError("could not read `%s`: %s" % (path, exc))
+    if isinstance(config, dict) and ("resizesSchema" not in config):
+        # a bare `ResizesSchema`
+        if config and all(isinstance(v, dict) for v in config.values()):
+            config = {"resizesSchema": config}
+    if not isinstance(config, dict) or not config.get("resizesSchema"):
+        raise errors.ImageError_ConfigError("`%s` has no `resizesSchema`" % path)
+    return config
+
+
+def resizerConfig_from_config(
+    config: Dict[str, Any],
+    **overrides: Any,
+) -> ResizerConfig:
+    """builds a `ResizerConfig`; `overrides` replace the options of `config`"""
+    kwargs = {k: config[k] for k in _RESIZER_OPTIONS if k in config}
+    kwargs.update(overrides)
+    for size in kwargs.get("selected_resizes") or ():
+        if size not in kwargs["resizesSchema"]:
+            raise errors.ImageError_ConfigError(
+                "selected size is not in `resizesSchema` (%s)" % size
+            )
+    return ResizerConfig(**kwargs)
+
+
+def saverManager_from_config(
+    config: Dict[str, Any],
+    resizerConfig: ResizerConfig,
+) -> TYPE_SaverManager:
+    """builds a `SaverManager` for `config["saver"]`"""
+    saver = dict(config.get("saver") or {})
+    saver_type = saver.pop("type", "localfile")
+    if saver_type not in SAVER_TYPES:
+        raise errors.ImageError_ConfigError(
+            "`saver.type` must be one of %s" % ", ".join(SAVER_TYPES)
+        )
+    try:
+        if saver_type == "s3":
+            saver.setdefault("key_public", os.environ.get("AWS_ACCESS_KEY_ID", ""))
+            saver.setdefault("key_private", os.environ.get("AWS_SECRET_ACCESS_KEY", ""))
+            return s3.SaverManager(
+                saverConfig=s3.SaverConfig(**saver),
+                saverLogger=s3.SaverLogger(),
+                resizerConfig=resizerConfig,  # type: ignore[arg-type]
+            )
+        return localfile.SaverManager(
+            saverConfig=localfile.SaverConfig(**saver),
+            saverLogger=localfile.SaverLogger(),
+            resizerConfig=resizerConfig,  # type: ignore[arg-type]
+        )
+    except TypeError as exc:
+        # an unknown `SaverConfig` option
+        raise errors.ImageError_ConfigError("invalid `saver`: %s" % exc)
@@ -0,0 +1,421 @@
+"""
+`imagehelper-rebuild`: re-renders sizes from the archived originals.
+
+The archive (`SaverConfig.bucket_archive_name` or `subdir_archive_name`)
+exists so that sizes can be regenerated when the schema changes. This walks an
+archive, re-renders the sizes on a process pool, and saves them with the
+config's saver:
+
+    imagehelper-rebuild config.json --workers 8 --checkpoint rebuild.txt
+
+The archive is `--archive DIRECTORY`, or by default the archive of the saver:
+the `subdir_archive_name` of a `localfile` saver, or a listing of the
+`bucket_archive_name` of an `s3` saver (see `--prefix`; set
+`saver.endpoint_url` for S3-compatible services). Originals are expected at
+the default `%(guid)s.%(format)s`; with `saver.archive_content_addressed`,
+the `{guid}.archive.json` pointers are followed instead.
+
+By default every selected size is rendered. `--changed-from OLD_CONFIG` only
+renders the sizes whose `ResizerConfig.size_fingerprint` changed, and
+`--sizes` names them explicitly. Each original is decoded once.
+
+Every rebuilt guid is appended to the `--checkpoint` file, so a killed job
+resumes where it stopped. The checkpoint starts with a fingerprint of the
+sizes being rendered; a different job refuses to use it.
+"""
+
+# stdlib
+import argparse
+import concurrent.futures
+import json
+import logging
+import os
+import sys
+import time
+from typing import Any
+from typing import Dict
+from typing import IO
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Set
+from typing import Tuple
+from typing import Union
+
+# local
+from . import config_load
+from . import resizerConfig_from_config
+from . import saverManager_from_config
+from . import TYPE_SaverManager
+from .. import errors
+from ..batch import BatchResizer
+from ..cache import fingerprint
+from ..resizer import ResizerConfig
+from ..saver import localfile
+from ..saver import s3
+
+# ==============================================================================
+
+log = logging.getLogger(__name__)
+
+CHECKPOINT_HEADER = "# imagehelper-rebuild "
+
+# (guid, path or file data)
+TYPE_archive_item = Tuple[str, Union[str, bytes]]
+
+
+class RebuildStats(object):
+    """counters of a `rebuild`"""
+
+    rebuilt: int = 0
+    # already in the checkpoint
+    skipped: int = 0
+    failed: int = 0
+    seconds: float = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "rebuilt": self.rebuilt,
+            "skipped": self.skipped,
+            "failed": self.failed,
+            "seconds": self.seconds,
+        }
+
+
+class Checkpoint(object):
+    """
+    the guids a job has finished, appended to a file one per line.
+
+    `path`
+        the file; it is created if needed
+    `job_fingerprint`
+        identifies the job; an existing file for another job raises
+        `errors.ImageError_ConfigError`
+    """
+
+    path: str
+    done: Set[str]
+    _fh: Optional[IO[str]] = None
+
+    def __init__(self, path: str, job_fingerprint: str):
+        self.path = path
+        self.done = set()
+        header = CHECKPOINT_HEADER + job_fingerprint
+        if not os.path.exists(path):
+            self._fh = open(path, "w")
+            self._write(header)
+            return
+        with open(path, "rb") as fh:
+            data = fh.read()
+        lines = data.decode("utf-8").splitlines()
+        if lines and (lines[0] != header):
+            raise errors.ImageError_ConfigError(
+                "checkpoint `%s` is for a different job; remove it to restart" % path
+            )
+        if data and not data.endswith(b"\n"):
+            # a partial last line is from a killed job; that guid is not done
+            os.truncate(path, data.rfind(b"\n") + 1)
+            lines.pop()
+        self._fh = open(path, "a")
+        if not lines:
+            self._write(header)
+        self.done.update(line for line in lines[1:] if line)
+
+    def _write(self, line: str) -> None:
+        assert self._fh is not None
+        self._fh.write(line + "\n")
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+
+    def __contains__(self, guid: str) -> bool:
+        return guid in self.done
+
+    def add(self, guid: str) -> None:
+        self._write(guid)
+        self.done.add(guid)
+
+    def close(self) -> None:
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+
+def _guid_from_filename(filename: str) -> Optional[str]:
+    """the guid of an archived original, or `None` for other files"""
+    if filename.endswith((".json", ".tmp")) or filename.startswith("."):
+        return None
+    (guid, ext) = os.path.splitext(filename)
+    if not (guid and ext):
+        return None
+    return guid
+
+
+def iter_archive_localfile(
+    directory: str,
+    content_addressed: bool = False,
+) -> Iterator[Tuple[str, str]]:
+    """yields `(guid, path)` for every original in a local archive"""
+    suffix = ".archive.json"
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if not entry.is_file():
+                continue
+            if content_addressed:
+                if not entry.name.endswith(suffix):
+                    continue
+                with open(entry.path, "r") as fh:
+                    pointer = json.load(fh)
+                yield (pointer["guid"], os.path.join(directory, pointer["key"]))
+            else:
+                guid = _guid_from_filename(entry.name)
+                if guid is not None:
+                    yield (guid, entry.path)
+
+
+def iter_archive_s3(
+    saverManager: s3.SaverManager,
+    prefix: str = "",
+) -> Iterator[Tuple[str, str, str]]:
+    """
+    yields `(guid, bucket_name, key)` for every original in the archive
+    bucket, from a listing
+    """
+    assert saverManager._saverConfig
+    bucket_name = saverManager._saverConfig.bucket_archive_name
+    if not bucket_name:
+        raise errors.ImageError_ConfigError("the saver has no `bucket_archive_name`")
+    content_addressed = saverManager._saverConfig.archive_content_addressed
+    suffix = ".archive.json"
+    paginator = saverManager.s3_client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+        for item in page.get("Contents", []):
+            key = item["Key"]
+            if content_addressed:
+                if key.endswith(suffix):
+                    yield (key[: -len(suffix)], bucket_name, key)
+            else:
+                guid = _guid_from_filename(key)
+                if guid is not None:
+                    yield (guid, bucket_name, key)
+
+
+def _s3_object_read(saverManager: s3.SaverManager, bucket_name: str, key: str) -> bytes:
+    response = saverManager.s3_client.get_object(Bucket=bucket_name, Key=key)
+    return response["Body"].read()
+
+
+def _archive_items(
+    saverManager: TYPE_SaverManager,
+    checkpoint: Optional[Checkpoint],
+    stats: RebuildStats,
+    archive: Optional[str] = None,
+    prefix: str = "",
+) -> Iterator[TYPE_archive_item]:
+    """
+    yields `(guid, path or data)` for every original not in `checkpoint`.
+    s3 objects are only downloaded as they are needed.
+    """
+    assert saverManager._saverConfig
+    content_addressed = saverManager._saverConfig.archive_content_addressed
+    if (archive is None) and isinstance(saverManager, s3.SaverManager):
+        for guid, bucket_name, key in iter_archive_s3(saverManager, prefix=prefix):
+            if (checkpoint is not None) and (guid in checkpoint):
+                stats.skipped += 1
+                continue
+            if content_addressed:
+                pointer = saverManager.archive_pointer_load(guid)
+                (bucket_name, key) = (pointer["bucket"], pointer["key"])
+            yield (guid, _s3_object_read(saverManager, bucket_name, key))
+        return
+
+    if archive is None:
+        assert isinstance(saverManager._saverConfig, localfile.SaverConfig)
+        archive = os.path.join(
+            saverManager._saverConfig.filedir,
+            saverManager._saverConfig.subdir_archive_name,
+        )
+    for guid, path in iter_archive_localfile(archive, content_addressed):
+        if (checkpoint is not None) and (guid in checkpoint):
+            stats.skipped += 1
+            continue
+        yield (guid, path)
+
+
+def rebuild(
+    resizerConfig: ResizerConfig,
+    saverManager: TYPE_SaverManager,
+    sizes: Sequence[str],
+    checkpoint: Optional[Checkpoint] = None,
+    archive: Optional[str] = None,
+    prefix: str = "",
+    max_workers: Optional[int] = None,
+    dry_run: bool = False,
+    executor: Optional[concurrent.futures.Executor] = None,
+) -> RebuildStats:
+    """
+    re-renders `sizes` of every original in the archive, and saves them.
+
+    `resizerConfig`
+        the config of the saver; `sizes` must be in its `resizesSchema`
+    `checkpoint`
+        an optional `Checkpoint`; finished guids are skipped and recorded
+    `archive`
+        a local directory; default the archive of `saverManager`
+    `prefix`
+        limits the listing of an s3 archive
+    `executor`
+        passed to `batch.BatchResizer`; default a new process pool
+    """
+    stats = RebuildStats()
+    t_start = time.perf_counter()
+    # the originals are not saved again, so they are not optimized
+    resizerConfig_render = ResizerConfig(
+        resizesSchema=resizerConfig.resizesSchema,
+        selected_resizes=list(sizes),
+        optimize_original=False,
+        optimize_resized=resizerConfig.optimize_resized,
+        icc_to_srgb=resizerConfig.icc_to_srgb,
+        digest_algorithms=resizerConfig.digest_algorithms,
+    )
+    batchResizer = BatchResizer(
+        resizerConfig_render, max_workers=max_workers, executor=executor
+    )
+    items = _archive_items(
+        saverManager, checkpoint, stats, archive=archive, prefix=prefix
+    )
+    try:
+        for guid, result in batchResizer.resize(items):
+            try:
+                if isinstance(result, Exception):
+                    raise result
+                if isinstance(saverManager, s3.SaverManager):
+                    saverManager.files_save(
+                        result,
+                        guid,
+                        archive_original=False,
+                        dry_run=dry_run,
+                        # keep the entries which are not saved again: the
+                        # other sizes and the archive, so the manifest still
+                        # lists everything for `files_delete_by_guid`
+                        manifest_merge=True,
+                    )
+                else:
+                    saverManager.files_save(
+                        result, guid, archive_original=False, dry_run=dry_run
+                    )
+            except Exception as exc:
+                stats.failed += 1
+                log.error("could not rebuild `%s`: %s", guid, exc)
+                continue
+            stats.rebuilt += 1
+            if (checkpoint is not None) and not dry_run:
+                checkpoint.add(guid)
+    finally:
+        stats.seconds = time.perf_counter() - t_start
+    return stats
+
+
+def sizes_to_render(
+    resizerConfig: ResizerConfig,
+    sizes: Optional[Sequence[str]] = None,
+    previous: Optional[ResizerConfig] = None,
+) -> List[str]:
+    """
+    the sizes a rebuild renders: `sizes`, or the sizes which differ from
+    `previous`, or every selected size
+    """
+    if sizes:
+        for size in sizes:
+            if size not in resizerConfig.resizesSchema:
+                raise errors.ImageError_ConfigError(
+                    "size is not in `resizesSchema` (%s)" % size
+                )
+        return list(sizes)
+    if previous is not None:
+        return resizerConfig.diff(previous).regenerate
+    return sorted(resizerConfig.selected_resizes)
+
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="imagehelper-rebuild",
+        description="Re-render sizes from the archived originals.",
+    )
+    parser.add_argument("config", help="a JSON or TOML config file")
+    parser.add_argument(
+        "--archive",
+        help="a local archive directory; default: the archive of the saver",
+    )
+    parser.add_argument("--prefix", default="", help="limits an s3 listing")
+    parser.add_argument(
+        "--sizes", help="comma separated sizes; default: every selected size"
+    )
+    parser.add_argument(
+        "--changed-from",
+        metavar="OLD_CONFIG",
+        help="only render the sizes which changed since this config",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        default="imagehelper-rebuild.checkpoint",
+        help="records finished guids, so the job can resume",
+    )
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.WARNING)
+    try:
+        config = config_load(args.config)
+        resizerConfig = resizerConfig_from_config(config)
+        previous = None
+        if args.changed_from:
+            previous = resizerConfig_from_config(config_load(args.changed_from))
+        sizes = sizes_to_render(
+            resizerConfig,
+            sizes=args.sizes.split(",") if args.sizes else None,
+            previous=previous,
+        )
+        saverManager = saverManager_from_config(config, resizerConfig)
+    except errors.ImageError as exc:
+        print("imagehelper-rebuild: %s" % exc, file=sys.stderr)
+        return 2
+    if not sizes:
+        print("imagehelper-rebuild: no sizes changed", file=sys.stderr)
+        return 0
+
+    job_fingerprint = fingerprint(
+        sorted(sizes), {size: resizerConfig.size_fingerprint(size) for size in sizes}
+    )
+    checkpoint = None
+    if not args.dry_run:
+        try:
+            checkpoint = Checkpoint(args.checkpoint, job_fingerprint)
+        except errors.ImageError as exc:
+            print("imagehelper-rebuild: %s" % exc, file=sys.stderr)
+            return 2
+    try:
+        stats = rebuild(
+            resizerConfig,
+            saverManager,
+            sizes,
+            checkpoint=checkpoint,
+            archive=args.archive,
+            prefix=args.prefix,
+            max_workers=args.workers,
+            dry_run=args.dry_run,
+        )
+    finally:
+        if checkpoint is not None:
+            checkpoint.close()
+    print(json.dumps(dict(stats.as_dict(), sizes=sizes), sort_keys=True))
+    return 1 if stats.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
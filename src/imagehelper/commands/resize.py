@@ -0,0 +1,247 @@
+"""
+`imagehelper`: resizes a directory of images with a schema file.
+
+    imagehelper schema.toml photos/ --output resized/ --workers 8
+    imagehelper schema.json "photos/**/*.jpg" --no-optimize --dry-run
+
+The schema file is a config (see `imagehelper.commands`), or just a
+`ResizesSchema`. Inputs are directories (their files, not their
+subdirectories) or globs. Images are resized on a process pool with
+`batch.BatchResizer` and written with `saver.localfile`; the guid of each
+image is its filename without the extension.
+
+When the run finishes, the throughput (images/sec, MB/sec) and the seconds
+spent in each stage are reported; `--json` prints them as JSON instead.
+"""
+
+# stdlib
+import argparse
+import glob
+import json
+import logging
+import os
+import sys
+import time
+from typing import Any
+from typing import Dict
+from typing import Iterator
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+
+# local
+from . import config_load
+from . import resizerConfig_from_config
+from . import saverManager_from_config
+from .. import errors
+from ..batch import BatchResizer
+from ..batch import BatchStats
+from ..resizer import ResizerConfig
+from ..saver import localfile
+
+# ==============================================================================
+
+log = logging.getLogger(__name__)
+
+DEFAULT_OUTPUT = "imagehelper-output"
+
+
+def iter_inputs(inputs: Sequence[str]) -> Iterator[str]:
+    """
+    yields the path of every file in `inputs`, which are directories or globs;
+    each path is yielded once
+    """
+    seen = set()
+    for _input in inputs:
+        if os.path.isdir(_input):
+            with os.scandir(_input) as entries:
+                paths = sorted(
+                    entry.path
+                    for entry in entries
+                    if entry.is_file() and not entry.name.startswith(".")
+                )
+        else:
+            paths = sorted(glob.glob(_input, recursive=True))
+        for path in paths:
+            if (path not in seen) and os.path.isfile(path):
+                seen.add(path)
+                yield path
+
+
+def guid_from_path(path: str) -> str:
+    """the guid of an input file; its filename without the extension"""
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def config_localfile(
+    config: Dict[str, Any],
+    output: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    `config`, with a `saver` for `saver.localfile`; `output` replaces
+    `saver.filedir`
+    """
+    saver = dict(config.get("saver") or {})
+    if saver.get("type", "localfile") != "localfile":
+        # this command only writes local files; the other options do not apply
+        saver = {}
+    saver["type"] = "localfile"
+    saver.setdefault("archive_original", False)
+    if output is not None:
+        saver["filedir"] = output
+    saver.setdefault("filedir", DEFAULT_OUTPUT)
+    return dict(config, saver=saver)
+
+
+def resize(
+    resizerConfig: ResizerConfig,
+    saverManager: localfile.SaverManager,
+    paths: Iterator[str],
+    max_workers: Optional[int] = None,
+    dry_run: bool = False,
+    archive_original: Optional[bool] = None,
+) -> Tuple[BatchStats, int, Dict[str, str]]:
+    """
+    resizes and saves every file in `paths`; `archive_original` is passed to
+    `files_save`.
+
+    returns a tuple of the `batch.BatchStats`, with the seconds spent saving
+    as `stage_seconds["save"]`; the number of images saved; and a `dict` of
+    `{path: error}` for the others
+    """
+    failed: Dict[str, str] = {}
+    guids: Dict[str, str] = {}
+    batchResizer = BatchResizer(resizerConfig, max_workers=max_workers)
+    save_seconds = 0.0
+    saved = 0
+    for path, result in batchResizer.resize(paths):
+        try:
+            if isinstance(result, Exception):
+                raise result
+            guid = guid_from_path(path)
+            if guid in guids:
+                raise errors.ImageError_DuplicateAction(
+                    "`%s` has the same name as `%s`" % (path, guids[guid])
+                )
+            guids[guid] = path
+            t_start = time.perf_counter()
+            saverManager.files_save(
+                result,
+                guid,
+                archive_original=archive_original,
+                dry_run=dry_run,
+            )
+            save_seconds += time.perf_counter() - t_start
+            saved += 1
+        except Exception as exc:
+            failed[path] = "%s: %s" % (exc.__class__.__name__, exc)
+            log.error("could not resize `%s`: %s", path, exc)
+            continue
+        log.debug("resized `%s`", path)
+    stats = batchResizer.stats
+    stats.stage_seconds["save"] = save_seconds
+    return (stats, saved, failed)
+
+
+def report(stats: BatchStats, saved: int, failed: Dict[str, str]) -> str:
+    """a human readable summary"""
+    lines = [
+        "images:   %s (%s failed)" % (saved, len(failed)),
+        "seconds:  %.3f" % stats.seconds,
+        "images/s: %.2f" % stats.images_per_second,
+        "MB/s:     %.2f" % stats.mb_per_second,
+        "MB in:    %.2f" % (stats.bytes_in / 1048576),
+        "MB out:   %.2f" % (stats.bytes_out / 1048576),
+        "stages (seconds, summed across workers):",
+    ]
+    for stage, seconds in stats.stage_seconds.items():
+        lines.append("    %-8s %.3f" % (stage, seconds))
+    for path, error in sorted(failed.items()):
+        lines.append("failed: %s - %s" % (path, error))
+    return "\n".join(lines)
+
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="imagehelper",
+        description="Resize a directory of images with a schema file.",
+    )
+    parser.add_argument("schema", help="a JSON or TOML schema or config file")
+    parser.add_argument("inputs", nargs="+", help="directories or globs")
+    parser.add_argument(
+        "-o",
+        "--output",
+        help="the output directory; default `saver.filedir`, or `%s`" % DEFAULT_OUTPUT,
+    )
+    parser.add_argument(
+        "--sizes", help="comma separated sizes; default: every selected size"
+    )
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument(
+        "--optimize",
+        dest="optimize",
+        action="store_true",
+        default=None,
+        help="optimize the resized images with the external tools",
+    )
+    parser.add_argument("--no-optimize", dest="optimize", action="store_false")
+    parser.add_argument(
+        "--archive-original",
+        dest="archive_original",
+        action="store_true",
+        default=None,
+        help="also save the original; default `saver.archive_original`",
+    )
+    parser.add_argument(
+        "--no-archive-original", dest="archive_original", action="store_false"
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true", help="resize, but do not write files"
+    )
+    parser.add_argument("--json", action="store_true", help="print stats as JSON")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.WARNING)
+    try:
+        config = config_load(args.schema)
+        overrides: Dict[str, Any] = {}
+        if args.sizes:
+            overrides["selected_resizes"] = args.sizes.split(",")
+        if args.optimize is not None:
+            overrides["optimize_resized"] = args.optimize
+        resizerConfig = resizerConfig_from_config(config, **overrides)
+        config = config_localfile(config, output=args.output)
+        saverManager = saverManager_from_config(config, resizerConfig)
+        assert isinstance(saverManager, localfile.SaverManager)
+        archive_original = args.archive_original
+        if archive_original is None:
+            archive_original = config["saver"]["archive_original"]
+    except errors.ImageError as exc:
+        print("imagehelper: %s" % exc, file=sys.stderr)
+        return 2
+
+    (stats, saved, failed) = resize(
+        resizerConfig,
+        saverManager,
+        iter_inputs(args.inputs),
+        max_workers=args.workers,
+        dry_run=args.dry_run,
+        archive_original=archive_original,
+    )
+    if args.json:
+        print(
+            json.dumps(
+                dict(stats.as_dict(), saved=saved, failed=failed), sort_keys=True
+            )
+        )
+    else:
+        print(report(stats, saved, failed))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
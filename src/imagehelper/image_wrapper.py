@@ -1,11 +1,21 @@
 # stdlib
+import asyncio
 import cgi
+from collections import OrderedDict
+import hashlib
 import io
 import logging
+import shlex
 import tempfile
+import threading
+from types import ModuleType
+from typing import Any
 from typing import Dict
+from typing import Generator
+from typing import IO
 from typing import List
 from typing import Optional
+from typing import Sequence
 from typing import Tuple
 from typing import Union
 
@@ -19,34 +29,29 @@ import envoy
 # local
 from . import _io
 from . import errors
+from . import perceptual
 from . import utils
 from ._types import ResizerInstructions
+from .utils import ANTIALIAS
 
-# ==============================================================================
-
-log = logging.getLogger(__name__)
-
-
+# conditional import; Pillow may be built without littlecms
+ImageCms: Optional[ModuleType]
 try:
-    # PIL.__version__>=9.0.0
-    ANTIALIAS = Image.Resampling.LANCZOS
-except AttributeError:
-    # PIL.__version__<9.0.0
-    # py3.6
-    ANTIALIAS = Image.ANTIALIAS  # type: ignore [attr-defined]
+    from PIL import ImageCms
+except ImportError:
+    ImageCms = None
 
+# ==============================================================================
 
-# import PIL
-# _pil_version = PIL.__version__.split(".")
-# if int(_pil_version[0]) < 9:
-#     # this should only be py36
-#     ANTIALIAS = Image.ANTIALIAS
-# else:
-#     ANTIALIAS = Image.Resampling.LANCZOS
+log = logging.getLogger(__name__)
 
 
 USE_THUMBNAIL: bool = False
 
+# digests which are computed while files are written
+# any `hashlib` algorithm, `crc32` or `crc32c` (requires the `crc32c` package)
+DIGEST_ALGORITHMS: Tuple[str, ...] = ("md5",)
+
 _valid_types = [
     cgi.FieldStorage,
     _io._FilelikePreference,
@@ -174,6 +179,88 @@ def autodetect_support(
     _OPTIMIZE_SUPPORT_DETECTED = True
 
 
+async def _async_run(command: str) -> int:
+    """
+    asyncio counterpart to `envoy.run(command).status_code`
+    returns 127 if the program does not exist, like a shell would
+    """
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            *shlex.split(command),
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+    except FileNotFoundError:
+        return 127
+    try:
+        return await proc.wait()
+    except asyncio.CancelledError:
+        proc.kill()
+        await proc.wait()
+        raise
+
+
+# ------------------------------------------------------------------------------
+
+# ICC transforms are expensive to build, so they are cached in a LRU
+# keys are `(sha1 of the embedded profile, image mode, rendering intent)`
+ICC_TRANSFORM_CACHE_SIZE: int = 32
+_ICC_TRANSFORM_CACHE: "OrderedDict[Tuple[str, str, int], Any]" = OrderedDict()
+_ICC_TRANSFORM_CACHE_LOCK = threading.Lock()
+_ICC_PROFILE_SRGB: Optional[Any] = None
+
+# input mode -> output mode
+_ICC_TRANSFORM_MODES: Dict[str, str] = {
+    "RGB": "RGB",
+    "RGBA": "RGBA",
+    "CMYK": "RGB",
+}
+
+
+def icc_transform_srgb(
+    icc_profile: bytes,
+    mode: str,
+    intent: int = 0,
+) -> Tuple[Any, str]:
+    """
+    returns a tuple of (`ImageCms.ImageCmsTransform`, output_mode) which will
+    convert an image of `mode` with the embedded `icc_profile` into sRGB.
+
+    `intent`
+        the ICC rendering intent; 0 (perceptual) by default
+
+    transforms are memoized into an LRU of `ICC_TRANSFORM_CACHE_SIZE`
+    """
+    if ImageCms is None:
+        raise ImportError("`PIL.ImageCms` was not available for import")
+    if mode not in _ICC_TRANSFORM_MODES:
+        raise ValueError("unsupported mode for ICC transform: `%s`" % mode)
+    output_mode = _ICC_TRANSFORM_MODES[mode]
+    key = (hashlib.sha1(icc_profile).hexdigest(), mode, intent)
+    with _ICC_TRANSFORM_CACHE_LOCK:
+        if key in _ICC_TRANSFORM_CACHE:
+            _ICC_TRANSFORM_CACHE.move_to_end(key)
+            return _ICC_TRANSFORM_CACHE[key], output_mode
+
+    global _ICC_PROFILE_SRGB
+    if _ICC_PROFILE_SRGB is None:
+        _ICC_PROFILE_SRGB = ImageCms.createProfile("sRGB")
+    transform = ImageCms.buildTransform(
+        ImageCms.ImageCmsProfile(io.BytesIO(icc_profile)),
+        _ICC_PROFILE_SRGB,
+        mode,
+        output_mode,
+        renderingIntent=intent,
+    )
+
+    with _ICC_TRANSFORM_CACHE_LOCK:
+        _ICC_TRANSFORM_CACHE[key] = transform
+        _ICC_TRANSFORM_CACHE.move_to_end(key)
+        while len(_ICC_TRANSFORM_CACHE) > ICC_TRANSFORM_CACHE_SIZE:
+            _ICC_TRANSFORM_CACHE.popitem(last=False)
+    return transform, output_mode
+
+
 # ==============================================================================
 
 
@@ -207,6 +294,10 @@ class BasicImage(object):
     # `None` by default. If `optimize` is run, it becomes a list of external tool + status
     optimizations: Optional[List] = None
 
+    # memoized `file_size` and digests; reset whenever `file` is replaced
+    _file_size: Optional[int] = None
+    _digests: Optional[Dict[str, str]] = None
+
     def __init__(
         self,
         fileObject: io.BytesIO,
@@ -217,6 +308,8 @@ class BasicImage(object):
         height: Optional[int] = None,
         is_image_animated: Optional[bool] = None,
         animated_image_totalframes: Optional[int] = None,
+        file_size: Optional[int] = None,
+        digests: Optional[Dict[str, str]] = None,
     ):
         """
         :arg fileObject: the resized file
@@ -227,9 +320,13 @@ class BasicImage(object):
         :param height: default None
         :param is_image_animated: default None
         :param animated_image_totalframes: default None
+        :param file_size: default None; precomputed size of `fileObject`
+        :param digests: default None; precomputed `{algorithm: hexdigest}`
         """
         self.file = fileObject
         self.file.seek(0)  # be kind, rewind
+        self._file_size = file_size
+        self._digests = dict(digests) if digests else {}
         self.name = name
         self.format = format
         self.mode = mode
@@ -241,19 +338,62 @@ class BasicImage(object):
 
     @property
     def file_size(self) -> int:
-        """property; calculate the file's size in bytes"""
-        return utils.file_size(self.file)
+        """property; calculate the file's size in bytes. memoized."""
+        if self._file_size is None:
+            self._file_size = utils.file_size(self.file)
+        return self._file_size
 
     @property
     def file_md5(self) -> str:
-        """property; calculate the file's md5"""
-        return utils.file_md5(self.file)
+        """property; calculate the file's md5. memoized."""
+        return self.digest("md5")
+
+    @property
+    def digests(self) -> Dict[str, str]:
+        """property; the digests which have been calculated so far"""
+        return dict(self._digests or {})
+
+    def digest(self, algorithm: str) -> str:
+        """calculate the file's digest for `algorithm`. memoized.
+
+        digests are usually computed while the file is written; this will
+        only read the file if `algorithm` was not computed at that time.
+        """
+        if self._digests is None:
+            self._digests = {}
+        if algorithm not in self._digests:
+            self._digests[algorithm] = utils.file_digest(self.file, algorithm)
+        return self._digests[algorithm]
+
+    def _reset_digests(self) -> None:
+        """invalidate the memoized `file_size` and digests"""
+        self._file_size = None
+        self._digests = {}
 
     @property
     def file_b64(self) -> bytes:
         """property; base64 encode the file"""
         return utils.file_b64(self.file)
 
+    @property
+    def file_envelope(self) -> bytes:
+        """property; encode the file into a binary envelope.
+        see `utils.envelope_encode`"""
+        fileobj_out = _io._FilelikePreference()
+        self.envelope_encode(fileobj_out)
+        return fileobj_out.getvalue()
+
+    def envelope_encode(self, fileobj_out) -> int:
+        """stream the file, as a binary envelope, into `fileobj_out`"""
+        return utils.envelope_encode(
+            self.file,
+            fileobj_out,
+            format=self.format,
+            width=self.width,
+            height=self.height,
+            digests=self.digests,
+        )
+
     @property
     def format_standardized(self) -> Optional[str]:
         """proxied format; standardized version"""
@@ -284,10 +424,68 @@ class BasicImage(object):
             return
         log.debug("optimizing a file.  format is: %s" % self.format_standardized)
 
-        FilelikePreference = _io._FilelikePreference
+        # run the autodetect
+        if not _OPTIMIZE_SUPPORT_DETECTED:
+            autodetect_support()
+
+        (fileInput, fileOutput, filesize_original) = self._optimize_prepare()
+        try:
+            steps = self._optimize_steps(fileInput.name, fileOutput.name)
+            try:
+                command = next(steps)
+                while True:
+                    r = envoy.run(command)
+                    command = steps.send(r.status_code)
+            except StopIteration as exc:
+                optimizations = exc.value
+            self._optimize_finish(optimizations, fileOutput, filesize_original)
+        finally:
+            # done with these, so close
+            fileInput.close()
+            fileOutput.close()
+
+    async def aoptimize(
+        self,
+    ) -> None:
+        """asyncio version of `optimize`
+
+        the external programs are awaited via `asyncio.create_subprocess_exec`
+        and are killed if the task is cancelled.
+        """
+        if self.format_standardized not in ("jpg", "png", "gif"):
+            return
+        log.debug("optimizing a file.  format is: %s" % self.format_standardized)
+
+        # run the autodetect; this blocks, so it is run in the default executor
+        if not _OPTIMIZE_SUPPORT_DETECTED:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, autodetect_support)
+
+        (fileInput, fileOutput, filesize_original) = self._optimize_prepare()
+        try:
+            steps = self._optimize_steps(fileInput.name, fileOutput.name)
+            try:
+                command = next(steps)
+                while True:
+                    status_code = await _async_run(command)
+                    command = steps.send(status_code)
+            except StopIteration as exc:
+                optimizations = exc.value
+            self._optimize_finish(optimizations, fileOutput, filesize_original)
+        finally:
+            # done with these, so close
+            fileInput.close()
+            fileOutput.close()
+
+    def _optimize_prepare(
+        self,
+    ) -> Tuple[IO[bytes], IO[bytes], int]:
+        """
+        we need to write the image onto the disk with an infile and outfile
+        this does suck.
 
-        # we need to write the image onto the disk with an infile and outfile
-        # this does suck.
+        returns a tuple of (fileInput, fileOutput, filesize_original)
+        """
         self.file.seek(0)
         fileInput = tempfile.NamedTemporaryFile()
         if hasattr(self.file, "getvalue"):
@@ -301,17 +499,21 @@ class BasicImage(object):
         fileInput.seek(0)
         fileOutput = tempfile.NamedTemporaryFile()  # keep this open for the next block
 
-        _fname_input = fileInput.name
-        _fname_output = fileOutput.name
-
         # we need this for filesavings
         filesize_original = utils.file_size(fileInput)
+        return (fileInput, fileOutput, filesize_original)
 
-        # run the autodetect
-        if not _OPTIMIZE_SUPPORT_DETECTED:
-            autodetect_support()
+    def _optimize_steps(
+        self,
+        _fname_input: str,
+        _fname_output: str,
+    ) -> Generator[str, int, List[Tuple[str, bool]]]:
+        """
+        generates the commands for the external programs.
 
-        _optimized = False
+        each command is yielded; the caller must run it and `send()` back the
+        status code. the list of optimizations is returned.
+        """
         optimizations = []
         if self.format_standardized == "jpg":
             if (
@@ -324,12 +526,11 @@ class BasicImage(object):
                     if OPTIMIZE_SUPPORT["jpegtran"]["options"]["progressive"]
                     else ""
                 )
-                r = envoy.run(
+                status_code = yield (
                     """%s -copy all -optimize %s -outfile %s %s"""
                     % (_binary, _progressive, _fname_output, _fname_input)
                 )
-                if r.status_code != 127:
-                    _optimized = True
+                if status_code != 127:
                     optimizations.append(("jpegtran", True))
                 else:
                     optimizations.append(("jpegtran", False))
@@ -340,9 +541,10 @@ class BasicImage(object):
             ):
                 print("optimizing with jpegoptim")
                 _binary = OPTIMIZE_SUPPORT["jpegoptim"]["binary"] or "jpegoptim"
-                r = envoy.run("""%s --strip-all -q %s""" % (_binary, _fname_output))
-                if r.status_code != 127:
-                    _optimized = True
+                status_code = yield (
+                    """%s --strip-all -q %s""" % (_binary, _fname_output)
+                )
+                if status_code != 127:
                     optimizations.append(("jpegoptim", True))
                 else:
                     optimizations.append(("jpegoptim", False))
@@ -354,12 +556,11 @@ class BasicImage(object):
             ):
                 _binary = OPTIMIZE_SUPPORT["gifsicle"]["binary"] or "gifsicle"
                 _gifsicle_level = OPTIMIZE_SUPPORT["gifsicle"]["options"]["level"]
-                r = envoy.run(
+                status_code = yield (
                     """%s -O%d %s --output %s"""
                     % (_binary, _gifsicle_level, _fname_input, _fname_output)
                 )
-                if r.status_code != 127:
-                    _optimized = True
+                if status_code != 127:
                     optimizations.append(("gifsicle", True))
                 else:
                     optimizations.append(("gifsicle", False))
@@ -372,13 +573,12 @@ class BasicImage(object):
                 _binary = OPTIMIZE_SUPPORT["pngcrush"]["binary"] or "pngcrush"
                 # envoy.run("""pngcrush -rem alla -reduce -brute -q %s %s""" % (_fname_input, _fname_output))
                 # envoy.run("""pngcrush -rem alla -reduce -q %s %s""" % (_fname_input, _fname_output))
-                r = envoy.run(
+                status_code = yield (
                     """%s -rem alla -nofilecheck -bail -blacken -reduce -cc %s %s"""
                     % (_binary, _fname_input, _fname_output)
                 )
-                if r.status_code != 127:
+                if status_code != 127:
                     _fname_input = _fname_output
-                    _optimized = True
                     optimizations.append(("pngcrush", True))
                 else:
                     optimizations.append(("pngcrush", False))
@@ -390,13 +590,12 @@ class BasicImage(object):
                 _binary = OPTIMIZE_SUPPORT["optipng"]["binary"] or "optipng"
                 _optipng_level = OPTIMIZE_SUPPORT["optipng"]["options"]["level"]
                 # note that we do `--out OUTPUT --(stop) INPUT
-                r = envoy.run(
+                status_code = yield (
                     """%s -i0 -o%d -out %s -- %s"""
                     % (_binary, _optipng_level, _fname_output, _fname_input)
                 )
-                if r.status_code != 127:
+                if status_code != 127:
                     _fname_input = _fname_output
-                    _optimized = True
                     optimizations.append(("optipng", True))
                 else:
                     optimizations.append(("optipng", False))
@@ -408,18 +607,29 @@ class BasicImage(object):
                 _binary = OPTIMIZE_SUPPORT["advpng"]["binary"] or "advpng"
                 _advpng_level = OPTIMIZE_SUPPORT["advpng"]["options"]["level"]
                 # note that we do `--out OUTPUT --(stop) INPUT
-                r = envoy.run(
+                status_code = yield (
                     """%s -%d -z %s""" % (_binary, _advpng_level, _fname_output)
                 )
-                if r.status_code != 127:
+                if status_code != 127:
                     _fname_input = _fname_output
-                    _optimized = True
                     optimizations.append(("advpng", True))
                 else:
                     optimizations.append(("advpng", False))
 
+        return optimizations
+
+    def _optimize_finish(
+        self,
+        optimizations: List[Tuple[str, bool]],
+        fileOutput: IO[bytes],
+        filesize_original: int,
+    ) -> None:
+        """stash the results of the external programs onto the object"""
+        FilelikePreference = _io._FilelikePreference
+
         # stash this onto the object
         self.optimizations = optimizations
+        _optimized = any(_status for (_tool, _status) in optimizations)
 
         if not _optimized:
             self.file.seek(0)
@@ -433,6 +643,7 @@ class BasicImage(object):
             newFile.write(fileOutput.read())
             newFile.seek(0)
             self.file = newFile
+            self._reset_digests()
             self.is_optimized = True
 
             # so how much did we save?
@@ -442,10 +653,6 @@ class BasicImage(object):
             log.debug("optimization_savings = %s" % optimization_savings)
             self.optimization_savings = optimization_savings
 
-        # done with these, so close
-        fileInput.close()
-        fileOutput.close()
-
 
 class ResizedImage(BasicImage):
     """A class for a ResizedImage Result."""
@@ -492,18 +699,37 @@ class ImageWrapper(object):
     basicImage: BasicImage
     pilObject: Image.Image
 
+    # `True` if the working raster was converted into sRGB
+    icc_converted: bool = False
+
+    # memoized `perceptual_hash`; keys are `(algorithm, hash_size)`
+    _perceptual_hashes: Optional[Dict[Tuple[str, int], int]] = None
+
     def get_original(self):
         return self.basicImage
 
     def __del__(self):
         if self.pilObject is not None:
-            self.pilObject.close()
+            self._pilObject_close()
+
+    def _pilObject_close(self) -> None:
+        # Pillow keeps the file of some formats (PNG) open, and closes it
+        # here; it is the file of `basicImage`, which may outlive the pilObject
+        basicImage = getattr(self, "basicImage", None)
+        if basicImage is not None:
+            for attr in ("fp", "_fp"):
+                if getattr(self.pilObject, attr, None) is basicImage.file:
+                    setattr(self.pilObject, attr, None)
+        self.pilObject.close()
 
     def __init__(
         self,
         imagefile: io.IOBase,
         imagefile_name: Optional[str] = None,
         FilelikePreference: Optional[_io.TYPES_FilelikeSupported] = None,
+        icc_to_srgb: bool = False,
+        icc_intent: int = 0,
+        digest_algorithms: Optional[Sequence[str]] = None,
     ):
         """
         registers and validates the image file
@@ -524,6 +750,19 @@ class ImageWrapper(object):
             preference class for filelike objects
                 _io._FilelikePreference
                 tempfile.SpooledTemporaryFile
+
+        `icc_to_srgb`
+            default `False`
+            if `True` and the image has an embedded ICC profile, the working
+            raster is converted into sRGB once; every resize uses the
+            converted raster. the original file is untouched.
+
+        `icc_intent`
+            the ICC rendering intent used by `icc_to_srgb`; 0 (perceptual)
+
+        `digest_algorithms`
+            digests to compute while copying the file.
+            defaults to `DIGEST_ALGORITHMS`
         """
         if imagefile is None:
             raise errors.ImageError_MissingFile(utils.ImageErrorCodes.MISSING_FILE)
@@ -592,10 +831,14 @@ class ImageWrapper(object):
             if FilelikePreference is None:
                 FilelikePreference = _io._FilelikePreference
 
+            if digest_algorithms is None:
+                digest_algorithms = DIGEST_ALGORITHMS
+
             # create a new image
             # and stash our data!
             fh_imageData = FilelikePreference()
-            fh_imageData.write(file_data)
+            _writer = utils.HashingWriter(fh_imageData, digest_algorithms)
+            _writer.write(file_data)
             fh_imageData.seek(0)
             fh_name = imagefile_name or file_name
 
@@ -619,9 +862,14 @@ class ImageWrapper(object):
                 animated_image_totalframes=utils.animated_image_totalframes(
                     self.pilObject
                 ),
+                file_size=_writer.bytes_written,
+                digests=_writer.hexdigests(),
             )
             self.basicImage = wrappedImage
 
+            if icc_to_srgb:
+                self._convert_icc_to_srgb(intent=icc_intent)
+
         except IOError as exc:
             log.debug("encountered an IOError. Exception is: `%s`", exc)
             raise errors.ImageError_Parsing(utils.ImageErrorCodes.INVALID_FILETYPE)
@@ -634,10 +882,69 @@ class ImageWrapper(object):
             log.debug("encountered unknown exception: `%s`", exc)
             raise
 
+    def _convert_icc_to_srgb(self, intent: int = 0) -> None:
+        """converts the working raster into sRGB, if there is an ICC profile"""
+        icc_profile = self.pilObject.info.get("icc_profile")
+        if not icc_profile:
+            return
+        if self.basicImage.is_image_animated:
+            log.debug("icc_to_srgb: skipping animated image")
+            return
+        if self.pilObject.mode not in _ICC_TRANSFORM_MODES:
+            log.debug("icc_to_srgb: unsupported mode `%s`", self.pilObject.mode)
+            return
+        if ImageCms is None:
+            log.debug("icc_to_srgb: `PIL.ImageCms` is not available")
+            return
+        try:
+            (transform, output_mode) = icc_transform_srgb(
+                icc_profile, self.pilObject.mode, intent=intent
+            )
+            converted = ImageCms.applyTransform(self.pilObject, transform)
+        except (ImageCms.PyCMSError, OSError) as exc:
+            # an unreadable profile, or one for another colorspace; the image
+            # itself decoded fine, so keep it unconverted
+            log.warning("icc_to_srgb: could not apply the ICC profile: %s", exc)
+            return
+        assert converted is not None
+        converted.info.pop("icc_profile", None)
+        self._pilObject_close()
+        self.pilObject = converted
+        self.icc_converted = True
+
+    def perceptual_hash(self, algorithm: str = "dhash", hash_size: int = 8) -> int:
+        """
+        returns the perceptual hash of the image, an `int` of `hash_size ** 2`
+        bits; see `imagehelper.perceptual`
+
+        `algorithm`
+            "dhash" (default) or "phash"; "phash" requires `numpy`
+
+        the original file is draft-decoded at a reduced scale, as in
+        `perceptual.hash_file`, rather than converting the decoded raster.
+        an image converted by `icc_to_srgb` is hashed from its raster.
+        """
+        if algorithm not in perceptual.ALGORITHMS:
+            raise ValueError("invalid algorithm: `%s`" % algorithm)
+        if self._perceptual_hashes is None:
+            self._perceptual_hashes = {}
+        key = (algorithm, hash_size)
+        if key not in self._perceptual_hashes:
+            if self.icc_converted:
+                self._perceptual_hashes[key] = perceptual.hash_image(
+                    self.pilObject, algorithm=algorithm, hash_size=hash_size
+                )
+            else:
+                self._perceptual_hashes[key] = perceptual.hash_file(
+                    self.basicImage.file, algorithm=algorithm, hash_size=hash_size
+                )
+        return self._perceptual_hashes[key]
+
     def resize(
         self,
         instructions_dict: ResizerInstructions,
         FilelikePreference: Optional[_io.TYPES_FilelikeSupported] = None,
+        digest_algorithms: Optional[Sequence[str]] = None,
     ) -> ResizedImage:
         """this does the heavy lifting
 
@@ -690,6 +997,9 @@ class ImageWrapper(object):
                 set width and height to `None`
 
             `FilelikePreference` - default preference for file-like objects
+
+            `digest_algorithms` - digests to compute while encoding the file.
+                defaults to `DIGEST_ALGORITHMS`
         """
         # mypy typing
         if self.pilObject is None:
@@ -698,8 +1008,14 @@ class ImageWrapper(object):
         if FilelikePreference is None:
             FilelikePreference = _io._FilelikePreference
 
-        # we analyze the pilObject, because `copy()` only works on the frame
-        if utils.is_image_animated(self.pilObject):
+        if digest_algorithms is None:
+            digest_algorithms = DIGEST_ALGORITHMS
+
+        # analyzed when the pilObject was loaded, because `copy()` only works
+        # on the frame. seeking the pilObject again is not safe: its file is
+        # shared with `basicImage`, which rewinds it, and a GIF reads the next
+        # frame from wherever the file is
+        if self.basicImage.is_image_animated:
             allow_animated = False
             if "allow_animated" in instructions_dict:
                 allow_animated = instructions_dict["allow_animated"]
@@ -887,12 +1203,17 @@ class ImageWrapper(object):
         pil_options = _get_pil_options(format)
 
         # save the image !
+        # the digests are computed as the encoder writes
         resized_image_file = FilelikePreference()
-        resized_image.save(resized_image_file, format, **pil_options)
+        _writer = utils.HashingWriter(resized_image_file, digest_algorithms)
+        resized_image.save(_writer, format, **pil_options)
+        digests = _writer.hexdigests()
 
         return ResizedImage(
             resized_image_file,
             format=format,
             width=resized_image.size[0],
             height=resized_image.size[1],
+            file_size=_writer.bytes_written if digests else None,
+            digests=digests,
         )
@@ -0,0 +1,242 @@
+"""
+Perceptual hashes, for finding near-duplicate images.
+
+Exact duplicates have the same digest; re-encodes and rescales of an image do
+not. A perceptual hash is computed from a tiny grayscale version of the image,
+so near-duplicates have hashes which differ in only a few bits:
+
+    dhash   the gradient between neighboring pixels; fast
+    phash   the low frequencies of a DCT; more robust. requires `numpy`
+
+Hashes are `int`s of `hash_size ** 2` bits; compare them with `hamming`, or
+index them in a `BKTree`:
+
+    tree = BKTree()
+    for (guid, hash_) in stored_hashes:
+        tree.add(hash_, guid)
+
+    hash_ = imageWrapper.perceptual_hash("dhash")
+    for (distance, _hash, guid) in tree.search(hash_, max_distance=6):
+        ...
+
+`numpy` is used when it is installed; `dhash` falls back to pure python.
+"""
+
+# stdlib
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import IO
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+from typing import Union
+
+# pypi
+from PIL import Image
+
+# local
+from . import errors
+from .utils import ANTIALIAS
+from .utils import ImageErrorCodes
+
+# conditional import
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# ==============================================================================
+
+
+class NoNumpy(ImportError):
+    pass
+
+
+NO_NUMPY = NoNumpy("`numpy` was not available for import")
+
+ALGORITHMS = ("dhash", "phash")
+
+# `phash` is computed from a raster this many times larger than `hash_size`
+PHASH_HIGHFREQ_FACTOR = 4
+
+
+def hamming(hash_a: int, hash_b: int) -> int:
+    """the number of bits which differ between two hashes"""
+    return bin(hash_a ^ hash_b).count("1")
+
+
+def _bits_to_int(bits: Sequence[Any]) -> int:
+    value = 0
+    for bit in bits:
+        value = (value << 1) | bool(bit)
+    return value
+
+
+def _raster_size(algorithm: str, hash_size: int) -> Tuple[int, int]:
+    """the (width, height) of the grayscale raster for `algorithm`"""
+    if algorithm == "dhash":
+        return (hash_size + 1, hash_size)
+    elif algorithm == "phash":
+        return (hash_size * PHASH_HIGHFREQ_FACTOR, hash_size * PHASH_HIGHFREQ_FACTOR)
+    raise ValueError("invalid algorithm: `%s`" % algorithm)
+
+
+def _raster(pilObject: Image.Image, size: Tuple[int, int]) -> Image.Image:
+    """a grayscale `size` raster of `pilObject`"""
+    if pilObject.mode != "L":
+        pilObject = pilObject.convert("L")
+    # `reduce` is a cheap integer downscale; the final resize is small
+    factor = min(pilObject.size[0] // size[0], pilObject.size[1] // size[1]) // 2
+    if factor > 1:
+        pilObject = pilObject.reduce(factor)
+    return pilObject.resize(size, ANTIALIAS)
+
+
+def dhash_raster(raster: Image.Image) -> int:
+    """the difference hash of a grayscale `(hash_size + 1, hash_size)` raster"""
+    (width, height) = raster.size
+    if numpy is not None:
+        pixels = numpy.asarray(raster, dtype=numpy.int16)
+        return _bits_to_int((pixels[:, 1:] > pixels[:, :-1]).flatten().tolist())
+    # a grayscale raster is one byte per pixel
+    data = raster.tobytes()
+    bits = []
+    for row in range(height):
+        _start = row * width
+        for col in range(width - 1):
+            bits.append(data[_start + col + 1] > data[_start + col])
+    return _bits_to_int(bits)
+
+
+def _dct_matrix(n: int) -> Any:
+    """the orthonormal DCT-II matrix"""
+    assert numpy is not None
+    k = numpy.arange(n).reshape((n, 1))
+    i = numpy.arange(n).reshape((1, n))
+    matrix = numpy.cos(numpy.pi * (2 * i + 1) * k / (2 * n)) * numpy.sqrt(2.0 / n)
+    matrix[0, :] = numpy.sqrt(1.0 / n)
+    return matrix
+
+
+_dct_matrices: Dict[int, Any] = {}
+
+
+def phash_raster(raster: Image.Image, hash_size: int) -> int:
+    """the DCT hash of a grayscale square raster"""
+    if numpy is None:
+        raise NO_NUMPY
+    n = raster.size[0]
+    if n not in _dct_matrices:
+        _dct_matrices[n] = _dct_matrix(n)
+    matrix = _dct_matrices[n]
+    pixels = numpy.asarray(raster, dtype=numpy.float64)
+    dct = matrix @ pixels @ matrix.T
+    lowfreq = dct[:hash_size, :hash_size]
+    return _bits_to_int((lowfreq > numpy.median(lowfreq)).flatten().tolist())
+
+
+def hash_image(
+    pilObject: Image.Image,
+    algorithm: str = "dhash",
+    hash_size: int = 8,
+) -> int:
+    """the perceptual hash of a decoded image"""
+    raster = _raster(pilObject, _raster_size(algorithm, hash_size))
+    if algorithm == "phash":
+        return phash_raster(raster, hash_size)
+    return dhash_raster(raster)
+
+
+def hash_file(
+    fileobj: Union[str, IO[bytes]],
+    algorithm: str = "dhash",
+    hash_size: int = 8,
+) -> int:
+    """
+    the perceptual hash of an image file; `fileobj` is a path or a seekable
+    binary file, which is read in place.
+
+    JPEGs are draft-decoded, in grayscale, at the smallest scale (down to
+    1/8) that is still larger than the raster the hash needs.
+    """
+    size = _raster_size(algorithm, hash_size)
+    if not isinstance(fileobj, str):
+        fileobj.seek(0)
+    try:
+        with Image.open(fileobj) as pilObject:
+            pilObject.draft("L", (size[0] * 2, size[1] * 2))
+            return hash_image(pilObject, algorithm=algorithm, hash_size=hash_size)
+    except IOError:
+        raise errors.ImageError_Parsing(ImageErrorCodes.INVALID_FILETYPE)
+    finally:
+        if not isinstance(fileobj, str):
+            fileobj.seek(0)
+
+
+class _BKNode(object):
+    __slots__ = ("hash", "values", "children")
+
+    def __init__(self, hash_: int, value: Any):
+        self.hash = hash_
+        self.values = [value]
+        self.children: Dict[int, "_BKNode"] = {}
+
+
+class BKTree(object):
+    """
+    a Burkhard-Keller tree, for finding the hashes within a distance of a
+    hash without comparing it to every hash.
+
+    `distance`
+        a metric; default `hamming`
+    """
+
+    def __init__(self, distance: Callable[[int, int], int] = hamming):
+        self.distance = distance
+        self._root: Optional[_BKNode] = None
+        self._len = 0
+
+    def __len__(self) -> int:
+        return self._len
+
+    def add(self, hash_: int, value: Any = None) -> None:
+        """index `value` under `hash_`; a hash may have many values"""
+        self._len += 1
+        if self._root is None:
+            self._root = _BKNode(hash_, value)
+            return
+        node = self._root
+        while True:
+            distance = self.distance(hash_, node.hash)
+            if distance == 0:
+                node.values.append(value)
+                return
+            child = node.children.get(distance)
+            if child is None:
+                node.children[distance] = _BKNode(hash_, value)
+                return
+            node = child
+
+    def search(self, hash_: int, max_distance: int) -> List[Tuple[int, int, Any]]:
+        """
+        returns a list of `(distance, hash, value)` for every value indexed
+        within `max_distance` of `hash_`, nearest first
+        """
+        results: List[Tuple[int, int, Any]] = []
+        if self._root is None:
+            return results
+        candidates = [self._root]
+        while candidates:
+            node = candidates.pop()
+            distance = self.distance(hash_, node.hash)
+            if distance <= max_distance:
+                for value in node.values:
+                    results.append((distance, node.hash, value))
+            # the triangle inequality bounds the children worth visiting
+            for child_distance, child in node.children.items():
+                if abs(child_distance - distance) <= max_distance:
+                    candidates.append(child)
+        results.sort(key=lambda result: result[0])
+        return results
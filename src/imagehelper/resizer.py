@@ -1,15 +1,32 @@
 # stdlib
+import asyncio
+import concurrent.futures
+import functools
+import hashlib
 import io
+import json
 import logging
+from typing import Dict
+from typing import Iterator
+from typing import List
 from typing import Optional
+from typing import Sequence
+from typing import Tuple
+from typing import TYPE_CHECKING
+from typing import Union
 
 # local
 from . import errors
 from . import image_wrapper
 from . import utils
 from ._types import ResizesSchema as TYPE_ResizesSchema
+from ._types import TYPE_file_envelope
 from ._types import TYPE_resizes
 from ._types import TYPE_selected_resizes
+from .cache import fingerprint
+
+if TYPE_CHECKING:
+    from .cache import ResizeCache
 
 # ==============================================================================
 
@@ -76,12 +93,22 @@ class ResizerConfig(object):
 
         `optimize` - True / False
 
+    `digest_algorithms`: digests computed while the original is copied and
+        each size is encoded; see `image_wrapper.DIGEST_ALGORITHMS`.
+        any `hashlib` algorithm, `crc32` or `crc32c`
+
+    `icc_to_srgb`: if `True`, images with an embedded ICC profile are
+        converted into sRGB once, before any resizing. this fixes washed out
+        colors from wide-gamut (Display P3, AdobeRGB) uploads.
+
     """
 
     resizesSchema: TYPE_ResizesSchema
     selected_resizes: TYPE_selected_resizes
     optimize_original: Optional[bool] = None
     optimize_resized: bool = False
+    icc_to_srgb: bool = False
+    digest_algorithms: Optional[Sequence[str]] = None
     # original_allow_animated = None
 
     def __init__(
@@ -91,6 +118,8 @@ class ResizerConfig(object):
         is_subclass: bool = False,
         optimize_original: Optional[bool] = None,
         optimize_resized: bool = False,
+        icc_to_srgb: bool = False,
+        digest_algorithms: Optional[Sequence[str]] = None,
         # original_allow_animated=None,
     ):
         if not is_subclass:
@@ -98,6 +127,9 @@ class ResizerConfig(object):
                 self.resizesSchema = resizesSchema
             self.optimize_original = optimize_original
             self.optimize_resized = optimize_resized
+            self.icc_to_srgb = icc_to_srgb
+            if digest_algorithms is not None:
+                self.digest_algorithms = tuple(digest_algorithms)
             # self.original_allow_animated = original_allow_animated
 
             # we want a unique list
@@ -109,6 +141,117 @@ class ResizerConfig(object):
             if selected_resizes:
                 self.selected_resizes = list(set(selected_resizes))
 
+    def schema_fingerprint(
+        self,
+        selected_resizes: Optional[TYPE_selected_resizes] = None,
+    ) -> str:
+        """
+        a stable hexdigest of the instructions for `selected_resizes`
+        (default: `self.selected_resizes`); it changes whenever a resize
+        would produce different output or a different filename.
+        """
+        if selected_resizes is None:
+            selected_resizes = self.selected_resizes
+        payload = json.dumps(
+            {size: self.resizesSchema[size] for size in selected_resizes},
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+    def size_fingerprint(self, size: str) -> str:
+        """
+        a stable hexdigest of everything that determines the file for `size`:
+        its instructions, `optimize_resized` and `icc_to_srgb`.
+
+        unlike `schema_fingerprint`, this only changes when `size` changes, so
+        it can be recorded with each saved file; see `diff`
+        """
+        payload = json.dumps(
+            [self.resizesSchema[size], bool(self.optimize_resized), self.icc_to_srgb],
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+    def size_fingerprints(
+        self,
+        selected_resizes: Optional[TYPE_selected_resizes] = None,
+    ) -> Dict[str, str]:
+        """`size_fingerprint` for `selected_resizes` (default: `self.selected_resizes`)"""
+        if selected_resizes is None:
+            selected_resizes = self.selected_resizes
+        return {size: self.size_fingerprint(size) for size in selected_resizes}
+
+    def diff(
+        self,
+        previous: Union["ResizerConfig", Dict[str, str]],
+        selected_resizes: Optional[TYPE_selected_resizes] = None,
+    ) -> "SchemaDiff":
+        """
+        compares this config to a `previous` one, and returns a `SchemaDiff`
+        of the sizes to regenerate.
+
+        `previous`
+            a `ResizerConfig`, or the `{size: fingerprint}` recorded when the
+            files were saved, such as a manifest's `size_fingerprints`
+
+        `selected_resizes`
+            the sizes to compare; default `self.selected_resizes`
+        """
+        if isinstance(previous, ResizerConfig):
+            previous = previous.size_fingerprints()
+        return SchemaDiff(previous, self.size_fingerprints(selected_resizes))
+
+
+class SchemaDiff(object):
+    """
+    the sizes which differ between two sets of size fingerprints.
+
+    `added`
+        sizes which are new
+    `changed`
+        sizes whose fingerprint changed
+    `removed`
+        sizes which are no longer selected; their files may be deleted
+    `unchanged`
+        sizes which do not need to be regenerated
+    """
+
+    added: List[str]
+    changed: List[str]
+    removed: List[str]
+    unchanged: List[str]
+
+    def __init__(self, previous: Dict[str, str], current: Dict[str, str]):
+        self.added = sorted(size for size in current if size not in previous)
+        self.changed = sorted(
+            size
+            for size in current
+            if (size in previous) and (previous[size] != current[size])
+        )
+        self.removed = sorted(size for size in previous if size not in current)
+        self.unchanged = sorted(
+            size
+            for size in current
+            if (size in previous) and (previous[size] == current[size])
+        )
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.changed or self.removed)
+
+    def __repr__(self) -> str:
+        return "<SchemaDiff added=%s changed=%s removed=%s>" % (
+            self.added,
+            self.changed,
+            self.removed,
+        )
+
+    @property
+    def regenerate(self) -> List[str]:
+        """the sizes to render again: `added` and `changed`"""
+        return sorted(self.added + self.changed)
+
 
 class ResizerFactory(object):
     """This is a conveniece Factory to store application configuration
@@ -120,19 +263,28 @@ class ResizerFactory(object):
     """
 
     resizerConfig: ResizerConfig
+    resizeCache: Optional["ResizeCache"] = None
 
-    def __init__(self, resizerConfig: ResizerConfig):
+    def __init__(
+        self,
+        resizerConfig: ResizerConfig,
+        resizeCache: Optional["ResizeCache"] = None,
+    ):
         """
         args
             `resizerConfig`
                 a resizer.ResizerConfig instance
+            `resizeCache`
+                an optional `cache.ResizeCache`, shared by every resizer
         """
         self.resizerConfig = resizerConfig
+        self.resizeCache = resizeCache
 
     def resizer(
         self,
         imagefile: Optional[io.IOBase] = None,
         file_b64: Optional[bytes] = None,
+        file_envelope: Optional[TYPE_file_envelope] = None,
     ) -> "Resizer":
         """Returns a resizer object; optionally with an imagefile.
         This does not resize.
@@ -148,12 +300,25 @@ class ResizerFactory(object):
             `file_b64`
                 b64 encoding of the image file. this is to support serialized
                 messagebrokers for workers like celery
+            `file_envelope`
+                binary envelope of the image file, as `bytes` or a file.
+                see `utils.envelope_encode`; this is a more compact
+                alternative to `file_b64`
         """
-        resizer = Resizer(resizerConfig=self.resizerConfig)
-        if imagefile is not None and file_b64 is not None:
-            raise ValueError("Only pass in `imagefile` or `file_b64`")
-        if (imagefile is not None) or (file_b64 is not None):
-            resizer.register_image_file(imagefile=imagefile, file_b64=file_b64)
+        resizer = Resizer(
+            resizerConfig=self.resizerConfig, resizeCache=self.resizeCache
+        )
+        _submitted = [i for i in (imagefile, file_b64, file_envelope) if i is not None]
+        if len(_submitted) > 1:
+            raise ValueError(
+                "Only pass in `imagefile` or `file_b64` or `file_envelope`"
+            )
+        if _submitted:
+            resizer.register_image_file(
+                imagefile=imagefile,
+                file_b64=file_b64,
+                file_envelope=file_envelope,
+            )
         return resizer
 
 
@@ -178,14 +343,24 @@ class Resizer(object):
     _resizerConfig: Optional[ResizerConfig] = None
     _resizerResultset: Optional[ResizerResultset] = None
     _wrappedImage: Optional[image_wrapper.ImageWrapper]
+    _resizeCache: Optional["ResizeCache"] = None
 
     def __init__(
         self,
         resizerConfig: Optional[ResizerConfig] = None,
+        resizeCache: Optional["ResizeCache"] = None,
     ):
+        """
+        args
+            `resizerConfig`
+                a resizer.ResizerConfig instance
+            `resizeCache`
+                an optional `cache.ResizeCache`; see `resize`
+        """
         self._resizerConfig = resizerConfig
         self._resizerResultset = None
         self._wrappedImage = None
+        self._resizeCache = resizeCache
 
     def register_image_file(
         self,
@@ -193,6 +368,7 @@ class Resizer(object):
         imageWrapper: Optional[image_wrapper.ImageWrapper] = None,
         file_b64: Optional[bytes] = None,
         optimize_original: Optional[bool] = None,
+        file_envelope: Optional[TYPE_file_envelope] = None,
     ) -> None:
         """
         registers a file to be resized
@@ -208,31 +384,47 @@ class Resizer(object):
             `file_b64`
                 b64 encoding of the image file. this is to support serialized
                 messagebrokers for workers like celery
+            `file_envelope`
+                binary envelope of the image file, as `bytes` or a file.
+                see `utils.envelope_encode`
         """
         if self._wrappedImage is not None:
             raise errors.ImageError_DuplicateAction(
                 "We already have registered a file."
             )
 
-        if (imagefile is None) and (imageWrapper is None) and (file_b64 is None):
+        _submitted = [
+            i
+            for i in (imagefile, imageWrapper, file_b64, file_envelope)
+            if i is not None
+        ]
+        if not _submitted:
             raise errors.ImageError_ConfigError(
-                "Must submit either imagefile /or/ imageWrapper /or/ file_b64"
+                "Must submit either imagefile /or/ imageWrapper /or/ file_b64 /or/ file_envelope"
             )
 
-        if (
-            (imagefile is not None)
-            and (imageWrapper is not None)
-            and (file_b64 is not None)
-        ):
+        if len(_submitted) > 1:
             raise errors.ImageError_ConfigError(
-                "Submit only imagefile /or/ imageWrapper /or/ file_b64"
+                "Submit only imagefile /or/ imageWrapper /or/ file_b64 /or/ file_envelope"
             )
 
         if file_b64 is not None:
             imagefile = utils.b64_decode_to_file(file_b64)
 
+        if file_envelope is not None:
+            (imagefile, _header) = utils.envelope_decode(file_envelope)
+
         if imagefile is not None:
-            self._wrappedImage = image_wrapper.ImageWrapper(imagefile=imagefile)
+            icc_to_srgb = False
+            digest_algorithms = None
+            if self._resizerConfig:
+                icc_to_srgb = self._resizerConfig.icc_to_srgb
+                digest_algorithms = self._resizerConfig.digest_algorithms
+            self._wrappedImage = image_wrapper.ImageWrapper(
+                imagefile=imagefile,
+                icc_to_srgb=icc_to_srgb,
+                digest_algorithms=digest_algorithms,
+            )
 
         elif imageWrapper is not None:
             if not isinstance(imageWrapper, image_wrapper.ImageWrapper):
@@ -262,6 +454,7 @@ class Resizer(object):
         imagefile=None,
         imageWrapper: Optional[image_wrapper.ImageWrapper] = None,
         file_b64: Optional[bytes] = None,
+        file_envelope: Optional[TYPE_file_envelope] = None,
         resizesSchema: Optional[TYPE_ResizesSchema] = None,
         selected_resizes: Optional[TYPE_selected_resizes] = None,
         optimize_original: Optional[bool] = None,
@@ -285,6 +478,107 @@ class Resizer(object):
             `file_b64`
                 b64 encoding of the image file. this is to support serialized
                 messagebrokers for workers like celery
+            `file_envelope`
+                binary envelope of the image file, as `bytes` or a file.
+                see `utils.envelope_encode`
+
+        if this resizer has a `resizeCache`, cached sizes are not resized.
+        if every size and the original are cached, the image is not decoded,
+        and `get_original()` is not available.
+        """
+        if self._resizeCache is not None:
+            return self._resize_cached(
+                self._resizeCache,
+                imagefile=imagefile,
+                imageWrapper=imageWrapper,
+                file_b64=file_b64,
+                file_envelope=file_envelope,
+                resizesSchema=resizesSchema,
+                selected_resizes=selected_resizes,
+                optimize_original=optimize_original,
+                optimize_resized=optimize_resized,
+            )
+        resized = dict(
+            self.iter_resize(
+                imagefile=imagefile,
+                imageWrapper=imageWrapper,
+                file_b64=file_b64,
+                file_envelope=file_envelope,
+                resizesSchema=resizesSchema,
+                selected_resizes=selected_resizes,
+                optimize_original=optimize_original,
+                optimize_resized=optimize_resized,
+            )
+        )
+        assert self._wrappedImage
+        resizerResultset = ResizerResultset(
+            resized=resized, original=self._wrappedImage.get_original()
+        )
+        self._resizerResultset = resizerResultset
+
+        return resizerResultset
+
+    def iter_resize(
+        self,
+        imagefile=None,
+        imageWrapper: Optional[image_wrapper.ImageWrapper] = None,
+        file_b64: Optional[bytes] = None,
+        file_envelope: Optional[TYPE_file_envelope] = None,
+        resizesSchema: Optional[TYPE_ResizesSchema] = None,
+        selected_resizes: Optional[TYPE_selected_resizes] = None,
+        optimize_original: Optional[bool] = None,
+        optimize_resized: Optional[bool] = None,
+    ) -> Iterator[Tuple[str, image_wrapper.ResizedImage]]:
+        """
+        Streaming version of `resize`; accepts the same arguments.
+
+        yields `(size, ResizedImage)` as soon as each size is encoded (and
+        optimized), in the order of `selected_resizes`. nothing is retained
+        on this object, so each `ResizedImage` can be freed by the caller as
+        soon as it is consumed; `resize` collects them into a resultset.
+
+        the original is registered (and optimized) before the first size is
+        yielded, so `get_original()` is available while iterating.
+        """
+        (resizesSchema, selected_resizes, optimize_original, optimize_resized) = (
+            self._resize_options(
+                resizesSchema, selected_resizes, optimize_original, optimize_resized
+            )
+        )
+
+        self._resize_register(
+            imagefile=imagefile,
+            imageWrapper=imageWrapper,
+            file_b64=file_b64,
+            file_envelope=file_envelope,
+            optimize_original=optimize_original,
+        )
+        assert self._wrappedImage
+
+        digest_algorithms = None
+        if self._resizerConfig:
+            digest_algorithms = self._resizerConfig.digest_algorithms
+
+        for size in selected_resizes:
+            # ImageWrapper.resize returns a ResizedImage that has attributes `.resized_image`, `image_format`
+            resized = self._wrappedImage.resize(
+                resizesSchema[size],
+                digest_algorithms=digest_algorithms,
+            )
+            if optimize_resized:
+                resized.optimize()
+            yield (size, resized)
+
+    def _resize_options(
+        self,
+        resizesSchema: Optional[TYPE_ResizesSchema],
+        selected_resizes: Optional[TYPE_selected_resizes],
+        optimize_original: Optional[bool],
+        optimize_resized: Optional[bool],
+    ) -> Tuple[TYPE_ResizesSchema, TYPE_selected_resizes, bool, bool]:
+        """
+        shared validation for `iter_resize` and `_resize_cached`;
+        fills in the arguments from `self._resizerConfig`
         """
         if resizesSchema is None:
             if self._resizerConfig:
@@ -318,15 +612,39 @@ class Resizer(object):
         if not len(selected_resizes):
             raise errors.ImageError_ConfigError("We have no selected_resizes...  error")
 
+        for size in selected_resizes:
+            if size[0] == "@":
+                raise errors.ImageError_ConfigError(
+                    "@ is a reserved initial character for image sizes"
+                )
+
+        return (
+            resizesSchema,
+            selected_resizes,
+            bool(optimize_original),
+            bool(optimize_resized),
+        )
+
+    def _resize_register(
+        self,
+        imagefile=None,
+        imageWrapper: Optional[image_wrapper.ImageWrapper] = None,
+        file_b64: Optional[bytes] = None,
+        file_envelope: Optional[TYPE_file_envelope] = None,
+        optimize_original: bool = False,
+    ) -> None:
+        """registers the image for a resize, or optimizes the registered one"""
         if (
             (imagefile is not None)
             or (imageWrapper is not None)
             or (file_b64 is not None)
+            or (file_envelope is not None)
         ):
             self.register_image_file(
                 imagefile=imagefile,
                 imageWrapper=imageWrapper,
                 file_b64=file_b64,
+                file_envelope=file_envelope,
                 optimize_original=optimize_original,
             )
         else:
@@ -338,23 +656,194 @@ class Resizer(object):
                 "Please pass in a `imagefile` if you have not set an imageFileObject yet"
             )
 
-        # we'll stash the items here
-        resized = {}
-        for size in selected_resizes:
-            if size[0] == "@":
-                raise errors.ImageError_ConfigError(
-                    "@ is a reserved initial character for image sizes"
+    def _resize_cached(
+        self,
+        resizeCache: "ResizeCache",
+        imagefile=None,
+        imageWrapper: Optional[image_wrapper.ImageWrapper] = None,
+        file_b64: Optional[bytes] = None,
+        file_envelope: Optional[TYPE_file_envelope] = None,
+        resizesSchema: Optional[TYPE_ResizesSchema] = None,
+        selected_resizes: Optional[TYPE_selected_resizes] = None,
+        optimize_original: Optional[bool] = None,
+        optimize_resized: Optional[bool] = None,
+    ) -> ResizerResultset:
+        """
+        `resize`, in front of `resizeCache`.
+
+        entries are keyed by the digest of the source file and a fingerprint
+        of everything that affects the output: the instructions of the size,
+        `optimize_resized`, `icc_to_srgb` and `digest_algorithms`; the
+        original is keyed by `optimize_original`, `icc_to_srgb` and
+        `digest_algorithms`.
+        """
+        (resizesSchema, selected_resizes, optimize_original, optimize_resized) = (
+            self._resize_options(
+                resizesSchema, selected_resizes, optimize_original, optimize_resized
+            )
+        )
+
+        # decode transports once, so the file can be hashed
+        if file_b64 is not None:
+            imagefile = utils.b64_decode_to_file(file_b64)
+            file_b64 = None
+        elif file_envelope is not None:
+            (imagefile, _header) = utils.envelope_decode(file_envelope)
+            file_envelope = None
+
+        source_digest = None
+        if imagefile is not None:
+            if hasattr(imagefile, "read") and hasattr(imagefile, "seek"):
+                source_digest = resizeCache.source_digest(imagefile)
+        elif imageWrapper is not None:
+            source_digest = imageWrapper.get_original().digest(
+                resizeCache.digest_algorithm
+            )
+        elif self._wrappedImage is not None:
+            source_digest = self._wrappedImage.get_original().digest(
+                resizeCache.digest_algorithm
+            )
+        resized: Dict[str, image_wrapper.ResizedImage] = {}
+        if source_digest is None:
+            # an unsupported file type; this is not cached
+            resized.update(
+                self.iter_resize(
+                    imagefile=imagefile,
+                    imageWrapper=imageWrapper,
+                    resizesSchema=resizesSchema,
+                    selected_resizes=selected_resizes,
+                    optimize_original=optimize_original,
+                    optimize_resized=optimize_resized,
                 )
+            )
+            assert self._wrappedImage
+            self._resizerResultset = ResizerResultset(
+                resized=resized, original=self._wrappedImage.get_original()
+            )
+            return self._resizerResultset
+
+        icc_to_srgb = False
+        digest_algorithms = None
+        if self._resizerConfig:
+            icc_to_srgb = self._resizerConfig.icc_to_srgb
+            digest_algorithms = self._resizerConfig.digest_algorithms
+
+        keys: Dict[str, str] = {
+            size: resizeCache.key(
+                source_digest,
+                fingerprint(
+                    resizesSchema[size],
+                    optimize_resized,
+                    icc_to_srgb,
+                    digest_algorithms,
+                ),
+            )
+            for size in selected_resizes
+        }
+        for size in selected_resizes:
+            _resized = resizeCache.get(keys[size], image_wrapper.ResizedImage)
+            if _resized is not None:
+                resized[size] = _resized
 
-            # ImageWrapper.resize returns a ResizedImage that has attributes `.resized_image`, `image_format`
-            resized[size] = self._wrappedImage.resize(resizesSchema[size])
-            if optimize_resized:
-                resized[size].optimize()
+        original: Optional[image_wrapper.BasicImage] = None
+        key_original = None
+        if self._wrappedImage is None:
+            key_original = resizeCache.key(
+                source_digest,
+                fingerprint(
+                    "@original", optimize_original, icc_to_srgb, digest_algorithms
+                ),
+            )
+            original = resizeCache.get(key_original, image_wrapper.BasicImage)
+
+        missing: List[str] = [size for size in selected_resizes if size not in resized]
+        if missing or (original is None):
+            if missing:
+                for size, _resized in self.iter_resize(
+                    imagefile=imagefile,
+                    imageWrapper=imageWrapper,
+                    resizesSchema=resizesSchema,
+                    selected_resizes=missing,
+                    optimize_original=optimize_original,
+                    optimize_resized=optimize_resized,
+                ):
+                    resizeCache.set(keys[size], _resized)
+                    resized[size] = _resized
+            else:
+                self._resize_register(
+                    imagefile=imagefile,
+                    imageWrapper=imageWrapper,
+                    optimize_original=optimize_original,
+                )
+            assert self._wrappedImage
+            original = self._wrappedImage.get_original()
+            if key_original is not None:
+                resizeCache.set(key_original, original)
 
         resizerResultset = ResizerResultset(
-            resized=resized, original=self._wrappedImage.get_original()
+            resized={size: resized[size] for size in selected_resizes},
+            original=original,
         )
         self._resizerResultset = resizerResultset
+        return resizerResultset
+
+    async def aresize(
+        self,
+        imagefile=None,
+        imageWrapper: Optional[image_wrapper.ImageWrapper] = None,
+        file_b64: Optional[bytes] = None,
+        file_envelope: Optional[TYPE_file_envelope] = None,
+        resizesSchema: Optional[TYPE_ResizesSchema] = None,
+        selected_resizes: Optional[TYPE_selected_resizes] = None,
+        optimize_original: Optional[bool] = None,
+        optimize_resized: Optional[bool] = None,
+        executor: Optional[concurrent.futures.Executor] = None,
+    ) -> ResizerResultset:
+        """
+        asyncio version of `resize`; accepts the same arguments
+
+        the decoding and resizing is cpu-bound, so it is run in `executor`
+        (default: the loop's default executor). this must be a thread based
+        executor, as the results are stored onto this object.
+
+        optimizations are awaited concurrently, via asyncio subprocesses.
+        """
+        if optimize_original is None:
+            if self._resizerConfig:
+                optimize_original = self._resizerConfig.optimize_original
+            else:
+                raise ValueError("no optimize_original and no self._resizerConfig")
+
+        if optimize_resized is None:
+            if self._resizerConfig:
+                optimize_resized = self._resizerConfig.optimize_resized
+            else:
+                raise ValueError("no optimize_resized and no self._resizerConfig")
+
+        loop = asyncio.get_running_loop()
+        resizerResultset = await loop.run_in_executor(
+            executor,
+            functools.partial(
+                self.resize,
+                imagefile=imagefile,
+                imageWrapper=imageWrapper,
+                file_b64=file_b64,
+                file_envelope=file_envelope,
+                resizesSchema=resizesSchema,
+                selected_resizes=selected_resizes,
+                optimize_original=False,
+                optimize_resized=False,
+            ),
+        )
+
+        _optimizations = []
+        if optimize_original:
+            _optimizations.append(resizerResultset.original.aoptimize())
+        if optimize_resized:
+            for resized in resizerResultset.resized.values():
+                _optimizations.append(resized.aoptimize())
+        if _optimizations:
+            await asyncio.gather(*_optimizations)
 
         return resizerResultset
 
@@ -1,2 +1,3 @@
 from . import localfile
 from . import s3
+from . import throttle
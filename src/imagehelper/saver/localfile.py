@@ -1,16 +1,20 @@
 # stdlib
+import json
 import logging
 import os
+from typing import Any
 from typing import Dict
 from typing import Optional
+from typing import Tuple
 
 # local
 from . import _core
+from .utils import ARCHIVE_POINTER_VERSION
+from .utils import archive_to_filename
 from .utils import check_archive_original
 from .utils import size_to_filename
 from .. import _io
 from .. import errors
-from .. import utils
 from .._types import TYPE_files_mapping
 from ..image_wrapper import BasicImage
 from ..image_wrapper import ResizerInstructions
@@ -49,6 +53,8 @@ class SaverConfig(_core.SaverConfig):
     subdir_archive_name: str
     filedir: str
     archive_original: Optional[bool] = None
+    # archive originals by digest; see `SaverManager.archive_pointer_load`
+    archive_content_addressed: bool = False
 
     def __init__(
         self,
@@ -56,11 +62,13 @@ class SaverConfig(_core.SaverConfig):
         subdir_archive_name: str = "archive",
         filedir: str = "localfile-output",
         archive_original: Optional[bool] = None,
+        archive_content_addressed: bool = False,
     ):
         self.subdir_public_name = subdir_public_name
         self.subdir_archive_name = subdir_archive_name
         self.filedir = filedir
         self.archive_original = archive_original
+        self.archive_content_addressed = archive_content_addressed
 
 
 class SaverLogger(_core.SaverLogger):
@@ -158,6 +166,9 @@ class _SaverCoreManager(_core._SaverCoreManager):
     _saverLogger: SaverLogger
     filename_template: str = "%(guid)s-%(suffix)s.%(format)s"
     filename_template_archive: str = "%(guid)s.%(format)s"
+    # used instead of `filename_template_archive` for content-addressed archives
+    filename_template_archive_content: str = "%(sha256)s.%(format)s"
+    filename_template_archive_pointer: str = "%(guid)s.archive.json"
 
     def __init__(
         self,
@@ -312,15 +323,9 @@ class SaverManager(_SaverCoreManager, _core.SaverManager):
             filename_mapping[size] = (target_filename, subdir_name)
 
         if check_archive_original(resizerResultset, archive_original=archive_original):
-            filename_template_archive = self.filename_template_archive
-            assert resizerResultset.original
-            assert resizerResultset.original.format
-            target_filename = filename_template_archive % {
-                "guid": guid,
-                "format": utils.PIL_type_to_standardized(
-                    resizerResultset.original.format
-                ),
-            }
+            target_filename = archive_to_filename(
+                guid, resizerResultset, self._filename_template_archive()
+            )
             subdir_name = self._saverConfig.subdir_archive_name
             filename_mapping["@archive"] = (target_filename, subdir_name)
 
@@ -360,12 +365,15 @@ class SaverManager(_SaverCoreManager, _core.SaverManager):
 
         # log uploads for removal/tracking and return
         _saves = {}
+        # sizes which are not rolled back: they already existed, or are a
+        # content-addressed archive, which other guids may share
+        _kept = set()
         try:
             # and then we upload...
             for size in selected_resizes:
                 (_filename, subdir_name) = target_filenames[size]
                 target_dirname = os.path.join(self._saverConfig.filedir, subdir_name)
-                if not os.path.exists(target_dirname):
+                if not (dry_run or os.path.exists(target_dirname)):
                     os.makedirs(target_dirname)
                 target_file = os.path.join(target_dirname, _filename)
                 log.debug("Saving %s to %s " % (_filename, target_file))
@@ -402,15 +410,24 @@ class SaverManager(_SaverCoreManager, _core.SaverManager):
                 size = "@archive"
                 (_filename, subdir_name) = target_filenames[size]
                 target_dirname = os.path.join(self._saverConfig.filedir, subdir_name)
-                if not os.path.exists(target_dirname):
+                if not (dry_run or os.path.exists(target_dirname)):
                     os.makedirs(target_dirname)
                 target_file = os.path.join(target_dirname, _filename)
                 log.debug("Saving %s to %s " % (_filename, target_file))
 
-                if not dry_run:
+                content_addressed = self._saverConfig.archive_content_addressed
+                if content_addressed:
+                    _kept.add(size)
+                if content_addressed and os.path.exists(target_file):
+                    # the same original was already archived
+                    log.debug("Skipping existing %s " % (target_file,))
+                elif not dry_run:
                     # upload
-                    with open(target_file, _io.FileWriteArgs) as _fh:
+                    # content-addressed files may be shared; never expose a partial file
+                    _target_file_tmp = "%s.%s.tmp" % (target_file, os.getpid())
+                    with open(_target_file_tmp, _io.FileWriteArgs) as _fh:
                         _fh.write(resizerResultset.original.file.getvalue())
+                    os.replace(_target_file_tmp, target_file)
 
                     # log to external plugin too
                     if self._saverLogger:
@@ -425,17 +442,95 @@ class SaverManager(_SaverCoreManager, _core.SaverManager):
                 # log for removal/tracking & return
                 _saves[size] = (_filename, subdir_name)
 
+                if content_addressed:
+                    _saves["@archive_pointer"] = self._archive_pointer_save(
+                        guid, resizerResultset.original, _filename, dry_run=dry_run
+                    )
+
         except Exception as exc:
             # if we have ANY issues, we want to delete everything from amazon s3. otherwise this stuff is just hiding up there
             log.debug(
                 "Error uploading... rolling back s3 items. unexpected exception `%s` in `saver.localfile.SaverManager.files_save`",
                 exc,
             )
-            _saves = self.files_delete(_saves)
+            _saves = self.files_delete(
+                {k: v for (k, v) in _saves.items() if k not in _kept}
+            )
             raise errors.ImageError_SaverUpload("error uploading")
 
+        if self._saverConfig.archive_content_addressed:
+            # shared by other guids, so `files_delete(files_saved)` must not
+            # remove it; see `archive_pointer_load`
+            _saves.pop("@archive", None)
         return _saves
 
+    def _filename_template_archive(self) -> str:
+        """the archive template for the configured archive mode"""
+        if self._saverConfig.archive_content_addressed:
+            return self.filename_template_archive_content
+        return self.filename_template_archive
+
+    def archive_pointer_filename(self, guid: str) -> Tuple[str, str]:
+        """returns the (target_filename, subdir_name) of the archive pointer"""
+        return (
+            self.filename_template_archive_pointer % {"guid": guid},
+            self._saverConfig.subdir_archive_name,
+        )
+
+    def _archive_pointer_save(
+        self,
+        guid: str,
+        original: BasicImage,
+        archive_filename: str,
+        dry_run: bool = False,
+    ) -> Tuple[str, str]:
+        """
+        writes the guid -> digest pointer for a content-addressed archive;
+        for a duplicate original, this is the only write.
+        """
+        (target_filename, subdir_name) = self.archive_pointer_filename(guid)
+        pointer = {
+            "version": ARCHIVE_POINTER_VERSION,
+            "guid": guid,
+            "key": archive_filename,
+            "subdir": subdir_name,
+            "format": original.format,
+            "file_size": original.file_size,
+            "digests": original.digests,
+        }
+        target_file = os.path.join(
+            self._saverConfig.filedir, subdir_name, target_filename
+        )
+        log.debug("Saving %s " % (target_file,))
+        if not dry_run:
+            with open(target_file, "w") as _fh:
+                json.dump(pointer, _fh, sort_keys=True)
+        return (target_filename, subdir_name)
+
+    def archive_pointer_load(self, guid: str) -> Dict[str, Any]:
+        """
+        reads the archive pointer for `guid`; its `key` and `subdir` locate
+        the content-addressed original.
+
+        raises `errors.ImageError_MissingFile` if there is none
+        """
+        (target_filename, subdir_name) = self.archive_pointer_filename(guid)
+        target_file = os.path.join(
+            self._saverConfig.filedir, subdir_name, target_filename
+        )
+        try:
+            with open(target_file) as _fh:
+                pointer = json.load(_fh)
+        except FileNotFoundError:
+            raise errors.ImageError_MissingFile(
+                "no archive pointer for guid `%s`" % guid
+            )
+        if pointer.get("version") != ARCHIVE_POINTER_VERSION:
+            raise errors.ImageError_Parsing(
+                "unsupported archive pointer version: `%s`" % pointer.get("version")
+            )
+        return pointer
+
 
 class SaverSimpleAccess(_SaverCoreManager, _core.SaverSimpleAccess):
     def __init__(
@@ -458,7 +553,7 @@ class SaverSimpleAccess(_SaverCoreManager, _core.SaverSimpleAccess):
         _saves = {}
         try:
             target_dirname = os.path.join(self._saverConfig.filedir, subdir_name)
-            if not os.path.exists(target_dirname):
+            if not (dry_run or os.path.exists(target_dirname)):
                 os.makedirs(target_dirname)
             target_file = os.path.join(target_dirname, filename)
             log.debug("Saving %s to %s " % (filename, target_file))
@@ -1,37 +1,64 @@
 from __future__ import annotations
 
 # stdlb
+import asyncio
+import concurrent.futures
+import functools
+import json
 from io import BufferedReader
 import logging
+import os
+import threading
+import weakref
 from types import ModuleType
+from typing import Any
+from typing import Callable
 from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import MutableSet
 from typing import Optional
 from typing import Sequence
+from typing import Set
+from typing import Tuple
 from typing import TYPE_CHECKING
+from typing import TypeVar
 
 # from io import RawIOBase
 
 # local
 from . import _core
+from .throttle import UploadThrottle
+from .utils import ARCHIVE_POINTER_VERSION
+from .utils import archive_to_filename
 from .utils import check_archive_original
+from .utils import filename_template_compile
+from .utils import filename_template_is_content_addressed
 from .utils import size_to_filename
 from .. import errors
 from .. import utils
 from .._types import TYPE_files_mapping
 from ..image_wrapper import BasicImage
 from ..image_wrapper import ResizerInstructions
+from ..resizer import Resizer
 from ..resizer import ResizerConfig
 from ..resizer import ResizerResultset
+from ..resizer import SchemaDiff
 from ..resizer import TYPE_selected_resizes
 
 if TYPE_CHECKING:
     from mypy_boto3_s3 import S3Client
+    from mypy_boto3_s3.type_defs import HeadObjectOutputTypeDef
     from mypy_boto3_s3.type_defs import ObjectIdentifierTypeDef
 
 # conditional import
 boto3: Optional[ModuleType]
 try:
     import boto3
+    from boto3.s3.transfer import TransferConfig
+    import botocore.config
+    import botocore.exceptions
 except ImportError:
     boto3 = None
 
@@ -41,6 +68,32 @@ except ImportError:
 
 log = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
+
+# `delete_objects` accepts up to 1000 keys per request
+DELETE_BATCH_SIZE = 1000
+
+# the most buckets that `files_delete` will delete from at once
+DELETE_MAX_WORKERS = 8
+
+# files under this size are sent with a single `put_object` call
+PUT_OBJECT_THRESHOLD = 1048576
+
+# `SaverManager.files_status` values
+FILE_STATUS_WRITTEN = "written"  # there was no object
+FILE_STATUS_CHANGED = "changed"  # an object with a different digest was replaced
+FILE_STATUS_SKIPPED = "skipped"  # an identical object exists; nothing was sent
+
+# with `skip_unchanged`, uploads store their md5 in this metadata key
+METADATA_MD5 = "imagehelper-md5"
+
+# the format of the manifest objects written with `write_manifest`
+MANIFEST_VERSION = 1
+
+# `CacheControl` for content-addressed keys, which never change
+CACHE_CONTROL_IMMUTABLE = "public, max-age=31536000, immutable"
+
 
 class NoBoto(ImportError):
     pass
@@ -56,6 +109,9 @@ class ResizerInstructions_S3(ResizerInstructions):
 
 TYPE_ResizesSchema_S3 = Dict[str, ResizerInstructions_S3]
 
+# (size, target_filename, bucket_name, wrapped, boto3_ExtraArgs)
+TYPE_upload = Tuple[str, str, str, BasicImage, Dict[str, Any]]
+
 
 class ResizerConfig_S3(ResizerConfig):
     resizesSchema: TYPE_ResizesSchema_S3  # type: ignore[assignment]
@@ -110,6 +166,30 @@ class SaverConfig(_core.SaverConfig):
     bucket_archive_name: Optional[str] = None
     boto3_ExtraArgs_default_public: Dict
     boto3_ExtraArgs_default_archive: Dict
+    upload_concurrency: int = 1
+    max_pool_connections: Optional[int] = None
+    # boto3 `TransferConfig`; `None` uses the boto3 default
+    multipart_threshold: Optional[int] = None
+    multipart_chunksize: Optional[int] = None
+    multipart_max_concurrency: Optional[int] = None
+    # files under this size are sent with `put_object`; `0` disables this
+    put_object_threshold: int = PUT_OBJECT_THRESHOLD
+    # HEAD each object first, and skip the upload if it is identical
+    skip_unchanged: bool = False
+    # rate limits, adapts and retries requests; see `saver.throttle`
+    upload_throttle: Optional[UploadThrottle] = None
+    # write a manifest per guid; see `SaverManager.files_delete_by_guid`
+    write_manifest: bool = False
+    # default: `bucket_archive_name`, then `bucket_public_name`
+    bucket_manifest_name: Optional[str] = None
+    # `CacheControl` for keys with a digest token, unless one is set
+    cache_control_immutable: Optional[str] = CACHE_CONTROL_IMMUTABLE
+    # archive originals by digest; see `SaverManager.archive_pointer_load`
+    archive_content_addressed: bool = False
+    # archive keys known to exist; checked before a HEAD request
+    archive_index: Optional[MutableSet[str]] = None
+    # for S3-compatible services
+    endpoint_url: Optional[str] = None
 
     def __init__(
         self,
@@ -120,6 +200,20 @@ class SaverConfig(_core.SaverConfig):
         boto3_ExtraArgs_default_public: Optional[Dict] = None,
         boto3_ExtraArgs_default_archive: Optional[Dict] = None,
         archive_original: Optional[bool] = None,
+        upload_concurrency: int = 1,
+        max_pool_connections: Optional[int] = None,
+        multipart_threshold: Optional[int] = None,
+        multipart_chunksize: Optional[int] = None,
+        multipart_max_concurrency: Optional[int] = None,
+        put_object_threshold: int = PUT_OBJECT_THRESHOLD,
+        skip_unchanged: bool = False,
+        upload_throttle: Optional[UploadThrottle] = None,
+        write_manifest: bool = False,
+        bucket_manifest_name: Optional[str] = None,
+        cache_control_immutable: Optional[str] = CACHE_CONTROL_IMMUTABLE,
+        archive_content_addressed: bool = False,
+        archive_index: Optional[MutableSet[str]] = None,
+        endpoint_url: Optional[str] = None,
         **kwargs,
     ):
         self.key_public = key_public
@@ -129,6 +223,22 @@ class SaverConfig(_core.SaverConfig):
         self.boto3_ExtraArgs_default_public = boto3_ExtraArgs_default_public or {}
         self.boto3_ExtraArgs_default_archive = boto3_ExtraArgs_default_archive or {}
         self.archive_original = archive_original or False
+        if upload_concurrency < 1:
+            raise ValueError("`upload_concurrency` must be 1 or more")
+        self.upload_concurrency = upload_concurrency
+        self.max_pool_connections = max_pool_connections
+        self.multipart_threshold = multipart_threshold
+        self.multipart_chunksize = multipart_chunksize
+        self.multipart_max_concurrency = multipart_max_concurrency
+        self.put_object_threshold = put_object_threshold
+        self.skip_unchanged = skip_unchanged
+        self.upload_throttle = upload_throttle
+        self.write_manifest = write_manifest
+        self.bucket_manifest_name = bucket_manifest_name
+        self.cache_control_immutable = cache_control_immutable
+        self.archive_content_addressed = archive_content_addressed
+        self.archive_index = archive_index
+        self.endpoint_url = endpoint_url
 
         # v0.6.0 removed this options
         # raise Exceptions to catch incompatibilities; remove in future release
@@ -187,12 +297,132 @@ class SaverLogger(_core.SaverLogger):
         log.debug("<S3.delete> bucket_name: `%s`, key: `%s`", bucket_name, key)
 
 
+def s3_client_new(
+    saverConfig: SaverConfig,
+    max_pool_connections: Optional[int] = None,
+) -> "S3Client":
+    """
+    builds a new boto3 s3 client for `saverConfig`
+
+    `max_pool_connections`
+        default = `None` -- `saverConfig.max_pool_connections`, or large
+        enough for `saverConfig.upload_concurrency` uploads plus the deletes
+    """
+    if boto3 is None:
+        raise NO_BOTO
+    if max_pool_connections is None:
+        max_pool_connections = saverConfig.max_pool_connections
+    if max_pool_connections is None:
+        # botocore's default is 10
+        max_pool_connections = max(
+            10, saverConfig.upload_concurrency + DELETE_MAX_WORKERS
+        )
+    return boto3.client(
+        "s3",
+        aws_access_key_id=saverConfig.key_public,
+        aws_secret_access_key=saverConfig.key_private,
+        endpoint_url=saverConfig.endpoint_url,
+        config=botocore.config.Config(max_pool_connections=max_pool_connections),
+    )
+
+
+# every pool, so they can be reset in a forked child
+_S3_CLIENT_POOLS: "weakref.WeakSet[S3ClientPool]" = weakref.WeakSet()
+
+
+class S3ClientPool(object):
+    """
+    A boto3 s3 client, shared by every manager from a `SaverManagerFactory`.
+
+    boto3 clients are threadsafe, and each one holds its own pool of
+    connections; sharing one client keeps those connections open across
+    requests. the client is only built when first needed.
+
+    a client must not be shared across processes, so the client is dropped
+    in a forked child (via `os.register_at_fork`, and by checking the pid)
+    and rebuilt on the next use.
+    """
+
+    _client: Optional["S3Client"] = None
+    _pid: Optional[int] = None
+
+    def __init__(
+        self,
+        saverConfig: SaverConfig,
+        max_pool_connections: Optional[int] = None,
+    ):
+        self._saverConfig = saverConfig
+        self.max_pool_connections = max_pool_connections
+        self._lock = threading.Lock()
+        _S3_CLIENT_POOLS.add(self)
+
+    @property
+    def client(self) -> "S3Client":
+        """property that memoizes the client, per process"""
+        if (self._client is not None) and (self._pid != os.getpid()):
+            self.reset()
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = s3_client_new(
+                        self._saverConfig,
+                        max_pool_connections=self.max_pool_connections,
+                    )
+                    self._pid = os.getpid()
+        return self._client
+
+    def reset(self) -> None:
+        """drops the client; it will be rebuilt on the next use"""
+        # the lock may have been held by another thread during a fork
+        self._lock = threading.Lock()
+        self._client = None
+        self._pid = None
+
+
+def _s3_client_pools_reset() -> None:
+    for s3ClientPool in list(_S3_CLIENT_POOLS):
+        s3ClientPool.reset()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_s3_client_pools_reset)
+
+
+class PurgeStats(object):
+    """results of `files_purge`"""
+
+    # keys read from the input
+    keys: int = 0
+    # keys s3 reported as deleted
+    deleted: int = 0
+    # `delete_objects` requests sent
+    requests: int = 0
+    # (bucket_name, target_filename, error)
+    failed: List[Tuple[str, str, str]]
+
+    def __init__(self):
+        self.failed = []
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "keys": self.keys,
+            "deleted": self.deleted,
+            "requests": self.requests,
+            "failed": len(self.failed),
+        }
+
+
 class SaverManagerFactory(_core.SaverManagerFactory):
-    """Factory for generating SaverManager instances"""
+    """
+    Factory for generating SaverManager instances
+
+    the managers share a `S3ClientPool`
+    """
 
     _resizerConfig: ResizerConfig_S3
     _saverConfig: SaverConfig
     _saverLogger: SaverLogger
+    _s3ClientPool: S3ClientPool
 
     def __init__(
         self,
@@ -203,6 +433,7 @@ class SaverManagerFactory(_core.SaverManagerFactory):
         self._saverConfig = saverConfig
         self._saverLogger = saverLogger
         self._resizerConfig = resizerConfig
+        self._s3ClientPool = S3ClientPool(saverConfig)
 
     def manager(self) -> "SaverManager":
         """generate and return a new SaverManager instance"""
@@ -210,6 +441,7 @@ class SaverManagerFactory(_core.SaverManagerFactory):
             saverConfig=self._saverConfig,
             saverLogger=self._saverLogger,
             resizerConfig=self._resizerConfig,
+            s3ClientPool=self._s3ClientPool,
         )
 
     def simple_access(self) -> "SaverSimpleAccess":
@@ -218,6 +450,7 @@ class SaverManagerFactory(_core.SaverManagerFactory):
             saverConfig=self._saverConfig,
             saverLogger=self._saverLogger,
             resizerConfig=self._resizerConfig,
+            s3ClientPool=self._s3ClientPool,
         )
 
 
@@ -231,22 +464,35 @@ class _SaverCoreManager(_core._SaverCoreManager):
     _saverLogger: SaverLogger
 
     _s3_client: Optional["S3Client"] = None
+    _s3ClientPool: Optional[S3ClientPool] = None
+    _saverLogger_lock: threading.Lock
     _s3_bucketnames: Optional[Dict] = None
-    _boto3_ExtraArgs_default_public: Dict[str, str]  # __init__ -> _generate_defaults
-    _boto3_ExtraArgs_default_archive: Dict[str, str]  # __init__ -> _generate_defaults
+    _boto3_ExtraArgs_default_public: Dict[str, Any]  # __init__ -> _generate_defaults
+    _boto3_ExtraArgs_default_archive: Dict[str, Any]  # __init__ -> _generate_defaults
+    _transfer_config_multipart: "TransferConfig"  # __init__ -> _generate_defaults
+    _transfer_config_single: "TransferConfig"  # __init__ -> _generate_defaults
 
     filename_template: str = "%(guid)s-%(suffix)s.%(format)s"
     filename_template_archive: str = "%(guid)s.%(format)s"
+    filename_template_manifest: str = "%(guid)s.manifest.json"
+    # used instead of `filename_template_archive` for content-addressed archives
+    filename_template_archive_content: str = "%(sha256)s.%(format)s"
+    filename_template_archive_pointer: str = "%(guid)s.archive.json"
+    # the guids which use a content-addressed archive; `%(key)s` is its key
+    filename_template_archive_references: str = "%(key)s.references/"
 
     def __init__(
         self,
         saverConfig: SaverConfig,
         saverLogger: SaverLogger,
         resizerConfig: ResizerConfig_S3,
+        s3ClientPool: Optional[S3ClientPool] = None,
     ):
         self._saverConfig = saverConfig
         self._saverLogger = saverLogger
+        self._saverLogger_lock = threading.Lock()
         self._resizerConfig = resizerConfig
+        self._s3ClientPool = s3ClientPool
         self._generate_defaults()
 
     def _generate_defaults(self) -> None:
@@ -266,21 +512,113 @@ class _SaverCoreManager(_core._SaverCoreManager):
             for k, v in self._saverConfig.boto3_ExtraArgs_default_archive.items():
                 self._boto3_ExtraArgs_default_archive[k] = v
 
+        # large files are sent as parallel multipart uploads;
+        # anything under the threshold is a single request, without threads
+        if boto3 is not None:
+            _transfer_kwargs = {}
+            if self._saverConfig.multipart_threshold is not None:
+                _transfer_kwargs["multipart_threshold"] = (
+                    self._saverConfig.multipart_threshold
+                )
+            if self._saverConfig.multipart_chunksize is not None:
+                _transfer_kwargs["multipart_chunksize"] = (
+                    self._saverConfig.multipart_chunksize
+                )
+            if self._saverConfig.multipart_max_concurrency is not None:
+                _transfer_kwargs["max_concurrency"] = (
+                    self._saverConfig.multipart_max_concurrency
+                )
+            self._transfer_config_multipart = TransferConfig(**_transfer_kwargs)
+            self._transfer_config_single = TransferConfig(
+                multipart_threshold=self._transfer_config_multipart.multipart_threshold,
+                use_threads=False,
+            )
+
+    def _throttled(
+        self,
+        bucket_name: str,
+        key: str,
+        func: Callable[..., T],
+        *args: Any,
+        **kwargs: Any,
+    ) -> T:
+        """calls `func` through `self._saverConfig.upload_throttle`, if any"""
+        assert self._saverConfig
+        upload_throttle = self._saverConfig.upload_throttle
+        if upload_throttle is None:
+            return func(*args, **kwargs)
+        return upload_throttle.call(bucket_name, key, func, *args, **kwargs)
+
+    def _fileobj_upload(
+        self,
+        wrapped: BasicImage,
+        bucket_name: str,
+        key: str,
+        boto3_ExtraArgs: Dict[str, Any],
+    ) -> None:
+        """
+        uploads the file of `wrapped`;
+        files under `put_object_threshold` are sent with `put_object`,
+        files at or above the multipart threshold use the multipart settings
+        """
+        assert self._saverConfig
+        # the file may have been read already, such as by a previous upload
+        wrapped.file.seek(0)
+        if wrapped.file_size < self._saverConfig.put_object_threshold:
+            # skips the transfer manager, its buffering and the md5 pass
+            self.s3_client.put_object(
+                Bucket=bucket_name,
+                Key=key,
+                Body=wrapped.file,
+                ContentMD5=utils.md5_hex_to_b64(wrapped.file_md5),
+                **boto3_ExtraArgs,  # type: ignore[arg-type]
+            )
+            return
+
+        _transfer_config = self._transfer_config_single
+        if wrapped.file_size >= _transfer_config.multipart_threshold:
+            _transfer_config = self._transfer_config_multipart
+
+        # dirty workaround. boto3 has a bug in which it closes files.
+        # the multipart parts are still read through this wrapper
+        _buffer = NonCloseableBufferedReader(wrapped.file)
+        try:
+            self.s3_client.upload_fileobj(
+                _buffer,
+                bucket_name,
+                key,
+                ExtraArgs=boto3_ExtraArgs,
+                Config=_transfer_config,
+            )
+        finally:
+            _buffer.detach()
+
     @property
     def s3_client(self) -> "S3Client":
-        """property that memoizes the connection"""
+        """
+        property that memoizes the connection;
+        if there is a `S3ClientPool`, its client is used instead
+        """
         assert self._saverConfig
 
         if self._s3_client is None:
-            if boto3 is None:
-                raise NO_BOTO
-            self._s3_client = boto3.client(
-                "s3",
-                aws_access_key_id=self._saverConfig.key_public,
-                aws_secret_access_key=self._saverConfig.key_private,
-            )
+            if self._s3ClientPool is not None:
+                return self._s3ClientPool.client
+            self._s3_client = s3_client_new(self._saverConfig)
         return self._s3_client
 
+    @property
+    def bucket_manifest_name(self) -> str:
+        assert self._saverConfig
+        bucket_name = (
+            self._saverConfig.bucket_manifest_name
+            or self._saverConfig.bucket_archive_name
+            or self._saverConfig.bucket_public_name
+        )
+        if not bucket_name:
+            raise ValueError("Could not detect a bucket_name for manifest")
+        return bucket_name
+
     @property
     def s3_bucketnames(self) -> Dict:
         """property that memoizes the calcuated s3 s3_bucketnames"""
@@ -304,6 +642,10 @@ class _SaverCoreManager(_core._SaverCoreManager):
             if self._saverConfig.bucket_archive_name:
                 s3_bucketnames[bucketname_archive] = bucketname_archive
                 s3_bucketnames["@archive"] = bucketname_archive
+            if self._saverConfig.write_manifest:
+                bucketname_manifest = self.bucket_manifest_name
+                s3_bucketnames[bucketname_manifest] = bucketname_manifest
+                s3_bucketnames["@manifest"] = bucketname_manifest
 
             # look through our selected sizes
             assert self._resizerConfig
@@ -343,41 +685,200 @@ class _SaverCoreManager(_core._SaverCoreManager):
         `dry_run`
             default = `False`
             should we just pretend to save?
+
+        keys are grouped by bucket and deleted in batches of up to
+        `DELETE_BATCH_SIZE` per request; each bucket is handled in parallel.
+
+        Returns `files_saved`, with the deleted items removed. Items which s3
+        reported as errors are logged and remain in the mapping.
+
+        If a whole `delete_objects` request fails, the other batches are still
+        run, and then the first request error is raised; `files_saved` is
+        updated in place first.
         """
 
         # preload the calculated s3 bucketnames
         s3_bucketnames = self.s3_bucketnames
 
-        # convert to a list, because we delete the items from the dict
-        for size in list(files_saved.keys()):
-            # grab the stash
-            (target_filename, _bucket_name) = files_saved[size]
+        # bucket_name -> target_filename -> sizes
+        deletions: Dict[str, Dict[str, List[str]]] = {}
+        for size, (target_filename, _bucket_name) in files_saved.items():
+            # get the calculated bucket_name;
+            # a manifest may list a bucket that is no longer configured
+            bucket_name = s3_bucketnames.get(_bucket_name, _bucket_name)
+            log.debug("going to delete `%s` from `%s`" % (target_filename, bucket_name))
+            deletions.setdefault(bucket_name, {}).setdefault(
+                target_filename, []
+            ).append(size)
 
-            # get the calculated bucket_name
-            bucket_name = s3_bucketnames[_bucket_name]
+        if dry_run:
+            # internal cleanup
+            files_saved.clear()
+            return files_saved
 
-            # delete it
-            log.debug("going to delete `%s` from `%s`" % (target_filename, bucket_name))
+        if len(deletions) > 1:
+            with concurrent.futures.ThreadPoolExecutor(
+                max_workers=min(len(deletions), DELETE_MAX_WORKERS)
+            ) as executor:
+                results = list(
+                    executor.map(
+                        self._bucket_delete, deletions.keys(), deletions.values()
+                    )
+                )
+        else:
+            results = [self._bucket_delete(k, v) for (k, v) in deletions.items()]
 
-            if not dry_run:
-                _del_dicts: Sequence[ObjectIdentifierTypeDef] = [
-                    {"Key": target_filename},
-                ]
-                response = self.s3_client.delete_objects(  # noqa: F841
+        request_errors: List[Exception] = []
+        for bucket_name, (deleted, failed, _errors) in zip(deletions.keys(), results):
+            request_errors.extend(_errors)
+            for target_filename in deleted:
+                # external logging
+                if self._saverLogger:
+                    with self._saverLogger_lock:
+                        self._saverLogger.log_delete(
+                            bucket_name=bucket_name, key=target_filename
+                        )
+                # internal cleanup
+                for size in deletions[bucket_name][target_filename]:
+                    del files_saved[size]
+            for target_filename, error in failed.items():
+                log.error(
+                    "could not delete `%s` from `%s`: %s",
+                    target_filename,
+                    bucket_name,
+                    error,
+                )
+
+        if request_errors:
+            raise request_errors[0]
+        return files_saved
+
+    def _bucket_delete(
+        self,
+        bucket_name: str,
+        target_filenames: Iterable[str],
+    ) -> Tuple[List[str], Dict[str, str], List[Exception]]:
+        """
+        deletes keys from a single bucket, `DELETE_BATCH_SIZE` per request
+
+        returns a tuple of (deleted keys, {failed key: error}, request errors);
+        the keys of a request which raised are in both `failed` and the errors
+        """
+        target_filenames = list(target_filenames)
+        deleted: List[str] = []
+        failed: Dict[str, str] = {}
+        request_errors: List[Exception] = []
+        for _start in range(0, len(target_filenames), DELETE_BATCH_SIZE):
+            _end = _start + DELETE_BATCH_SIZE
+            batch = target_filenames[_start:_end]
+            _del_dicts: Sequence[ObjectIdentifierTypeDef] = [
+                {"Key": target_filename} for target_filename in batch
+            ]
+            try:
+                response = self._throttled(
+                    bucket_name,
+                    "",
+                    self.s3_client.delete_objects,
                     Bucket=bucket_name,
                     Delete={"Objects": _del_dicts},
                 )
+            except Exception as exc:
+                # the whole request failed; nothing in it was deleted
+                for target_filename in batch:
+                    failed[target_filename] = str(exc)
+                request_errors.append(exc)
+                continue
+            for _deleted in response.get("Deleted", ()):
+                deleted.append(_deleted["Key"])
+            for _error in response.get("Errors", ()):
+                failed[_error["Key"]] = "%s: %s" % (
+                    _error.get("Code"),
+                    _error.get("Message"),
+                )
+        return (deleted, failed, request_errors)
 
-                # external logging
-                if self._saverLogger:
-                    self._saverLogger.log_delete(
-                        bucket_name=bucket_name, key=target_filename
-                    )
+    def files_purge(
+        self,
+        keys: Iterable[Tuple[str, str]],
+        dry_run: bool = False,
+        max_workers: Optional[int] = None,
+    ) -> PurgeStats:
+        """deletes a stream of files; see `SaverManager.purge_plan`
 
-            # internal cleanup
-            del files_saved[size]
+        `keys`
+            an iterable of `(bucket_name, target_filename)`
 
-        return files_saved
+        `dry_run`
+            default = `False`
+            should we just pretend to delete?
+
+        `max_workers`
+            default = `DELETE_MAX_WORKERS`
+            the number of concurrent `delete_objects` requests
+
+        `keys` is consumed lazily: keys are grouped by bucket and sent in
+        batches of `DELETE_BATCH_SIZE`, and no more than `max_workers * 2`
+        batches are ever in flight. memory does not grow with the number of
+        keys, except for the keys s3 failed to delete.
+
+        Returns a `PurgeStats`; the failures are logged and listed in
+        `PurgeStats.failed`.
+        """
+        max_workers = max_workers or DELETE_MAX_WORKERS
+        stats = PurgeStats()
+
+        # bucket_name -> the batch being filled; sizes may share a filename
+        batches: Dict[str, Dict[str, None]] = {}
+        # future -> bucket_name
+        pending: Dict[concurrent.futures.Future, str] = {}
+
+        def _collect(return_when: str) -> None:
+            (done, _not_done) = concurrent.futures.wait(
+                pending, return_when=return_when
+            )
+            for future in done:
+                bucket_name = pending.pop(future)
+                # a failed request is counted in `failed`; purges do not raise
+                (deleted, failed, _errors) = future.result()
+                stats.deleted += len(deleted)
+                if self._saverLogger:
+                    with self._saverLogger_lock:
+                        for target_filename in deleted:
+                            self._saverLogger.log_delete(
+                                bucket_name=bucket_name, key=target_filename
+                            )
+                for target_filename, error in failed.items():
+                    log.error(
+                        "could not delete `%s` from `%s`: %s",
+                        target_filename,
+                        bucket_name,
+                        error,
+                    )
+                    stats.failed.append((bucket_name, target_filename, error))
+
+        def _submit(bucket_name: str, batch: Dict[str, None]) -> None:
+            stats.requests += 1
+            if dry_run:
+                return
+            while len(pending) >= (max_workers * 2):
+                _collect(concurrent.futures.FIRST_COMPLETED)
+            future = executor.submit(self._bucket_delete, bucket_name, batch)
+            pending[future] = bucket_name
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for bucket_name, target_filename in keys:
+                stats.keys += 1
+                batch = batches.setdefault(bucket_name, {})
+                batch[target_filename] = None
+                if len(batch) >= DELETE_BATCH_SIZE:
+                    _submit(bucket_name, batches.pop(bucket_name))
+            for bucket_name, batch in batches.items():
+                _submit(bucket_name, batch)
+            batches.clear()
+            if pending:
+                _collect(concurrent.futures.ALL_COMPLETED)
+
+        return stats
 
 
 class SaverManager(_SaverCoreManager, _core.SaverManager):
@@ -386,23 +887,40 @@ class SaverManager(_SaverCoreManager, _core.SaverManager):
 
     based on interface defined in `_core._SaverCoreManager`
     but inherits from this file's '`_SaverCoreManager`
+
+    `files_status` maps each size of the last save to a `FILE_STATUS_`
     """
 
+    files_status: Dict[str, str]
+    # size -> manifest entry; written by `_file_upload`
+    _manifest_entries: Dict[str, Dict[str, Any]]
+    # keep the entries of an existing manifest; see `files_save`
+    _manifest_merge: bool = False
+
     def __init__(
         self,
         saverConfig: SaverConfig,
         saverLogger: SaverLogger,
         resizerConfig: ResizerConfig_S3,
+        s3ClientPool: Optional[S3ClientPool] = None,
     ):
         super(SaverManager, self).__init__(
             saverConfig=saverConfig,
             saverLogger=saverLogger,
             resizerConfig=resizerConfig,
+            s3ClientPool=s3ClientPool,
         )
         if not resizerConfig:
             raise ValueError(
                 """`SaverManager` requires a `resizerConfig` which contains the resize recipes. these are needed for generating filenames."""
             )
+        self._files_save_reset()
+
+    def _files_save_reset(self) -> None:
+        """resets the per-save state"""
+        self.files_status = {}
+        self._manifest_entries = {}
+        self._manifest_merge = False
 
     def _validate__selected_resizes(
         self,
@@ -517,14 +1035,9 @@ class SaverManager(_SaverCoreManager, _core.SaverManager):
             filename_mapping[size] = (target_filename, bucket_name)
 
         if check_archive_original(resizerResultset, archive_original=archive_original):
-            assert resizerResultset.original.format
-            filename_template_archive = self.filename_template_archive
-            target_filename = filename_template_archive % {
-                "guid": guid,
-                "format": utils.PIL_type_to_standardized(
-                    resizerResultset.original.format
-                ),
-            }
+            target_filename = archive_to_filename(
+                guid, resizerResultset, self._filename_template_archive()
+            )
             bucket_name = self._saverConfig.bucket_archive_name
             if not bucket_name:
                 raise ValueError("Could not detect a bucket_name for archive")
@@ -533,6 +1046,416 @@ class SaverManager(_SaverCoreManager, _core.SaverManager):
         # return the filemapping
         return filename_mapping
 
+    def purge_plan(
+        self,
+        items: Iterable[Tuple[str, str]],
+        selected_resizes: Optional[TYPE_selected_resizes] = None,
+        archive_original: bool = True,
+    ) -> Iterator[Tuple[str, str]]:
+        """
+        yields the `(bucket_name, target_filename)` of every file that would
+        have been saved for each `(guid, original_format)` in `items`;
+        the output can be passed directly to `files_purge`.
+
+        this replaces `Resizer.fake_resize` and `generate_filenames` for bulk
+        deletions: the filename templates are compiled once for each original
+        format, and nothing is allocated for each guid. `items` is consumed
+        lazily. templates with computed tokens, such as `%(md5_8)s`, can not
+        be compiled; they raise `errors.ImageError_ConfigError` when this is
+        called.
+
+        `items`
+            an iterable of `(guid, original_format)`;
+            the format may be a PIL format or an extension (`JPEG`, `jpg`)
+
+        `selected_resizes`
+            default = `None` -- all of `self._resizerConfig.selected_resizes`
+
+        `archive_original`
+            default = `True`
+            include the archived original?
+
+        with `archive_content_addressed`, the archive pointer and reference of
+        each guid are read and deleted. an original may be shared by other
+        guids, so it is only deleted once every guid which references it has
+        been purged: the references of each original are listed (not the
+        bucket) when it is first seen, and kept until they are all purged.
+        this costs a GET for each guid and a LIST for each original. an
+        original which is saved again while the purge runs may be deleted, so
+        do not purge while those guids are being saved.
+        """
+        assert self._resizerConfig
+        assert self._saverConfig
+        resizesSchema = self._resizerConfig.resizesSchema
+        if selected_resizes is None:
+            selected_resizes = self._resizerConfig.selected_resizes
+        assert selected_resizes is not None
+
+        # validate up front, so errors are not raised mid-purge
+        sizes: List[Tuple[ResizerInstructions_S3, str, str]] = []
+        for size in selected_resizes:
+            if size[0] == "@":
+                raise errors.ImageError_ConfigError(
+                    "@ is a reserved initial character for image sizes (`%s`)" % size
+                )
+            if size not in resizesSchema:
+                raise errors.ImageError_ConfigError(
+                    "selected size is not self._resizerConfig.resizesSchema (`%s`)"
+                    % size
+                )
+            instructions = resizesSchema[size]
+            bucket_name = instructions.get(
+                "s3_bucket_public", self._saverConfig.bucket_public_name
+            )
+            if not bucket_name:
+                raise ValueError("Could not detect a bucket_name for `%s`" % size)
+            sizes.append((instructions, instructions.get("suffix", size), bucket_name))
+        bucket_archive_name = self._saverConfig.bucket_archive_name
+        if archive_original and not bucket_archive_name:
+            raise ValueError("Could not detect a bucket_name for archive")
+        content_addressed = (
+            archive_original and self._saverConfig.archive_content_addressed
+        )
+
+        # original_format -> [(bucket_name, parts)]
+        compiled: Dict[str, List[Tuple[str, Tuple[str, ...]]]] = {}
+
+        def _compile(original_format: str) -> List[Tuple[str, Tuple[str, ...]]]:
+            _compiled = []
+            for instructions, suffix, bucket_name in sizes:
+                _format = utils.derive_format(instructions["format"], original_format)
+                parts = filename_template_compile(
+                    instructions.get("filename_template", self.filename_template),
+                    suffix,
+                    _format,
+                )
+                _compiled.append((bucket_name, parts))
+            if archive_original and not content_addressed:
+                assert bucket_archive_name
+                parts = filename_template_compile(
+                    self.filename_template_archive, "", original_format
+                )
+                _compiled.append((bucket_archive_name, parts))
+            return _compiled
+
+        # every template is compiled before the generator is returned, so one
+        # which can not be compiled raises here rather than mid-purge; the
+        # original format only changes the extensions
+        compiled["JPEG"] = _compile("JPEG")
+
+        def _plan() -> Iterator[Tuple[str, str]]:
+            # content-addressed: (bucket_name, key) of a shared original ->
+            # the guids which reference it and have not been purged yet
+            shared: Dict[Tuple[str, str], Set[str]] = {}
+            for guid, original_format in items:
+                if original_format not in compiled:
+                    compiled[original_format] = _compile(original_format)
+                for bucket_name, parts in compiled[original_format]:
+                    yield (bucket_name, guid.join(parts))
+                if content_addressed:
+                    try:
+                        pointer = self.archive_pointer_load(guid)
+                    except errors.ImageError_MissingFile:
+                        continue
+                    archive = (pointer["bucket"], pointer["key"])
+                    (target_filename, bucket_name) = self.archive_pointer_filename(guid)
+                    yield (bucket_name, target_filename)
+                    (target_filename, bucket_name) = self.archive_reference_filename(
+                        guid, *archive
+                    )
+                    yield (bucket_name, target_filename)
+                    if archive not in shared:
+                        references = self._archive_references(*archive)
+                        if guid not in references:
+                            # not indexed; it is unknown who else uses it
+                            log.debug("archive `%s` has no reference index", archive)
+                            continue
+                        shared[archive] = references
+                    shared[archive].discard(guid)
+                    if not shared[archive]:
+                        del shared[archive]
+                        yield archive
+
+        return _plan()
+
+    def _files_save_plan(
+        self,
+        resizerResultset: ResizerResultset,
+        guid: str,
+        selected_resizes: Optional[TYPE_selected_resizes] = None,
+        archive_original: Optional[bool] = None,
+        manifest_merge: bool = False,
+    ) -> List[TYPE_upload]:
+        """
+        shared validation and setup for `files_save` and `afiles_save`
+
+        returns a list of uploads; the archive is last.
+            (size, target_filename, bucket_name, wrapped, boto3_ExtraArgs)
+        """
+        if boto3 is None:
+            raise NO_BOTO
+
+        self._files_save_reset()
+        self._manifest_merge = manifest_merge
+
+        if guid is None:
+            raise errors.ImageError_ArgsError(
+                """You must supply a `guid` for
+            the image. this is used"""
+            )
+
+        # quickly validate
+        selected_resizes = self._validate__selected_resizes(
+            resizerResultset, selected_resizes
+        )
+
+        # preload the calculated s3 bucketnames
+        s3_bucketnames = self.s3_bucketnames
+
+        # and then we have the bucketed filenames...
+        target_filenames = self.generate_filenames(
+            resizerResultset,
+            guid,
+            selected_resizes=selected_resizes,
+            archive_original=archive_original,
+        )
+
+        uploads: List[TYPE_upload] = []
+        for size in selected_resizes:
+            uploads.append(
+                self._file_upload_plan(
+                    size,
+                    target_filenames,
+                    s3_bucketnames,
+                    resizerResultset.resized[size],
+                )
+            )
+        if "@archive" in target_filenames:
+            uploads.append(
+                self._file_upload_plan(
+                    "@archive",
+                    target_filenames,
+                    s3_bucketnames,
+                    resizerResultset.original,
+                )
+            )
+
+        return uploads
+
+    def _file_upload_plan(
+        self,
+        size: str,
+        target_filenames: TYPE_files_mapping,
+        s3_bucketnames: Dict,
+        wrapped: BasicImage,
+    ) -> TYPE_upload:
+        """
+        builds a single upload for `_file_upload`;
+        for `@archive`, `wrapped` is the original
+        """
+        # grab the stash
+        (target_filename, _bucket_name) = target_filenames[size]
+
+        # get the calculated bucket_name
+        bucket_name = s3_bucketnames[_bucket_name]
+
+        assert wrapped.format
+        assert self._resizerConfig
+        if size == "@archive":
+            # calculate the headers ;
+            # no need to set acl, its going to be owner-only by default
+            _boto3_ExtraArgs = self._boto3_ExtraArgs_default_archive.copy()
+            _boto3_ExtraArgs["ContentType"] = utils.PIL_type_to_content_type(
+                wrapped.format
+            )
+            filename_template = self._filename_template_archive()
+        else:
+            # generate the ExtraArgs
+            _boto3_ExtraArgs = self._boto3_ExtraArgs_default_public.copy()
+            _boto3_ExtraArgs["ContentType"] = utils.PIL_type_to_content_type(
+                wrapped.format
+            )
+            # overwrite with Resizer ExtraArgs
+            instructions = self._resizerConfig.resizesSchema[size]
+            if "boto3_ExtraArgs" in instructions:
+                for k in instructions["boto3_ExtraArgs"]:
+                    _boto3_ExtraArgs[k] = instructions["boto3_ExtraArgs"][k]
+            filename_template = instructions.get(
+                "filename_template", self.filename_template
+            )
+
+        # content-addressed keys never change, so they can be cached forever
+        if (
+            self._saverConfig.cache_control_immutable
+            and ("CacheControl" not in _boto3_ExtraArgs)
+            and filename_template_is_content_addressed(filename_template)
+        ):
+            _boto3_ExtraArgs["CacheControl"] = self._saverConfig.cache_control_immutable
+
+        if self._saverConfig.skip_unchanged:
+            # the ETag is not the md5 for multipart or SSE-KMS uploads
+            _boto3_ExtraArgs["Metadata"] = dict(
+                _boto3_ExtraArgs.get("Metadata", {}),
+                **{METADATA_MD5: wrapped.file_md5},
+            )
+
+        return (size, target_filename, bucket_name, wrapped, _boto3_ExtraArgs)
+
+    def _file_upload(
+        self,
+        upload: TYPE_upload,
+        dry_run: bool = False,
+    ) -> str:
+        """
+        uploads a single item from `_files_save_plan`, then logs it
+
+        returns the `FILE_STATUS_` and records it in `self.files_status`
+        """
+        (size, target_filename, bucket_name, _wrapped, _boto3_ExtraArgs) = upload
+
+        assert self._saverConfig
+        content_addressed = (size == "@archive") and (
+            self._saverConfig.archive_content_addressed
+        )
+        status = FILE_STATUS_WRITTEN
+        if not dry_run:
+            if content_addressed:
+                status = self._archive_status(bucket_name, target_filename)
+            elif self._saverConfig.skip_unchanged:
+                status = self._file_status(_wrapped, bucket_name, target_filename)
+
+            if status == FILE_STATUS_SKIPPED:
+                log.debug(
+                    "Skipping unchanged `%s` in `%s` " % (target_filename, bucket_name)
+                )
+            else:
+                log.debug("Uploading `%s` to `%s` " % (target_filename, bucket_name))
+
+                # upload
+                self._throttled(
+                    bucket_name,
+                    target_filename,
+                    self._fileobj_upload,
+                    _wrapped,
+                    bucket_name,
+                    target_filename,
+                    _boto3_ExtraArgs,
+                )
+
+                # log to external plugin too
+                if self._saverLogger:
+                    # uploads may run on a thread pool; loggers need not be threadsafe
+                    with self._saverLogger_lock:
+                        self._saverLogger.log_save(
+                            bucket_name=bucket_name,
+                            key=target_filename,
+                            file_size=_wrapped.file_size,
+                            file_md5=_wrapped.file_md5,
+                        )
+
+            if content_addressed and (self._saverConfig.archive_index is not None):
+                self._saverConfig.archive_index.add(target_filename)
+
+        self.files_status[size] = status
+        self._manifest_entries[size] = {
+            "key": target_filename,
+            "bucket": bucket_name,
+            "format": _wrapped.format,
+            "width": _wrapped.width,
+            "height": _wrapped.height,
+            "file_size": _wrapped.file_size,
+            "digests": _wrapped.digests,
+        }
+        if content_addressed:
+            # other guids may use this object; see `files_delete_by_guid`
+            self._manifest_entries[size]["shared"] = True
+        if (
+            (size[0] != "@")
+            and self._resizerConfig
+            and (size in self._resizerConfig.resizesSchema)
+        ):
+            # lets a later schema change regenerate only this size
+            self._manifest_entries[size]["fingerprint"] = (
+                self._resizerConfig.size_fingerprint(size)
+            )
+        return status
+
+    def _filename_template_archive(self) -> str:
+        """the archive template for the configured archive mode"""
+        assert self._saverConfig
+        if self._saverConfig.archive_content_addressed:
+            return self.filename_template_archive_content
+        return self.filename_template_archive
+
+    def _archive_status(self, bucket_name: str, key: str) -> str:
+        """
+        content-addressed archives are never changed; this checks the
+        `archive_index`, then HEADs the object.
+        returns `FILE_STATUS_SKIPPED` if it exists, or `FILE_STATUS_WRITTEN`
+        """
+        assert self._saverConfig
+        archive_index = self._saverConfig.archive_index
+        if (archive_index is not None) and (key in archive_index):
+            return FILE_STATUS_SKIPPED
+        if self._file_head(bucket_name, key) is None:
+            return FILE_STATUS_WRITTEN
+        return FILE_STATUS_SKIPPED
+
+    def _file_head(
+        self, bucket_name: str, key: str
+    ) -> Optional["HeadObjectOutputTypeDef"]:
+        """returns the HEAD response for an object, or `None` if it is missing"""
+        try:
+            return self._throttled(
+                bucket_name,
+                key,
+                self.s3_client.head_object,
+                Bucket=bucket_name,
+                Key=key,
+            )
+        except botocore.exceptions.ClientError as exc:
+            if exc.response.get("Error", {}).get("Code") in (
+                "404",
+                "NoSuchKey",
+                "NotFound",
+            ):
+                return None
+            raise
+
+    def _file_status(
+        self,
+        wrapped: BasicImage,
+        bucket_name: str,
+        key: str,
+    ) -> str:
+        """
+        compares `wrapped` to the existing object, via a HEAD request;
+        returns a `FILE_STATUS_`
+        """
+        response = self._file_head(bucket_name, key)
+        if response is None:
+            return FILE_STATUS_WRITTEN
+        existing_md5 = response.get("Metadata", {}).get(METADATA_MD5)
+        if existing_md5 is None:
+            # a single part upload, without SSE-KMS, has the md5 as its ETag
+            existing_md5 = response.get("ETag", "").strip('"')
+        if existing_md5 == wrapped.file_md5:
+            return FILE_STATUS_SKIPPED
+        return FILE_STATUS_CHANGED
+
+    def _files_unskipped(self, files_saved: TYPE_files_mapping) -> TYPE_files_mapping:
+        """
+        the items of `files_saved` which a rollback may delete;
+        skipped items existed before this upload, and a content-addressed
+        archive may be shared by other guids, so a rollback must keep them
+        """
+        return {
+            size: item
+            for (size, item) in files_saved.items()
+            if (self.files_status.get(size) != FILE_STATUS_SKIPPED)
+            and not self._manifest_entries.get(size, {}).get("shared")
+        }
+
     def files_save(  # type: ignore[override]
         self,
         resizerResultset: ResizerResultset,
@@ -540,6 +1463,8 @@ class SaverManager(_SaverCoreManager, _core.SaverManager):
         selected_resizes: Optional[TYPE_selected_resizes] = None,
         archive_original: Optional[bool] = None,
         dry_run: bool = False,
+        concurrency: Optional[int] = None,
+        manifest_merge: bool = False,
     ) -> TYPE_files_mapping:
         """
         Returns a dict of resized images
@@ -573,144 +1498,608 @@ class SaverManager(_SaverCoreManager, _core.SaverManager):
         `dry_run`
             default = `False`
             should we just pretend to upload
-        """
-        if boto3 is None:
-            raise NO_BOTO
-
-        if guid is None:
-            raise errors.ImageError_ArgsError(
-                """You must supply a `guid` for
-            the image. this is used"""
-            )
-
-        # quickly validate
-        selected_resizes = self._validate__selected_resizes(
-            resizerResultset, selected_resizes
-        )
 
-        # preload the calculated s3 bucketnames
-        s3_bucketnames = self.s3_bucketnames
+        `concurrency`
+            default = `None` -- `self._saverConfig.upload_concurrency`
+            if more than `1`, uploads are run on a thread pool of this size.
+            the first failure cancels the uploads which have not started,
+            then every completed upload is deleted.
 
-        # and then we have the bucketed filenames...
-        target_filenames = self.generate_filenames(
+        `manifest_merge`
+            default = `False`
+            if `True`, the manifest keeps the entries of the existing manifest
+            for `guid` which were not saved again; use this when only some
+            sizes are regenerated
+        """
+        uploads = self._files_save_plan(
             resizerResultset,
             guid,
             selected_resizes=selected_resizes,
             archive_original=archive_original,
+            manifest_merge=manifest_merge,
         )
 
+        concurrency = self._upload_concurrency(concurrency)
+        if concurrency > 1:
+            return self._files_save_finish(
+                guid,
+                self._files_upload_pipeline(
+                    uploads, dry_run=dry_run, concurrency=concurrency
+                ),
+                dry_run=dry_run,
+            )
+
         # log uploads for removal/tracking and return
         files_saved: TYPE_files_mapping = {}
-        assert self._resizerConfig
-        assert self._resizerConfig.resizesSchema
         try:
             # and then we upload...
-            for size in selected_resizes:
-                # grab the stash
-                (target_filename, _bucket_name) = target_filenames[size]
+            for upload in uploads:
+                self._file_upload(upload, dry_run=dry_run)
 
-                # get the calculated bucket_name
-                bucket_name = s3_bucketnames[_bucket_name]
+                # log for removal/tracking & return
+                (size, target_filename, bucket_name) = upload[:3]
+                files_saved[size] = (target_filename, bucket_name)
 
-                log.debug("Uploading `%s` to `%s` " % (target_filename, bucket_name))
+        except Exception as exc:
+            # if we have ANY issues, we want to delete everything from amazon s3. otherwise this stuff is just hiding up there
+            log.debug(
+                "Error uploading... rolling back s3 items. encounted `%s` in `saver.s3.SaverManager.files_save`",
+                exc,
+            )
+            files_saved = self.files_delete(self._files_unskipped(files_saved))
+            raise errors.ImageError_S3Upload("error uploading")
 
-                # generate the ExtraArgs
-                _boto3_ExtraArgs = self._boto3_ExtraArgs_default_public.copy()
-                _format = resizerResultset.resized[size].format
-                assert isinstance(_format, str)
-                _boto3_ExtraArgs["ContentType"] = utils.PIL_type_to_content_type(
-                    _format
-                )
-                # overwrite with Resizer ExtraArgs
-                if "boto3_ExtraArgs" in self._resizerConfig.resizesSchema[size]:
-                    for k in self._resizerConfig.resizesSchema[size]["boto3_ExtraArgs"]:
-                        _boto3_ExtraArgs[k] = self._resizerConfig.resizesSchema[size][
-                            "boto3_ExtraArgs"
-                        ][k]
-
-                if not dry_run:
-                    # the active file
-                    _wrapped = resizerResultset.resized[size]
-
-                    # dirty workaround. boto3 has a bug in which it closes files.
-                    _buffer = NonCloseableBufferedReader(_wrapped.file)
-
-                    # upload
-                    self.s3_client.upload_fileobj(
-                        _buffer,
-                        bucket_name,
-                        target_filename,
-                        ExtraArgs=_boto3_ExtraArgs,
-                    )
-                    _buffer.detach()
+        return self._files_save_finish(guid, files_saved, dry_run=dry_run)
 
-                    # log to external plugin too
-                    if self._saverLogger:
-                        self._saverLogger.log_save(
-                            bucket_name=bucket_name,
-                            key=target_filename,
-                            file_size=_wrapped.file_size,
-                            file_md5=_wrapped.file_md5,
-                        )
+    def files_save_stream(
+        self,
+        resizer: Resizer,
+        guid: str,
+        selected_resizes: Optional[TYPE_selected_resizes] = None,
+        archive_original: Optional[bool] = None,
+        dry_run: bool = False,
+        concurrency: Optional[int] = None,
+    ) -> TYPE_files_mapping:
+        """
+        Resizes and uploads in a pipeline; returns the same mapping as
+        `files_save`.
+
+        `files_save` needs a complete `ResizerResultset`, so nothing is
+        uploaded until the slowest size is encoded, and every size is held in
+        memory at once. This pulls each size from `Resizer.iter_resize` and
+        uploads it on a background thread while the next size is encoded.
+        Once a size is stored, it is no longer referenced and can be freed.
+
+        `resizer`
+            a `resizer.Resizer` with a registered image
+
+        `concurrency`
+            default = `None` -- `self._saverConfig.upload_concurrency`
+            the number of uploads in flight. encoding stops while this many
+            uploads are running, so only a few more than `concurrency` sizes
+            are held in memory.
+
+        see `files_save` for the other arguments. `selected_resizes` defaults
+        to `self._resizerConfig.selected_resizes`
+
+        this is all or nothing: if any resize or upload fails, every
+        completed upload is deleted. upload failures raise
+        `errors.ImageError_S3Upload`; resize failures are re-raised.
+        """
+        if boto3 is None:
+            raise NO_BOTO
 
-                # log for removal/tracking & return
-                files_saved[size] = (target_filename, bucket_name)
+        concurrency = self._upload_concurrency(concurrency)
+        self._files_save_reset()
 
+        assert self._resizerConfig
+        if selected_resizes is None:
+            selected_resizes = self._resizerConfig.selected_resizes
+
+        # the sizes and the archive are validated before the first size is
+        # encoded; the filename of each size is generated once it is encoded,
+        # as its template may use the digests or dimensions of the file
+        original = resizer.get_original()
+        self._validate__selected_resizes(
+            ResizerResultset(
+                resized=dict.fromkeys(selected_resizes), original=original
+            ),
+            selected_resizes,
+        )
+        target_filenames = self.generate_filenames(
+            ResizerResultset(resized={}, original=original),
+            guid,
+            selected_resizes=[],
+            archive_original=archive_original,
+        )
+        s3_bucketnames = self.s3_bucketnames
+
+        def _uploads() -> Iterator[TYPE_upload]:
             if "@archive" in target_filenames:
-                size = "@archive"
-                (target_filename, _bucket_name) = target_filenames[size]
-                # get the calculated bucket_name
-                bucket_name = s3_bucketnames[_bucket_name]
+                yield self._file_upload_plan(
+                    "@archive", target_filenames, s3_bucketnames, original
+                )
+            for size, resized in resizer.iter_resize(selected_resizes=selected_resizes):
+                target_filenames.update(
+                    self.generate_filenames(
+                        ResizerResultset(resized={size: resized}, original=original),
+                        guid,
+                        selected_resizes=[size],
+                        archive_original=False,
+                    )
+                )
+                yield self._file_upload_plan(
+                    size, target_filenames, s3_bucketnames, resized
+                )
 
-                log.debug("Uploading `%s` to `%s` " % (target_filename, bucket_name))
+        files_saved = self._files_upload_pipeline(
+            _uploads(), dry_run=dry_run, concurrency=concurrency
+        )
+        return self._files_save_finish(guid, files_saved, dry_run=dry_run)
 
-                # calculate the headers ;
-                # no need to set acl, its going to be owner-only by default
-                _boto3_ExtraArgs = self._boto3_ExtraArgs_default_archive.copy()
-                assert resizerResultset.original.format
-                _boto3_ExtraArgs["ContentType"] = utils.PIL_type_to_content_type(
-                    resizerResultset.original.format
+    def _files_save_finish(
+        self,
+        guid: str,
+        files_saved: TYPE_files_mapping,
+        dry_run: bool = False,
+    ) -> TYPE_files_mapping:
+        """
+        once everything else is saved, writes:
+            the reference to a content-addressed archive, as `@archive_reference`
+            the archive pointer of a content-addressed archive, as `@archive_pointer`
+            the manifest, if configured, as `@manifest`
+        if either can not be written, everything is rolled back.
+
+        a content-addressed archive may be shared by other guids, so it is not
+        returned; `files_delete(files_saved)` must not remove it. it is found
+        with `archive_pointer_load`.
+        """
+        assert self._saverConfig
+        content_addressed = self._saverConfig.archive_content_addressed
+        write_pointer = ("@archive" in files_saved) and content_addressed
+        if write_pointer or self._saverConfig.write_manifest:
+            try:
+                if write_pointer:
+                    files_saved["@archive_reference"] = self._archive_reference_save(
+                        guid, dry_run=dry_run
+                    )
+                    files_saved["@archive_pointer"] = self._archive_pointer_save(
+                        guid, dry_run=dry_run
+                    )
+                if self._saverConfig.write_manifest:
+                    files_saved["@manifest"] = self._manifest_save(
+                        guid, dry_run=dry_run
+                    )
+            except Exception as exc:
+                log.debug(
+                    "Error uploading... rolling back s3 items. encounted `%s` in `saver.s3.SaverManager._files_save_finish`",
+                    exc,
                 )
+                self.files_delete(self._files_unskipped(files_saved))
+                raise errors.ImageError_S3Upload("error uploading manifest")
+        if content_addressed:
+            files_saved.pop("@archive", None)
+        return files_saved
 
-                if not dry_run:
-                    # the active file
-                    _wrapped = resizerResultset.original
+    def archive_pointer_filename(self, guid: str) -> Tuple[str, str]:
+        """returns the (target_filename, bucket_name) of the archive pointer"""
+        assert self._saverConfig
+        bucket_name = self._saverConfig.bucket_archive_name
+        if not bucket_name:
+            raise ValueError("Could not detect a bucket_name for archive")
+        return (
+            self.filename_template_archive_pointer % {"guid": guid},
+            bucket_name,
+        )
 
-                    # dirty workaround. boto3 has a bug in which it closes files.
-                    _buffer = NonCloseableBufferedReader(_wrapped.file)
+    def archive_reference_filename(
+        self,
+        guid: str,
+        bucket_name: str,
+        key: str,
+    ) -> Tuple[str, str]:
+        """
+        returns the (target_filename, bucket_name) of the reference from
+        `guid` to the content-addressed archive `key` in `bucket_name`.
 
-                    # upload
-                    self.s3_client.upload_fileobj(
-                        _buffer,
-                        bucket_name,
-                        target_filename,
-                        ExtraArgs=_boto3_ExtraArgs,
-                    )
-                    _buffer.detach()
+        each guid which uses an archive has a reference under the archive's
+        own prefix, so the guids which use it are found without a listing of
+        the bucket.
+        """
+        return (
+            self.filename_template_archive_references % {"key": key} + guid,
+            bucket_name,
+        )
 
-                    # log to external plugin too
-                    if self._saverLogger:
-                        self._saverLogger.log_save(
-                            bucket_name=bucket_name,
-                            key=target_filename,
-                            file_size=_wrapped.file_size,
-                            file_md5=_wrapped.file_md5,
-                        )
+    def _archive_references(self, bucket_name: str, key: str) -> Set[str]:
+        """the guids which reference the content-addressed archive `key`"""
+        prefix = self.filename_template_archive_references % {"key": key}
+        _start = len(prefix)
+        guids: Set[str] = set()
+        paginator = self.s3_client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+            for item in page.get("Contents", []):
+                guids.add(item["Key"][_start:])
+        return guids
+
+    def _archive_reference_save(
+        self,
+        guid: str,
+        dry_run: bool = False,
+    ) -> Tuple[str, str]:
+        """
+        writes the reference from `guid` to the content-addressed archive of
+        the last save
+        """
+        _archive = self._manifest_entries["@archive"]
+        (target_filename, bucket_name) = self.archive_reference_filename(
+            guid, _archive["bucket"], _archive["key"]
+        )
+        self._json_save(bucket_name, target_filename, {"guid": guid}, dry_run=dry_run)
+        self._manifest_entries["@archive_reference"] = {
+            "key": target_filename,
+            "bucket": bucket_name,
+        }
+        return (target_filename, bucket_name)
+
+    def _archive_pointer_save(
+        self,
+        guid: str,
+        dry_run: bool = False,
+    ) -> Tuple[str, str]:
+        """
+        writes the guid -> digest pointer for the content-addressed archive of
+        the last save; for a duplicate original, this and the reference are
+        the only writes.
+        """
+        (target_filename, bucket_name) = self.archive_pointer_filename(guid)
+        _archive = self._manifest_entries["@archive"]
+        pointer = dict(_archive, guid=guid, version=ARCHIVE_POINTER_VERSION)
+        del pointer["shared"]
+        self._json_save(bucket_name, target_filename, pointer, dry_run=dry_run)
+        self._manifest_entries["@archive_pointer"] = {
+            "key": target_filename,
+            "bucket": bucket_name,
+        }
+        return (target_filename, bucket_name)
+
+    def archive_pointer_load(self, guid: str) -> Dict[str, Any]:
+        """
+        reads the archive pointer for `guid`; its `key` and `bucket` locate
+        the content-addressed original.
 
-                # log for removal/tracking & return
+        raises `errors.ImageError_MissingFile` if there is none
+        """
+        (target_filename, bucket_name) = self.archive_pointer_filename(guid)
+        pointer = self._json_load(
+            bucket_name, target_filename, "archive pointer for guid `%s`" % guid
+        )
+        if pointer.get("version") != ARCHIVE_POINTER_VERSION:
+            raise errors.ImageError_Parsing(
+                "unsupported archive pointer version: `%s`" % pointer.get("version")
+            )
+        return pointer
+
+    def _json_save(
+        self,
+        bucket_name: str,
+        target_filename: str,
+        data: Dict[str, Any],
+        dry_run: bool = False,
+    ) -> None:
+        """uploads `data` as a json object"""
+        log.debug("Uploading `%s` to `%s` " % (target_filename, bucket_name))
+        if dry_run:
+            return
+        self._throttled(
+            bucket_name,
+            target_filename,
+            self.s3_client.put_object,
+            Bucket=bucket_name,
+            Key=target_filename,
+            Body=json.dumps(data, sort_keys=True).encode("utf-8"),
+            ContentType="application/json",
+        )
+
+    def _json_load(
+        self,
+        bucket_name: str,
+        target_filename: str,
+        description: str,
+    ) -> Dict[str, Any]:
+        """
+        downloads a json object
+
+        raises `errors.ImageError_MissingFile` if it does not exist
+        """
+        if boto3 is None:
+            raise NO_BOTO
+        try:
+            response = self._throttled(
+                bucket_name,
+                target_filename,
+                self.s3_client.get_object,
+                Bucket=bucket_name,
+                Key=target_filename,
+            )
+        except botocore.exceptions.ClientError as exc:
+            if exc.response.get("Error", {}).get("Code") in ("404", "NoSuchKey"):
+                raise errors.ImageError_MissingFile("no %s" % description)
+            raise
+        return json.loads(response["Body"].read())
+
+    def manifest_filename(self, guid: str) -> Tuple[str, str]:
+        """returns the (target_filename, bucket_name) of the manifest for `guid`"""
+        return (
+            self.filename_template_manifest % {"guid": guid},
+            self.bucket_manifest_name,
+        )
+
+    def _manifest_save(self, guid: str, dry_run: bool = False) -> Tuple[str, str]:
+        """
+        writes the manifest of the last save.
+
+        the manifest is a small json object listing every saved item, so the
+        files can be found and deleted without the schema that made them.
+        """
+        assert self._resizerConfig
+        (target_filename, bucket_name) = self.manifest_filename(guid)
+        if self._manifest_merge:
+            try:
+                previous = self.manifest_load(guid)["files"]
+            except errors.ImageError_MissingFile:
+                previous = {}
+            for size, entry in previous.items():
+                if (size != "@manifest") and (size not in self._manifest_entries):
+                    self._manifest_entries[size] = entry
+        sizes = [size for size in self._manifest_entries if size[0] != "@"]
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "guid": guid,
+            "schema_fingerprint": self._resizerConfig.schema_fingerprint(
+                [size for size in sizes if size in self._resizerConfig.resizesSchema]
+            ),
+            "size_fingerprints": {
+                size: self._manifest_entries[size]["fingerprint"]
+                for size in sizes
+                if "fingerprint" in self._manifest_entries[size]
+            },
+            "files": self._manifest_entries,
+        }
+        self._json_save(bucket_name, target_filename, manifest, dry_run=dry_run)
+        return (target_filename, bucket_name)
+
+    def manifest_load(self, guid: str) -> Dict[str, Any]:
+        """
+        reads the manifest for `guid`
+
+        raises `errors.ImageError_MissingFile` if there is none
+        """
+        (target_filename, bucket_name) = self.manifest_filename(guid)
+        manifest = self._json_load(
+            bucket_name, target_filename, "manifest for guid `%s`" % guid
+        )
+        if manifest.get("version") != MANIFEST_VERSION:
+            raise errors.ImageError_Parsing(
+                "unsupported manifest version: `%s`" % manifest.get("version")
+            )
+        return manifest
+
+    def manifest_diff(self, guid: str) -> SchemaDiff:
+        """
+        compares the manifest for `guid` to the current `ResizerConfig`; the
+        `SchemaDiff.regenerate` sizes are the ones to render again.
+
+        raises `errors.ImageError_MissingFile` if there is no manifest
+        """
+        assert self._resizerConfig
+        manifest = self.manifest_load(guid)
+        return self._resizerConfig.diff(manifest.get("size_fingerprints", {}))
+
+    def files_delete_by_guid(
+        self,
+        guid: str,
+        dry_run: bool = False,
+    ) -> TYPE_files_mapping:
+        """
+        deletes everything listed in the manifest for `guid`, then the
+        manifest itself. this does not need the schema, or a bucket listing.
+
+        Returns the items which could not be deleted, like `files_delete`;
+        if anything remains, the manifest is kept so this can be re-run.
+
+        a content-addressed archive may be shared by other guids, so only its
+        `@archive_pointer` is deleted.
+
+        raises `errors.ImageError_MissingFile` if there is no manifest
+        """
+        manifest = self.manifest_load(guid)
+        files_saved: TYPE_files_mapping = {
+            size: (entry["key"], entry["bucket"])
+            for (size, entry) in manifest["files"].items()
+            if not entry.get("shared")
+        }
+        files_remaining = self.files_delete(files_saved, dry_run=dry_run)
+        if not files_remaining:
+            files_remaining = self.files_delete(
+                {"@manifest": self.manifest_filename(guid)}, dry_run=dry_run
+            )
+        return files_remaining
+
+    def _upload_concurrency(self, concurrency: Optional[int]) -> int:
+        if concurrency is None:
+            assert self._saverConfig
+            concurrency = self._saverConfig.upload_concurrency
+        if concurrency < 1:
+            raise ValueError("`concurrency` must be 1 or more")
+        return concurrency
+
+    def _files_upload_pipeline(
+        self,
+        uploads: Iterable[TYPE_upload],
+        dry_run: bool = False,
+        concurrency: int = 1,
+    ) -> TYPE_files_mapping:
+        """
+        uploads on a thread pool of `concurrency` workers.
+
+        `uploads` is only consumed as workers become free, so it may be a
+        generator that produces each upload on demand.
+
+        this is all or nothing: on the first failure the uploads which have
+        not started are cancelled, the running ones are allowed to finish,
+        and then every completed upload is deleted. upload failures raise
+        `errors.ImageError_S3Upload`; errors raised by `uploads` are re-raised.
+        """
+        if not dry_run:
+            # create the client before the workers need it
+            self.s3_client
+
+        files_saved: TYPE_files_mapping = {}
+        # future -> (size, target_filename, bucket_name)
+        pending: Dict[concurrent.futures.Future, Tuple[str, str, str]] = {}
+
+        def _drain(return_when: str) -> None:
+            (done, _not_done) = concurrent.futures.wait(
+                pending, return_when=return_when
+            )
+            failed = None
+            for future in done:
+                (size, target_filename, bucket_name) = pending.pop(future)
+                if future.cancelled():
+                    continue
+                try:
+                    future.result()
+                except Exception as exc:
+                    failed = exc
+                    continue
                 files_saved[size] = (target_filename, bucket_name)
+            if failed is not None:
+                raise errors.ImageError_S3Upload("error uploading") from failed
+
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=concurrency)
+        try:
+            for upload in uploads:
+                while len(pending) >= concurrency:
+                    _drain(concurrent.futures.FIRST_COMPLETED)
+                future = executor.submit(self._file_upload, upload, dry_run=dry_run)
+                (size, target_filename, bucket_name) = upload[:3]
+                pending[future] = (size, target_filename, bucket_name)
+                # the pending upload holds the only reference to the file now
+                del upload
+            _drain(concurrent.futures.ALL_COMPLETED)
 
         except Exception as exc:
             # if we have ANY issues, we want to delete everything from amazon s3. otherwise this stuff is just hiding up there
             log.debug(
-                "Error uploading... rolling back s3 items. encounted `%s` in `saver.s3.SaverManager.files_save`",
+                "Error uploading... rolling back s3 items. encounted `%s` in `saver.s3.SaverManager._files_upload_pipeline`",
                 exc,
             )
-            files_saved = self.files_delete(files_saved)
-            raise errors.ImageError_S3Upload("error uploading")
+            for future in pending:
+                future.cancel()
+            # uploads which already started must finish, so they can be deleted
+            try:
+                _drain(concurrent.futures.ALL_COMPLETED)
+            except errors.ImageError_S3Upload:
+                pass
+            self.files_delete(self._files_unskipped(files_saved))
+            raise
+
+        finally:
+            executor.shutdown(wait=False)
 
         return files_saved
 
+    async def afiles_save(
+        self,
+        resizerResultset: ResizerResultset,
+        guid: str,
+        selected_resizes: Optional[TYPE_selected_resizes] = None,
+        archive_original: Optional[bool] = None,
+        dry_run: bool = False,
+        executor: Optional[concurrent.futures.ThreadPoolExecutor] = None,
+        concurrency: Optional[int] = None,
+        manifest_merge: bool = False,
+    ) -> TYPE_files_mapping:
+        """
+        asyncio version of `files_save`; accepts the same arguments
+
+        the save runs in `executor` (default: the loop's executor), and
+        uploads on a thread pool of `concurrency` workers (default
+        `self._saverConfig.upload_concurrency`), as `files_save` does.
+
+        this is all or nothing: if any upload or the manifest fails, or the
+        task is cancelled, every completed upload is deleted.
+        uploads which already started are allowed to finish first, so they
+        can be deleted too.
+        """
+        uploads = self._files_save_plan(
+            resizerResultset,
+            guid,
+            selected_resizes=selected_resizes,
+            archive_original=archive_original,
+            manifest_merge=manifest_merge,
+        )
+        concurrency = self._upload_concurrency(concurrency)
+        # set when the task is cancelled; no upload is started after this
+        cancelled = threading.Event()
+
+        def _uploads() -> Iterator[TYPE_upload]:
+            for upload in uploads:
+                if cancelled.is_set():
+                    raise errors.ImageError_S3Upload("cancelled")
+                yield upload
+
+        def _save() -> TYPE_files_mapping:
+            files_saved = self._files_upload_pipeline(
+                _uploads(), dry_run=dry_run, concurrency=concurrency
+            )
+            if cancelled.is_set():
+                self.files_delete(self._files_unskipped(files_saved))
+                raise errors.ImageError_S3Upload("cancelled")
+            return self._files_save_finish(guid, files_saved, dry_run=dry_run)
+
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(executor, _save)
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            cancelled.set()
+            log.debug(
+                "Cancelled... rolling back s3 items. in `saver.s3.SaverManager.afiles_save`"
+            )
+            # the save stops before its next upload and rolls itself back;
+            # this must finish, even if we are cancelled again
+            try:
+                files_saved = await asyncio.shield(future)
+            except Exception:
+                # it was rolled back
+                files_saved = {}
+            if files_saved:
+                # it finished before it saw the cancellation
+                await asyncio.shield(
+                    loop.run_in_executor(
+                        executor,
+                        functools.partial(
+                            self.files_delete, self._files_unskipped(files_saved)
+                        ),
+                    )
+                )
+            raise
+
+    async def afiles_delete(
+        self,
+        files_saved: TYPE_files_mapping,
+        dry_run: bool = False,
+        executor: Optional[concurrent.futures.Executor] = None,
+    ) -> TYPE_files_mapping:
+        """asyncio version of `files_delete`; runs in `executor`"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            executor,
+            functools.partial(self.files_delete, files_saved, dry_run=dry_run),
+        )
+
 
 class SaverSimpleAccess(_SaverCoreManager, _core.SaverSimpleAccess):
     def __init__(
@@ -718,11 +2107,13 @@ class SaverSimpleAccess(_SaverCoreManager, _core.SaverSimpleAccess):
         saverConfig: SaverConfig,
         saverLogger: SaverLogger,
         resizerConfig: ResizerConfig_S3,
+        s3ClientPool: Optional[S3ClientPool] = None,
     ):
         super(SaverSimpleAccess, self).__init__(
             saverConfig=saverConfig,
             saverLogger=saverLogger,
             resizerConfig=resizerConfig,
+            s3ClientPool=s3ClientPool,
         )
 
     def file_save(
@@ -758,17 +2149,16 @@ class SaverSimpleAccess(_SaverCoreManager, _core.SaverSimpleAccess):
             )
 
             if not dry_run:
-                # dirty workaround. boto3 has a bug in which it closes files.
-                _buffer = NonCloseableBufferedReader(wrappedFile.file)
-
                 # upload
-                self.s3_client.upload_fileobj(
-                    _buffer,
+                self._throttled(
+                    bucket_name,
+                    filename,
+                    self._fileobj_upload,
+                    wrappedFile,
                     bucket_name,
                     filename,
-                    ExtraArgs=_boto3_ExtraArgs,
+                    _boto3_ExtraArgs,
                 )
-                _buffer.detach()
 
                 # log to external plugin too
                 if self._saverLogger:
@@ -0,0 +1,316 @@
+"""
+Throttling for uploads to s3.
+
+S3 answers `503 SlowDown` when a prefix receives more requests than it can
+handle. Without throttling, a backfill that hits this rolls back whole jobs.
+An `UploadThrottle` sits around each upload and combines:
+
+* a `TokenBucket` per bucket/prefix, which caps the request rate
+* an `AdaptiveLimiter`, which adjusts the number of concurrent uploads (AIMD):
+  it grows by one after a window of fast successes, and halves on throttling
+  or slow responses
+* retries of throttled requests, with jittered exponential backoff
+
+Usage:
+
+    saverConfig = imagehelper.saver.s3.SaverConfig(
+        ...
+        upload_concurrency=32,
+        upload_throttle=UploadThrottle(rate=100, max_concurrency=32),
+    )
+
+The throttle holds the state, so share one instance across managers; a
+`SaverConfig` used by a `SaverManagerFactory` does this.
+"""
+
+# stdlib
+import logging
+import random
+import threading
+import time
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import Optional
+from typing import Tuple
+from typing import TypeVar
+
+# ==============================================================================
+
+log = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# error codes s3 uses when a request should be slowed down and retried
+THROTTLING_ERROR_CODES = (
+    "SlowDown",
+    "Throttling",
+    "ThrottlingException",
+    "RequestLimitExceeded",
+    "RequestThrottled",
+    "TooManyRequests",
+    "503",
+)
+
+
+def _is_throttling_response(exc: BaseException) -> bool:
+    response = getattr(exc, "response", None)
+    if not isinstance(response, dict):
+        return False
+    if response.get("Error", {}).get("Code") in THROTTLING_ERROR_CODES:
+        return True
+    if response.get("ResponseMetadata", {}).get("HTTPStatusCode") in (429, 503):
+        return True
+    return False
+
+
+def is_throttling_error(exc: BaseException) -> bool:
+    """
+    is `exc` a botocore `ClientError` for throttling?
+
+    boto3's transfer manager (`upload_fileobj`) raises an
+    `S3UploadFailedError` while handling the `ClientError`, so the errors
+    `exc` was raised from are checked as well.
+    """
+    seen = set()
+    _exc: Optional[BaseException] = exc
+    while (_exc is not None) and (id(_exc) not in seen):
+        if _is_throttling_response(_exc):
+            return True
+        seen.add(id(_exc))
+        _exc = _exc.__cause__ or _exc.__context__
+    return False
+
+
+class TokenBucket(object):
+    """
+    threadsafe token bucket.
+
+    `rate`
+        tokens added per second
+    `burst`
+        the most tokens the bucket holds; default `rate`
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if rate <= 0:
+            raise ValueError("`rate` must be more than 0")
+        self.rate = rate
+        self.burst = burst if burst is not None else max(rate, 1)
+        self._clock = clock
+        self._tokens = self.burst
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(
+            self.burst, self._tokens + ((now - self._updated) * self.rate)
+        )
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1) -> float:
+        """
+        takes `tokens` if they are available and returns `0`;
+        otherwise returns the seconds to wait before they will be
+        """
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0
+            return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens: float = 1) -> None:
+        """blocks until `tokens` are taken"""
+        while True:
+            wait = self.try_acquire(tokens)
+            if not wait:
+                return
+            time.sleep(wait)
+
+
+class AdaptiveLimiter(object):
+    """
+    threadsafe concurrency limit, adjusted by additive-increase /
+    multiplicative-decrease.
+
+    `initial`, `minimum`, `maximum`
+        the concurrency limits
+    `latency_target`
+        optional seconds; a success slower than this counts as congestion
+    `decrease_factor`
+        the limit is multiplied by this on congestion
+    """
+
+    def __init__(
+        self,
+        initial: int = 4,
+        minimum: int = 1,
+        maximum: int = 64,
+        latency_target: Optional[float] = None,
+        decrease_factor: float = 0.5,
+    ):
+        if not (1 <= minimum <= initial <= maximum):
+            raise ValueError("`minimum <= initial <= maximum` must be 1 or more")
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.decrease_factor = decrease_factor
+        self._limit = float(initial)
+        self._active = 0
+        self._condition = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    def acquire(self) -> None:
+        """blocks until there is a free slot"""
+        with self._condition:
+            while self._active >= int(self._limit):
+                self._condition.wait()
+            self._active += 1
+
+    def release(self, latency: Optional[float] = None, congested: bool = False) -> None:
+        """
+        frees a slot, and adjusts the limit.
+
+        `congested` is `True` for a throttled request; a `latency` over
+        `latency_target` counts as congestion too.
+        """
+        with self._condition:
+            self._active -= 1
+            if (
+                (not congested)
+                and (latency is not None)
+                and (self.latency_target is not None)
+                and (latency > self.latency_target)
+            ):
+                congested = True
+            if congested:
+                self._limit = max(self.minimum, self._limit * self.decrease_factor)
+            else:
+                # grows by one per window of `limit` successes
+                self._limit = min(self.maximum, self._limit + (1 / self._limit))
+            self._condition.notify_all()
+
+
+class UploadThrottle(object):
+    """
+    rate limits, adapts the concurrency of, and retries s3 requests.
+
+    `rate`
+        optional requests per second, for each bucket/prefix
+    `burst`
+        optional token bucket size; default `rate`
+    `prefix_length`
+        the number of leading characters of a key that form its prefix;
+        `0` (default) limits per bucket
+    `max_concurrency`
+        the most concurrent requests; the `AdaptiveLimiter` starts at
+        `initial_concurrency` and stays between `1` and this
+    `latency_target`
+        optional seconds; slower successes reduce the concurrency
+    `retries`
+        the number of retries for a throttled request
+    `backoff_base`, `backoff_cap`
+        the retry delay is random between `0` and
+        `min(backoff_cap, backoff_base * 2 ** attempt)` ("full jitter")
+    """
+
+    def __init__(
+        self,
+        rate: Optional[float] = None,
+        burst: Optional[float] = None,
+        prefix_length: int = 0,
+        max_concurrency: int = 64,
+        initial_concurrency: Optional[int] = None,
+        latency_target: Optional[float] = None,
+        retries: int = 8,
+        backoff_base: float = 0.1,
+        backoff_cap: float = 20,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.prefix_length = prefix_length
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.limiter = AdaptiveLimiter(
+            initial=initial_concurrency or min(4, max_concurrency),
+            maximum=max_concurrency,
+            latency_target=latency_target,
+        )
+        # (bucket_name, prefix) -> TokenBucket
+        self._buckets: Dict[Tuple[str, str], TokenBucket] = {}
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "throttled": 0, "retries": 0}
+
+    def token_bucket(self, bucket_name: str, key: str) -> Optional[TokenBucket]:
+        if self.rate is None:
+            return None
+        _prefix = (bucket_name, key[: self.prefix_length])
+        with self._lock:
+            if _prefix not in self._buckets:
+                self._buckets[_prefix] = TokenBucket(self.rate, burst=self.burst)
+            return self._buckets[_prefix]
+
+    def backoff(self, attempt: int) -> float:
+        """the seconds to wait before retry `attempt` (counting from 0)"""
+        return random.uniform(
+            0, min(self.backoff_cap, self.backoff_base * (2**attempt))
+        )
+
+    def call(
+        self,
+        bucket_name: str,
+        key: str,
+        func: Callable[..., T],
+        *args: Any,
+        **kwargs: Any,
+    ) -> T:
+        """
+        calls `func(*args, **kwargs)` for a request to `bucket_name/key`;
+        throttled requests are retried, other errors are raised
+        """
+        token_bucket = self.token_bucket(bucket_name, key)
+        attempt = 0
+        while True:
+            if token_bucket is not None:
+                token_bucket.acquire()
+            self.limiter.acquire()
+            t_start = time.monotonic()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as exc:
+                throttled = is_throttling_error(exc)
+                self.limiter.release(congested=throttled)
+                with self._lock:
+                    self.stats["requests"] += 1
+                    if throttled:
+                        self.stats["throttled"] += 1
+                if (not throttled) or (attempt >= self.retries):
+                    raise
+                wait = self.backoff(attempt)
+                log.debug(
+                    "throttled on `%s/%s`; retrying in %.3fs", bucket_name, key, wait
+                )
+                with self._lock:
+                    self.stats["retries"] += 1
+                time.sleep(wait)
+                attempt += 1
+                continue
+            self.limiter.release(latency=time.monotonic() - t_start)
+            with self._lock:
+                self.stats["requests"] += 1
+            return result
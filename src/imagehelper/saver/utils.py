@@ -1,13 +1,117 @@
 # stlib
+import hashlib
+import re
+from typing import Any
 from typing import Optional
+from typing import Tuple
 
 # local
+from .. import errors
 from .. import utils
+from ..image_wrapper import BasicImage
 from ..image_wrapper import ResizerInstructions
 from ..resizer import ResizerResultset
 
 # ==============================================================================
 
+# algorithms which can be used as filename tokens; `shake_` digests need a length
+DIGEST_TOKEN_ALGORITHMS = frozenset(
+    [a for a in hashlib.algorithms_guaranteed if not a.startswith("shake_")]
+    + ["crc32", "crc32c"]
+)
+
+# the version of the guid -> digest records of content-addressed archives
+ARCHIVE_POINTER_VERSION = 1
+
+_re_template_keys = re.compile(r"%\((\w+)\)")
+
+
+def digest_token_parse(token: str) -> Optional[Tuple[str, int]]:
+    """parses a digest filename token
+
+    returns `(algorithm, length)`, or `None` if `token` is not a digest;
+    `length` is `0` for the full digest.
+
+        "md5" -> ("md5", 0)
+        "sha256_12" -> ("sha256", 12)
+    """
+    if token in DIGEST_TOKEN_ALGORITHMS:
+        return (token, 0)
+    (algorithm, _sep, length) = token.rpartition("_")
+    if algorithm in DIGEST_TOKEN_ALGORITHMS and length.isdigit() and int(length):
+        return (algorithm, int(length))
+    return None
+
+
+def filename_template_is_content_addressed(filename_template: str) -> bool:
+    """does `filename_template` use a digest token?"""
+    return any(
+        digest_token_parse(token)
+        for token in _re_template_keys.findall(filename_template)
+    )
+
+
+class FilenameTokens(dict):
+    """
+    the values for a filename template.
+
+    `guid`, `suffix` and `format` are supplied; these are computed if the
+    template uses them:
+
+        `%(md5)s`, `%(sha256)s`...
+            the hex digest of `image`; any `DIGEST_TOKEN_ALGORITHMS`
+        `%(md5_8)s`, `%(sha256_12)s`...
+            the first 8, 12... characters of the digest
+        `%(width)s`, `%(height)s`
+            the dimensions of `image`
+        `%(source_width)s`, `%(source_height)s`
+            the dimensions of `original`
+
+    digests computed while the image was encoded are reused.
+    computed tokens require real files; a `FakedResize` or `FakedOriginal`
+    will raise `errors.ImageError_ConfigError`.
+    """
+
+    image: Optional[BasicImage]
+    original: Optional[BasicImage]
+
+    def __init__(
+        self,
+        image: Optional[BasicImage] = None,
+        original: Optional[BasicImage] = None,
+        **kwargs: Any,
+    ):
+        dict.__init__(self, **kwargs)
+        self.image = image
+        self.original = original
+
+    def _image(self, image: Optional[BasicImage], token: str) -> BasicImage:
+        if (image is None) or (getattr(image, "file", None) is None):
+            raise errors.ImageError_ConfigError(
+                "`%%(%s)s` requires the image file, which is not available" % token
+            )
+        return image
+
+    def __missing__(self, token: str) -> Any:
+        if token in ("width", "height"):
+            value = getattr(self._image(self.image, token), token)
+        elif token in ("source_width", "source_height"):
+            value = getattr(self._image(self.original, token), token[7:])
+        else:
+            parsed = digest_token_parse(token)
+            if parsed is None:
+                raise KeyError(token)
+            (algorithm, length) = parsed
+            value = self._image(self.image, token).digest(algorithm)
+            if length:
+                value = value[:length]
+        if value is None:
+            raise errors.ImageError_ConfigError(
+                "`%%(%s)s` is not available for this image" % token
+            )
+        self[token] = value
+        return value
+
 
 def check_archive_original(
     resizerResultset: ResizerResultset,
@@ -110,9 +214,62 @@ def size_to_filename(
     _format = derive_resized_format(size, resizerResultset, instructions)
 
     # generate the filename
-    target_filename = filename_template % {
-        "guid": guid,
-        "suffix": suffix,
-        "format": utils.PIL_type_to_standardized(_format),
-    }
+    target_filename = filename_template % FilenameTokens(
+        image=resizerResultset.resized.get(size),
+        original=resizerResultset.original,
+        guid=guid,
+        suffix=suffix,
+        format=utils.PIL_type_to_standardized(_format),
+    )
     return target_filename
+
+
+def archive_to_filename(
+    guid: str,
+    resizerResultset: ResizerResultset,
+    filename_template: str,
+) -> str:
+    """generates the target_filename for the archived original.
+
+    args:
+        `resizerResultset` -
+        `filename_template` - string template
+    """
+    original = resizerResultset.original
+    assert original
+    assert original.format
+    return filename_template % FilenameTokens(
+        image=original,
+        original=original,
+        guid=guid,
+        format=utils.PIL_type_to_standardized(original.format),
+    )
+
+
+# used to split a compiled template around the guid
+_GUID_PLACEHOLDER = "\x00"
+
+
+def filename_template_compile(
+    filename_template: str,
+    suffix: str,
+    _format: str,
+) -> Tuple[str, ...]:
+    """pre-renders a `filename_template` for a size, leaving only the guid.
+
+    returns a tuple of parts; the target_filename for a guid is
+    `guid.join(parts)`.  this is much cheaper than `size_to_filename` when
+    generating filenames for many guids.  templates with computed tokens,
+    such as `%(md5_8)s`, can not be compiled.
+
+    args:
+        `filename_template` - string template
+        `suffix` - string
+        `_format` - the PIL format of the file
+    """
+    rendered = filename_template % FilenameTokens(
+        guid=_GUID_PLACEHOLDER,
+        suffix=suffix,
+        format=utils.PIL_type_to_standardized(_format),
+    )
+    return tuple(rendered.split(_GUID_PLACEHOLDER))
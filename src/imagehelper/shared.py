@@ -0,0 +1,350 @@
+"""
+Shared-memory handoff of images between processes.
+
+When resizes are fanned out to a `multiprocessing` pool, passing the original
+file as an argument pickles the full file into the pipe for every job. This
+module places the file into `multiprocessing.shared_memory` once; the jobs
+only receive a small picklable descriptor, attach to the segment by name and
+read the file directly from the shared buffer.
+
+Encoded outputs are returned the same way: the worker writes each resize into
+a new segment and returns descriptors, which the parent collects.
+
+Lifecycle:
+
+    the parent owns every segment, and unlinks them through a
+    `SharedSegmentRegistry`:
+
+    * segments created with `share_image` are unlinked once every consumer
+      has called `release`
+    * segments created by workers are unlinked by `collect`
+    * exiting the registry's context unlinks anything left over
+
+Example:
+
+    with SharedSegmentRegistry() as registry:
+        source = registry.share_image(
+            imageWrapper.get_original(), consumers=len(sizes)
+        )
+        futures = [
+            pool.submit(resize_shared, source, resizerConfig, [size])
+            for size in sizes
+        ]
+        resized = {}
+        for future in futures:
+            resized.update(registry.collect(future.result()))
+            registry.release(source)
+
+requires Python3.8 or newer
+"""
+
+# stdlib
+import io
+import logging
+import threading
+from types import ModuleType
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import TYPE_CHECKING
+from typing import Union
+
+# pypi
+from typing_extensions import TypedDict
+
+# local
+from . import _io
+from . import image_wrapper
+from . import resizer
+from ._types import TYPE_selected_resizes
+
+if TYPE_CHECKING:
+    from multiprocessing.shared_memory import SharedMemory
+
+# conditional import; py3.8+
+shared_memory: Optional[ModuleType]
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    shared_memory = None
+
+
+# ==============================================================================
+
+log = logging.getLogger(__name__)
+
+
+class NoSharedMemory(ImportError):
+    pass
+
+
+NO_SHARED_MEMORY = NoSharedMemory(
+    "`multiprocessing.shared_memory` was not available for import"
+)
+
+
+class SharedImageDescriptor(TypedDict):
+    """picklable reference to an image in a shared memory segment"""
+
+    name: str
+    size: int
+    format: Optional[str]
+    width: Optional[int]
+    height: Optional[int]
+    digests: Dict[str, str]
+
+
+TYPE_shared_resizes = Dict[str, SharedImageDescriptor]
+
+
+# ------------------------------------------------------------------------------
+
+
+def _segment_create(size: int) -> "SharedMemory":
+    if shared_memory is None:
+        raise NO_SHARED_MEMORY
+    # a segment can not be 0 bytes
+    return shared_memory.SharedMemory(create=True, size=max(size, 1))
+
+
+def _segment_attach(name: str) -> "SharedMemory":
+    if shared_memory is None:
+        raise NO_SHARED_MEMORY
+    return shared_memory.SharedMemory(name=name)
+
+
+def _segment_write(basicImage: image_wrapper.BasicImage) -> SharedImageDescriptor:
+    """copy a `BasicImage` into a new segment; the caller owns the segment"""
+    file_size = basicImage.file_size
+    segment = _segment_create(file_size)
+    try:
+        assert segment.buf is not None
+        segment.buf[:file_size] = basicImage.file.getbuffer()
+        descriptor = SharedImageDescriptor(
+            name=segment.name,
+            size=file_size,
+            format=basicImage.format,
+            width=basicImage.width,
+            height=basicImage.height,
+            digests=basicImage.digests,
+        )
+    except BaseException:
+        # the caller never sees this segment, so it must be unlinked here
+        segment.close()
+        segment.unlink()
+        raise
+    segment.close()
+    return descriptor
+
+
+class SharedMemoryFile(io.RawIOBase):
+    """a read-only file that reads directly from a shared memory segment"""
+
+    def __init__(self, segment: "SharedMemory", size: int):
+        assert segment.buf is not None
+        self._segment = segment
+        self._view: Optional[memoryview] = segment.buf[:size]
+        self._size = size
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        assert self._view is not None
+        length = min(len(b), self._size - self._position)
+        if length <= 0:
+            return 0
+        _start = self._position
+        _end = _start + length
+        b[:length] = self._view[_start:_end]
+        self._position = _end
+        return length
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            self._position = offset
+        elif whence == io.SEEK_CUR:
+            self._position += offset
+        elif whence == io.SEEK_END:
+            self._position = self._size + offset
+        else:
+            raise ValueError("invalid whence: `%s`" % whence)
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+    def close(self) -> None:
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+            self._segment.close()
+        super().close()
+
+
+class SharedSegmentRegistry(object):
+    """
+    Tracks the shared memory segments used by a parent process, and unlinks
+    each segment once all of its consumers are done with it.
+
+    This is threadsafe, so jobs may be completed from callbacks.
+    """
+
+    # name -> remaining consumers
+    _consumers: Dict[str, int]
+
+    def __init__(self):
+        self._consumers = {}
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> "SharedSegmentRegistry":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    @property
+    def active_segments(self) -> List[str]:
+        with self._lock:
+            return list(self._consumers.keys())
+
+    def share_image(
+        self,
+        basicImage: image_wrapper.BasicImage,
+        consumers: int = 1,
+    ) -> SharedImageDescriptor:
+        """
+        places the file of `basicImage` into a new shared memory segment.
+
+        `consumers`
+            the number of times `release` must be called before the segment
+            is unlinked.
+        """
+        if consumers < 1:
+            raise ValueError("`consumers` must be 1 or more")
+        descriptor = _segment_write(basicImage)
+        with self._lock:
+            self._consumers[descriptor["name"]] = consumers
+        return descriptor
+
+    def release(self, descriptor: Union[SharedImageDescriptor, str]) -> bool:
+        """
+        a consumer is done with the segment.
+        returns `True` if this was the last consumer and the segment was unlinked.
+        """
+        name = descriptor if isinstance(descriptor, str) else descriptor["name"]
+        with self._lock:
+            if name not in self._consumers:
+                raise ValueError("unknown segment: `%s`" % name)
+            self._consumers[name] -= 1
+            if self._consumers[name] > 0:
+                return False
+            del self._consumers[name]
+        _unlink(name)
+        return True
+
+    def collect(
+        self,
+        shared_resizes: TYPE_shared_resizes,
+    ) -> Dict[str, image_wrapper.ResizedImage]:
+        """
+        converts the descriptors returned by `resize_shared` into
+        `ResizedImage` objects, and unlinks the worker's segments.
+        """
+        resized = {}
+        try:
+            for size, descriptor in shared_resizes.items():
+                segment = _segment_attach(descriptor["name"])
+                try:
+                    assert segment.buf is not None
+                    with segment.buf[: descriptor["size"]] as _view:
+                        fileobj = _io._FilelikePreference(_view)
+                finally:
+                    segment.close()
+                resized[size] = image_wrapper.ResizedImage(
+                    fileobj,
+                    format=descriptor["format"],
+                    width=descriptor["width"],
+                    height=descriptor["height"],
+                    file_size=descriptor["size"],
+                    digests=descriptor["digests"],
+                )
+        finally:
+            for descriptor in shared_resizes.values():
+                _unlink(descriptor["name"])
+        return resized
+
+    def close(self) -> None:
+        """unlink every segment that is still registered"""
+        with self._lock:
+            names = list(self._consumers.keys())
+            self._consumers = {}
+        for name in names:
+            _unlink(name)
+
+
+def _unlink(name: str) -> None:
+    try:
+        segment = _segment_attach(name)
+    except FileNotFoundError:
+        return
+    segment.close()
+    segment.unlink()
+
+
+# ------------------------------------------------------------------------------
+
+
+def image_wrapper_from_shared(
+    descriptor: SharedImageDescriptor,
+    **kwargs,
+) -> image_wrapper.ImageWrapper:
+    """
+    worker side; attaches to a segment by name and wraps it.
+    the segment is read directly; the only copy is the one `ImageWrapper`
+    always makes for itself.
+
+    `kwargs` are passed to `ImageWrapper`
+    """
+    segment = _segment_attach(descriptor["name"])
+    fileobj = SharedMemoryFile(segment, descriptor["size"])
+    try:
+        return image_wrapper.ImageWrapper(fileobj, **kwargs)
+    finally:
+        fileobj.close()
+
+
+def resize_shared(
+    descriptor: SharedImageDescriptor,
+    resizerConfig: resizer.ResizerConfig,
+    selected_resizes: Optional[TYPE_selected_resizes] = None,
+) -> TYPE_shared_resizes:
+    """
+    worker side; resizes the image in a shared memory segment.
+
+    each resize is written into a new segment; the returned descriptors
+    should be passed to `SharedSegmentRegistry.collect` in the parent.
+    """
+    _resizer = resizer.Resizer(resizerConfig=resizerConfig)
+    _resizer.register_image_file(
+        imageWrapper=image_wrapper_from_shared(
+            descriptor,
+            icc_to_srgb=resizerConfig.icc_to_srgb,
+            digest_algorithms=resizerConfig.digest_algorithms,
+        ),
+    )
+    resizerResultset = _resizer.resize(selected_resizes=selected_resizes)
+    shared_resizes: TYPE_shared_resizes = {}
+    try:
+        for size, resized in resizerResultset.resized.items():
+            shared_resizes[size] = _segment_write(resized)
+    except Exception:
+        # the parent never learns about these, so clean up here
+        for _descriptor in shared_resizes.values():
+            _unlink(_descriptor["name"])
+        raise
+    return shared_resizes
@@ -1,20 +1,57 @@
 # stdlib
 import base64
 import hashlib
+import io
+import json
 import logging
 import os
+import struct
+from types import ModuleType
+from typing import Any
 from typing import Dict
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+from typing import Union
+import zlib
 
 # pypi
+from PIL import Image
 from PIL import ImageSequence
 
 # local
 from . import _io
+from . import errors
+
+# conditional import; crc32c is not in the stdlib
+crc32c: Optional[ModuleType]
+try:
+    import crc32c
+except ImportError:
+    crc32c = None
 
 # ==============================================================================
 
 log = logging.getLogger(__name__)
 
+
+try:
+    # PIL.__version__>=9.0.0
+    ANTIALIAS = Image.Resampling.LANCZOS
+except AttributeError:
+    # PIL.__version__<9.0.0
+    # py3.6
+    ANTIALIAS = Image.ANTIALIAS  # type: ignore [attr-defined]
+
+
+# import PIL
+# _pil_version = PIL.__version__.split(".")
+# if int(_pil_version[0]) < 9:
+#     # this should only be py36
+#     ANTIALIAS = Image.ANTIALIAS
+# else:
+#     ANTIALIAS = Image.Resampling.LANCZOS
+
 # ------------------------------------------------------------------------------
 
 
@@ -28,6 +65,7 @@ class ImageErrorCodes(object):
     UNSUPPORTED_IMAGE_CLASS = 5  # Must be cgi.FieldStorage or file
     INVALID_REBUILD = 6
     MISSING_FILENAME_METHOD = 7
+    INVALID_ENVELOPE = 8
 
 
 _PIL_type_to_content_type: Dict[str, str] = {
@@ -139,6 +177,103 @@ def file_md5(fileobj) -> str:
     return md5.hexdigest()
 
 
+def md5_hex_to_b64(md5_hex: str) -> str:
+    """converts a md5 hexdigest to the base64 form used by `Content-MD5`"""
+    return base64.b64encode(bytes.fromhex(md5_hex)).decode("ascii")
+
+
+class _CrcHash(object):
+    """`hashlib` compatible interface for crc32 and crc32c checksums"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._value = 0
+        if name == "crc32":
+            self._func = zlib.crc32
+        elif name == "crc32c":
+            if crc32c is None:
+                raise ImportError("`crc32c` was not available for import")
+            self._func = crc32c.crc32c
+        else:
+            raise ValueError("invalid crc: `%s`" % name)
+
+    def update(self, data) -> None:
+        self._value = self._func(data, self._value)
+
+    def hexdigest(self) -> str:
+        return "%08x" % (self._value & 0xFFFFFFFF)
+
+
+def digest_new(algorithm: str) -> Any:
+    """returns a new hasher for `algorithm`
+    `algorithm` is any `hashlib` algorithm, `crc32` or `crc32c`
+    """
+    if algorithm in ("crc32", "crc32c"):
+        return _CrcHash(algorithm)
+    return hashlib.new(algorithm)
+
+
+def file_digest(fileobj, algorithm: str) -> str:
+    fileobj.seek(0)
+    hasher = digest_new(algorithm)
+    block_size = 64 * 1024
+    for chunk in iter(lambda: fileobj.read(block_size), b""):
+        hasher.update(chunk)
+    fileobj.seek(0)
+    return hasher.hexdigest()
+
+
+class HashingWriter(object):
+    """
+    Wraps a writable file-like object and hashes the data as it is written,
+    so encoders can produce a file and its digests in a single pass.
+
+    If the encoder seeks backwards and overwrites data, the running digests
+    are no longer valid; `hexdigests()` will then return `None` and the
+    caller should hash the finished file instead.
+    """
+
+    def __init__(
+        self,
+        fileobj: io.BytesIO,
+        algorithms: Sequence[str] = ("md5",),
+    ):
+        self.file = fileobj
+        self._hashers = {a: digest_new(a) for a in algorithms}
+        self._hashed = 0
+        self._valid = True
+
+    def write(self, data) -> int:
+        if self._valid:
+            if self.file.tell() == self._hashed:
+                for hasher in self._hashers.values():
+                    hasher.update(data)
+                self._hashed += len(data)
+            else:
+                self._valid = False
+        return self.file.write(data)
+
+    def __getattr__(self, name):
+        # seek, tell, flush, etc
+        return getattr(self.file, name)
+
+    @property
+    def bytes_written(self) -> int:
+        return self._hashed
+
+    def hexdigests(self) -> Optional[Dict[str, str]]:
+        """returns a dict of `{algorithm: hexdigest}` or `None` if invalid"""
+        if not self._valid:
+            return None
+        _position = self.file.tell()
+        self.file.seek(0, os.SEEK_END)
+        _size = self.file.tell()
+        self.file.seek(_position)
+        if _size != self._hashed:
+            return None
+        return {a: h.hexdigest() for (a, h) in self._hashers.items()}
+
+
 def file_b64(fileobj) -> bytes:
     fileobj.seek(0)
     as_b64 = base64.encodebytes(fileobj.read())
@@ -152,3 +287,138 @@ def b64_decode_to_file(coded_string):
     fileobj.write(decoded_data)
     fileobj.seek(0)
     return fileobj
+
+
+# ------------------------------------------------------------------------------
+
+# binary envelope for serialized messagebrokers; see `envelope_encode`
+ENVELOPE_MAGIC = b"IHE1"
+_ENVELOPE_PREAMBLE = struct.Struct(">4sI")  # magic, header length
+_ENVELOPE_DATALEN = struct.Struct(">Q")  # data length
+_ENVELOPE_CHUNK = 64 * 1024
+
+
+def envelope_encode(
+    fileobj,
+    fileobj_out,
+    format: Optional[str] = None,
+    width: Optional[int] = None,
+    height: Optional[int] = None,
+    digests: Optional[Dict[str, str]] = None,
+) -> int:
+    """
+    streams `fileobj` into `fileobj_out` as a compact binary envelope.
+    this is an alternative to `file_b64` that does not inflate the payload.
+
+    layout:
+        4 bytes   magic, `ENVELOPE_MAGIC`
+        4 bytes   header length; unsigned, big-endian
+        n bytes   header; utf-8 json of format, width, height, digests
+        8 bytes   data length; unsigned, big-endian
+        n bytes   raw file data
+
+    returns the number of bytes written
+    """
+    header = json.dumps(
+        {
+            "format": format,
+            "width": width,
+            "height": height,
+            "digests": digests or {},
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+    ).encode("utf-8")
+    data_length = file_size(fileobj)
+    written = fileobj_out.write(_ENVELOPE_PREAMBLE.pack(ENVELOPE_MAGIC, len(header)))
+    written += fileobj_out.write(header)
+    written += fileobj_out.write(_ENVELOPE_DATALEN.pack(data_length))
+    for chunk in iter(lambda: fileobj.read(_ENVELOPE_CHUNK), b""):
+        written += fileobj_out.write(chunk)
+    fileobj.seek(0)
+    return written
+
+
+def _envelope_invalid(reason: str) -> errors.ImageError_Parsing:
+    """logs why an envelope is invalid; returns the error to raise"""
+    log.debug("invalid envelope: %s", reason)
+    return errors.ImageError_Parsing(ImageErrorCodes.INVALID_ENVELOPE)
+
+
+def _read_exact(fileobj_in, length: int) -> bytes:
+    data = fileobj_in.read(length)
+    if len(data) != length:
+        raise _envelope_invalid("truncated")
+    return data
+
+
+# the header of an envelope; every key is written by `envelope_encode`
+_ENVELOPE_HEADER_TYPES: Dict[str, Tuple[type, ...]] = {
+    "format": (str, type(None)),
+    "width": (int, type(None)),
+    "height": (int, type(None)),
+    "digests": (dict,),
+}
+
+
+def _envelope_header(data: bytes) -> Dict:
+    """
+    parses and validates the header of an envelope.
+    raises `errors.ImageError_Parsing` if it is invalid
+    """
+    try:
+        header = json.loads(data.decode("utf-8"))
+    except ValueError as exc:
+        # `UnicodeDecodeError` and `json.JSONDecodeError` are `ValueError`
+        raise _envelope_invalid("header: %s" % exc)
+    if not isinstance(header, dict):
+        raise _envelope_invalid("header is not an object")
+    for key, types in _ENVELOPE_HEADER_TYPES.items():
+        if not isinstance(header.get(key, ()), types):
+            raise _envelope_invalid("header `%s`" % key)
+    for algorithm, hexdigest in header["digests"].items():
+        if not isinstance(hexdigest, str):
+            raise _envelope_invalid("digest `%s`" % algorithm)
+        try:
+            digest_new(algorithm)
+        except (ValueError, TypeError, ImportError) as exc:
+            raise _envelope_invalid("unsupported digest `%s`: %s" % (algorithm, exc))
+    return header
+
+
+def envelope_decode(
+    fileobj_in: Union[bytes, io.IOBase],
+) -> Tuple[io.BytesIO, Dict]:
+    """
+    streams an envelope generated by `envelope_encode` into a new file.
+    `fileobj_in` may be a file-like object or `bytes`
+
+    returns a tuple of (fileobj, header)
+
+    if the header has any digests, they are verified while the data is read.
+
+    raises `errors.ImageError_Parsing` if the envelope is invalid, truncated,
+    or does not match its digests
+    """
+    if isinstance(fileobj_in, (bytes, bytearray, memoryview)):
+        fileobj_in = io.BytesIO(fileobj_in)
+    (magic, header_length) = _ENVELOPE_PREAMBLE.unpack(
+        _read_exact(fileobj_in, _ENVELOPE_PREAMBLE.size)
+    )
+    if magic != ENVELOPE_MAGIC:
+        raise _envelope_invalid("magic")
+    header = _envelope_header(_read_exact(fileobj_in, header_length))
+    (data_length,) = _ENVELOPE_DATALEN.unpack(
+        _read_exact(fileobj_in, _ENVELOPE_DATALEN.size)
+    )
+    fileobj = _io._FilelikePreference()
+    _writer = HashingWriter(fileobj, list(header["digests"].keys()))
+    remaining = data_length
+    while remaining:
+        chunk = _read_exact(fileobj_in, min(remaining, _ENVELOPE_CHUNK))
+        _writer.write(chunk)
+        remaining -= len(chunk)
+    if header["digests"] and (_writer.hexdigests() != header["digests"]):
+        raise _envelope_invalid("digest mismatch")
+    fileobj.seek(0)
+    return fileobj, header
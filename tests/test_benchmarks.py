@@ -0,0 +1,184 @@
+# stdlib
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+# ==============================================================================
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "benchmarks")
+)
+import compare  # noqa: E402
+import suite  # noqa: E402
+
+# ------------------------------------------------------------------------------
+
+
+class TestSuite(unittest.TestCase):
+    def test_main(self):
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(
+            io.StringIO()
+        ):
+            suite.main(
+                [
+                    "--quick",
+                    "--no-isolate",
+                    "--repeat",
+                    "1",
+                    "-k",
+                    "image_wrapper.init",
+                ]
+            )
+        results = json.loads(stdout.getvalue())
+        self.assertEqual(sorted(results.keys()), ["benchmarks", "meta"])
+        for key in ("imagehelper", "pillow", "python", "corpus_digest", "repeat"):
+            self.assertIn(key, results["meta"])
+        self.assertEqual(results["meta"]["repeat"], 1)
+        self.assertFalse(results["meta"]["isolate"])
+
+        self.assertTrue(results["benchmarks"])
+        for name, result in results["benchmarks"].items():
+            self.assertTrue(name.startswith("image_wrapper.init/"))
+            self.assertFalse(name.endswith(suite.corpus.HUGE))
+            self.assertEqual(len(result["samples"]), 1)
+            for key in ("median", "ops_per_second", "peak_rss", "output_bytes"):
+                self.assertIn(key, result)
+
+
+def _result(samples, output_bytes=None, peak_rss=100 * 1048576):
+    return suite.summarize(
+        {
+            "samples": samples,
+            "bytes_in": 1048576,
+            "output_bytes": output_bytes or {},
+            "peak_rss": peak_rss,
+            "peak_rss_delta": None,
+        }
+    )
+
+
+def _regressions(findings):
+    return sorted(finding["metric"] for finding in findings if finding["regression"])
+
+
+class TestCompare(unittest.TestCase):
+    samples = [1.0 + idx / 100 for idx in range(8)]
+
+    def test_mann_whitney_u__exact(self):
+        # 1 of the C(6, 3) orderings is as extreme
+        self.assertAlmostEqual(compare.mann_whitney_u([1, 2, 3], [4, 5, 6]), 1 / 20)
+        self.assertEqual(compare.mann_whitney_u([4, 5, 6], [1, 2, 3]), 1.0)
+        self.assertEqual(compare.mann_whitney_u([1, 1, 1], [1, 1, 1]), 1.0)
+        self.assertEqual(compare.mann_whitney_u([], [1, 2]), 1.0)
+
+    def test_mann_whitney_u__approximate(self):
+        baseline = list(range(20))
+        current = list(range(100, 120))
+        # C(40, 20) orderings; too many to enumerate
+        self.assertLess(compare.mann_whitney_u(baseline, current), 1e-6)
+        self.assertGreater(compare.mann_whitney_u(current, baseline), 0.999)
+        with mock.patch.object(compare, "EXACT_PERMUTATIONS_MAX", 0):
+            p_value = compare.mann_whitney_u(self.samples[:4], self.samples[4:])
+        self.assertAlmostEqual(p_value, 1 / 70, delta=0.02)
+        self.assertNotEqual(p_value, 1 / 70)
+
+    def test_binomial(self):
+        self.assertEqual(compare._binomial(6, 3), 20)
+        self.assertEqual(compare._binomial(40, 20), 137846528820)
+        self.assertEqual(compare._binomial(3, 0), 1)
+        self.assertEqual(compare._binomial(3, 4), 0)
+
+    def test_latency(self):
+        baseline = _result(self.samples)
+        current = _result([sample * 1.10 for sample in self.samples])
+        findings = compare.compare_benchmark(baseline, current, compare.Thresholds())
+        self.assertEqual(
+            _regressions(findings), ["latency", "mb_per_second", "ops_per_second"]
+        )
+        self.assertLess(findings[0]["p_value"], 0.05)
+
+        thresholds = compare.Thresholds(latency=0.2, throughput=0.2)
+        findings = compare.compare_benchmark(baseline, current, thresholds)
+        self.assertEqual(_regressions(findings), [])
+
+        # slower, but not significantly
+        current = _result(self.samples[:-1] + [self.samples[-1] * 2])
+        findings = compare.compare_benchmark(baseline, current, compare.Thresholds())
+        self.assertEqual(_regressions(findings), [])
+
+    def test_peak_rss(self):
+        baseline = _result(self.samples)
+        current = _result(self.samples, peak_rss=120 * 1048576)
+        findings = compare.compare_benchmark(baseline, current, compare.Thresholds())
+        self.assertEqual(_regressions(findings), ["peak_rss"])
+
+        thresholds = compare.Thresholds(rss_min_bytes=50 * 1048576)
+        findings = compare.compare_benchmark(baseline, current, thresholds)
+        self.assertEqual(_regressions(findings), [])
+
+    def test_output_bytes(self):
+        baseline = _result(self.samples, output_bytes={"a": 1000, "b": 1000})
+        current = _result(self.samples, output_bytes={"a": 1010, "b": 1030})
+        findings = compare.compare_benchmark(baseline, current, compare.Thresholds())
+        self.assertEqual(_regressions(findings), ["output_bytes/b"])
+
+        # a size which is no longer written
+        current = _result(self.samples, output_bytes={"a": 1000})
+        findings = compare.compare_benchmark(baseline, current, compare.Thresholds())
+        self.assertEqual(_regressions(findings), ["output_bytes/b"])
+        self.assertIsNone(findings[-1]["current"])
+
+    def test_status(self):
+        baseline = _result(self.samples)
+        for current, regression in (
+            ({"error": "ValueError: nope"}, True),
+            ({"skipped": "`advpng` is not installed"}, False),
+        ):
+            findings = compare.compare_benchmark(
+                baseline, current, compare.Thresholds()
+            )
+            self.assertEqual(len(findings), 1)
+            self.assertEqual(findings[0]["metric"], "status")
+            self.assertEqual(findings[0]["regression"], regression)
+        # failed in the baseline; nothing to compare
+        findings = compare.compare_benchmark(
+            {"error": "ValueError: nope"}, baseline, compare.Thresholds()
+        )
+        self.assertEqual(findings, [])
+
+    def test_main(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+
+        def _write(filename, benchmarks):
+            path = os.path.join(directory, filename)
+            with open(path, "w") as fh:
+                json.dump({"meta": {}, "benchmarks": benchmarks}, fh)
+            return path
+
+        baseline = _write("baseline.json", {"a": _result(self.samples)})
+        same = _write("same.json", {"a": _result(self.samples)})
+        failed = _write("failed.json", {"a": {"error": "ValueError: nope"}})
+        invalid = os.path.join(directory, "invalid.json")
+        with open(invalid, "w") as fh:
+            fh.write("[]")
+
+        for argv, exit_code in (
+            ([baseline, same], 0),
+            ([baseline, failed], 1),
+            ([baseline, failed, "--json"], 1),
+            ([baseline, invalid], 2),
+            ([baseline, os.path.join(directory, "missing.json")], 2),
+        ):
+            with self.subTest(argv=argv):
+                with contextlib.redirect_stdout(
+                    io.StringIO()
+                ), contextlib.redirect_stderr(io.StringIO()):
+                    self.assertEqual(compare.main(argv), exit_code)
@@ -1,16 +1,40 @@
 # stdlib
+import asyncio
+import base64
+import concurrent.futures
+import contextlib
+import copy
+import hashlib
+import io
+import itertools
+import json
+import multiprocessing
 import os
 import pdb  # noqa
+import random
+import shutil
+import struct
+import tempfile
+import threading
+import time
 from typing import Callable
+from typing import Dict
+from typing import Set
 import unittest
+from unittest import mock
 
 # pypi
+from PIL import Image
+from PIL import ImageCms
 import requests
 
 # local
 import imagehelper
 from imagehelper import _io
+from imagehelper import commands
 from imagehelper._types import ResizesSchema
+from imagehelper.commands import rebuild
+from imagehelper.commands import resize
 
 # by default, do not test S3 connectivity, as that relies on secrets
 TEST_S3 = int(os.environ.get("TEST_S3", 0))
@@ -246,6 +270,25 @@ class TestResize(unittest.TestCase, _ImagehelperTestingMixin):
         # audit the payload
         self._check_resizedImages(resizedImages)
 
+    def test_resize_gif_repeatedly(self):
+        # a GIF reads its next frame from wherever its file is; resizing again
+        # must not check for animation against the rewound file
+        im = Image.effect_mandelbrot((240, 180), (-2, -1.5, 1, 1.5), 64)
+        fileobj = io.BytesIO()
+        im.convert("P").save(fileobj, "GIF")
+        imageWrapper = imagehelper.image_wrapper.ImageWrapper(fileobj)
+        self.assertFalse(imageWrapper.basicImage.is_image_animated)
+        for _ in range(3):
+            resized = imageWrapper.resize(
+                {
+                    "width": 120,
+                    "height": 120,
+                    "format": "PNG",
+                    "constraint-method": "fit-within",
+                }
+            )
+            self.assertEqual(resized.width, 120)
+
     def test_fake_resize(self):
         resizerConfig, resizer, resizedImages = self._build_faked()
         # audit the payload
@@ -878,3 +921,2355 @@ VALID_CONSTRAINTS = (
     "exact:proportion",
     "passthrough:no-resize",
 )
+
+
+def _icc_profile_display_p3() -> bytes:
+    """
+    a minimal ICC v2 matrix/TRC profile with the Display P3 primaries (D50
+    adapted) and a 2.2 gamma; Pillow can only create sRGB, LAB and XYZ
+    """
+
+    def s15Fixed16(value):
+        return struct.pack(">i", int(round(value * 65536)))
+
+    def tag_xyz(x, y, z):
+        return b"XYZ \0\0\0\0" + s15Fixed16(x) + s15Fixed16(y) + s15Fixed16(z)
+
+    def tag_desc(text):
+        text = text.encode("ascii") + b"\0"
+        return (
+            b"desc\0\0\0\0"
+            + struct.pack(">I", len(text))
+            + text
+            # no unicode or scriptcode descriptions
+            + b"\0" * 78
+        )
+
+    gamma = b"curv\0\0\0\0" + struct.pack(">IH", 1, int(2.2 * 256)) + b"\0\0"
+    tags = [
+        (b"desc", tag_desc("Display P3")),
+        (b"wtpt", tag_xyz(0.9642, 1.0, 0.8249)),
+        (b"rXYZ", tag_xyz(0.5151, 0.2412, -0.0011)),
+        (b"gXYZ", tag_xyz(0.2920, 0.6922, 0.0419)),
+        (b"bXYZ", tag_xyz(0.1571, 0.0666, 0.7841)),
+        (b"rTRC", gamma),
+        (b"gTRC", gamma),
+        (b"bTRC", gamma),
+    ]
+    offset = 128 + 4 + 12 * len(tags)
+    table = struct.pack(">I", len(tags))
+    data = b""
+    for signature, body in tags:
+        body += b"\0" * (-len(body) % 4)
+        table += signature + struct.pack(">II", offset + len(data), len(body))
+        data += body
+    header = (
+        struct.pack(">I", offset + len(data))
+        + b"\0" * 4
+        + struct.pack(">I", 0x02100000)
+        + b"mntrRGB XYZ "
+        + b"\0" * 12
+        + b"acsp"
+        + b"\0" * 28
+        + s15Fixed16(0.9642)
+        + s15Fixed16(1.0)
+        + s15Fixed16(0.8249)
+        + b"\0" * 48
+    )
+    return header + table + data
+
+
+class TestIccConversion(unittest.TestCase):
+    def _get_imagefile_icc(self, icc_profile=None, color=(200, 30, 30)):
+        if icc_profile is None:
+            profile = ImageCms.ImageCmsProfile(ImageCms.createProfile("sRGB"))
+            icc_profile = profile.tobytes()
+        img = Image.new("RGB", (64, 48), color)
+        fh = _io._DefaultMemoryType()
+        img.save(fh, "PNG", icc_profile=icc_profile)
+        fh.seek(0)
+        return fh
+
+    def test_icc_to_srgb(self):
+        imagehelper.image_wrapper._ICC_TRANSFORM_CACHE.clear()
+
+        wrapped = imagehelper.image_wrapper.ImageWrapper(
+            self._get_imagefile_icc(), icc_to_srgb=True
+        )
+        assert wrapped.icc_converted is True
+        assert "icc_profile" not in wrapped.pilObject.info
+        assert len(imagehelper.image_wrapper._ICC_TRANSFORM_CACHE) == 1
+        transform = list(imagehelper.image_wrapper._ICC_TRANSFORM_CACHE.values())[0]
+
+        # a second image with the same profile reuses the transform
+        wrapped2 = imagehelper.image_wrapper.ImageWrapper(
+            self._get_imagefile_icc(), icc_to_srgb=True
+        )
+        assert wrapped2.icc_converted is True
+        assert len(imagehelper.image_wrapper._ICC_TRANSFORM_CACHE) == 1
+        transform2 = list(imagehelper.image_wrapper._ICC_TRANSFORM_CACHE.values())[0]
+        assert transform is transform2
+
+        # the original is untouched
+        assert wrapped.get_original().file.getvalue() == (
+            self._get_imagefile_icc().getvalue()
+        )
+
+    def test_icc_to_srgb__resizer(self):
+        resizerConfig = imagehelper.resizer.ResizerConfig(
+            resizesSchema=resizesSchema,
+            selected_resizes=["thumb1"],
+            icc_to_srgb=True,
+        )
+        resizer = imagehelper.resizer.Resizer(resizerConfig=resizerConfig)
+        resizedImages = resizer.resize(imagefile=self._get_imagefile_icc())
+        assert resizer._wrappedImage is not None
+        assert resizer._wrappedImage.icc_converted is True
+        assert resizedImages.resized["thumb1"].file_size
+
+    def test_icc_to_srgb__off(self):
+        wrapped = imagehelper.image_wrapper.ImageWrapper(self._get_imagefile_icc())
+        assert wrapped.icc_converted is False
+        assert "icc_profile" in wrapped.pilObject.info
+
+    def test_icc_to_srgb__wide_gamut(self):
+        color = (100, 180, 60)
+        wrapped = imagehelper.image_wrapper.ImageWrapper(
+            self._get_imagefile_icc(_icc_profile_display_p3(), color),
+            icc_to_srgb=True,
+        )
+        assert wrapped.icc_converted is True
+        # the same color is more saturated in sRGB values
+        (r, g, b) = wrapped.pilObject.getpixel((0, 0))
+        assert r < color[0] - 20
+        assert g > color[1]
+        assert b < color[2] - 20
+
+    def test_icc_to_srgb__broken_profile(self):
+        with self.assertLogs("imagehelper.image_wrapper", "WARNING"):
+            wrapped = imagehelper.image_wrapper.ImageWrapper(
+                self._get_imagefile_icc(b"not an icc profile" * 8),
+                icc_to_srgb=True,
+            )
+        assert wrapped.icc_converted is False
+        assert wrapped.pilObject.getpixel((0, 0)) == (200, 30, 30)
+
+    def test_icc_to_srgb__mismatched_profile(self):
+        # a LAB profile embedded in an RGB image
+        profile = ImageCms.ImageCmsProfile(ImageCms.createProfile("LAB"))
+        with self.assertLogs("imagehelper.image_wrapper", "WARNING"):
+            wrapped = imagehelper.image_wrapper.ImageWrapper(
+                self._get_imagefile_icc(profile.tobytes()), icc_to_srgb=True
+            )
+        assert wrapped.icc_converted is False
+        assert wrapped.pilObject.getpixel((0, 0)) == (200, 30, 30)
+
+
+class TestDigests(unittest.TestCase):
+    def test_digests_computed_at_encode(self):
+        resizerConfig = imagehelper.resizer.ResizerConfig(
+            resizesSchema=resizesSchema,
+            selected_resizes=selected_resizes,
+            digest_algorithms=("md5", "sha256", "crc32"),
+        )
+        resizer = imagehelper.resizer.Resizer(resizerConfig=resizerConfig)
+        resizedImages = resizer.resize(imagefile=get_imagefile())
+
+        _images = list(resizedImages.resized.values()) + [resizedImages.original]
+        for _image in _images:
+            _data = _image.file.getvalue()
+            # the digests were computed when the file was written
+            self.assertEqual(sorted(_image.digests.keys()), ["crc32", "md5", "sha256"])
+            self.assertEqual(_image.file_md5, hashlib.md5(_data).hexdigest())
+            self.assertEqual(_image.digest("sha256"), hashlib.sha256(_data).hexdigest())
+            self.assertEqual(_image.file_size, len(_data))
+
+        # an unconfigured digest is computed on demand, then memoized
+        _original = resizedImages.original
+        _sha1 = _original.digest("sha1")
+        self.assertEqual(_sha1, hashlib.sha1(_original.file.getvalue()).hexdigest())
+        self.assertIn("sha1", _original.digests)
+
+    def test_digests_reset_on_optimize(self):
+        wrapped = imagehelper.image_wrapper.ImageWrapper(get_imagefile())
+        resized = wrapped.resize(resizesSchema["t4"])
+        _md5 = resized.file_md5
+        resized.optimize()
+        if resized.is_optimized:
+            self.assertNotIn("md5", resized.digests)
+        self.assertEqual(resized.file_md5, imagehelper.utils.file_md5(resized.file))
+        self.assertTrue(_md5)
+
+
+class TestEnvelope(unittest.TestCase):
+    def test_envelope_roundtrip(self):
+        resizer = imagehelper.resizer.ResizerFactory(newResizerConfig()).resizer(
+            imagefile=get_imagefile()
+        )
+        _original = resizer.get_original()
+        file_envelope = _original.file_envelope
+
+        # no base64 inflation; only a small header
+        self.assertLess(len(file_envelope), _original.file_size + 256)
+
+        (fileobj, header) = imagehelper.utils.envelope_decode(file_envelope)
+        self.assertEqual(fileobj.getvalue(), _original.file.getvalue())
+        self.assertEqual(header["format"], "JPEG")
+        self.assertEqual(header["width"], 1200)
+        self.assertEqual(header["digests"]["md5"], _original.file_md5)
+
+        # streamed from a file
+        _stream = _io._DefaultMemoryType()
+        _original.envelope_encode(_stream)
+        _stream.seek(0)
+        resizer2 = imagehelper.resizer.ResizerFactory(
+            newResizerConfig(optimize_original=False, optimize_resized=False)
+        ).resizer(file_envelope=_stream)
+        self.assertEqual(resizer2.get_original().file_md5, _original.file_md5)
+        resizedImages = resizer2.resize()
+        self.assertIn("thumb1", resizedImages.resized)
+
+    def test_envelope_invalid(self):
+        resizer = imagehelper.resizer.ResizerFactory(newResizerConfig()).resizer(
+            imagefile=get_imagefile()
+        )
+        file_envelope = bytearray(resizer.get_original().file_envelope)
+        # corrupt the data
+        file_envelope[-1] = (file_envelope[-1] + 1) % 256
+        with self.assertRaises(imagehelper.errors.ImageError_Parsing):
+            imagehelper.utils.envelope_decode(bytes(file_envelope))
+        with self.assertRaises(imagehelper.errors.ImageError_Parsing):
+            imagehelper.utils.envelope_decode(b"nope" + bytes(file_envelope[4:]))
+
+    def test_envelope_malformed(self):
+        def envelope(header: bytes, data: bytes = b"data") -> bytes:
+            return (
+                struct.pack(">4sI", imagehelper.utils.ENVELOPE_MAGIC, len(header))
+                + header
+                + struct.pack(">Q", len(data))
+                + data
+            )
+
+        valid = b'{"digests":{},"format":"JPEG","height":1,"width":1}'
+        (fileobj, _header) = imagehelper.utils.envelope_decode(envelope(valid))
+        self.assertEqual(fileobj.getvalue(), b"data")
+
+        malformed = {
+            "bad json": b'{"digests":',
+            "bad utf-8": b"\xff\xfe",
+            "not a dict": b"[1, 2]",
+            "missing key": b'{"digests":{},"format":"JPEG","width":1}',
+            "bad digests": b'{"digests":[],"format":"JPEG","height":1,"width":1}',
+            "bad width": b'{"digests":{},"format":"JPEG","height":1,"width":"1"}',
+            "unknown digest": (
+                b'{"digests":{"nope":"00"},"format":"JPEG","height":1,"width":1}'
+            ),
+            "bad hexdigest": (
+                b'{"digests":{"md5":1},"format":"JPEG","height":1,"width":1}'
+            ),
+        }
+        for name, header in malformed.items():
+            with self.subTest(name):
+                with self.assertRaises(imagehelper.errors.ImageError_Parsing):
+                    imagehelper.utils.envelope_decode(envelope(header))
+        # truncated within the preamble, the header and the data
+        _envelope = envelope(valid)
+        for length in (3, 10, len(_envelope) - 1):
+            with self.subTest(length=length):
+                with self.assertRaises(imagehelper.errors.ImageError_Parsing):
+                    imagehelper.utils.envelope_decode(_envelope[:length])
+
+
+class TestSharedMemory(unittest.TestCase):
+    def test_resize_shared(self):
+        resizerConfig = newResizerConfig(
+            optimize_original=False, optimize_resized=False
+        )
+        wrapped = imagehelper.image_wrapper.ImageWrapper(get_imagefile())
+        sizes = ["thumb1", "t4"]
+
+        registry = imagehelper.shared.SharedSegmentRegistry()
+        with registry:
+            source = registry.share_image(wrapped.get_original(), consumers=2)
+            self.assertEqual(registry.active_segments, [source["name"]])
+            with concurrent.futures.ProcessPoolExecutor(
+                max_workers=2, mp_context=multiprocessing.get_context("spawn")
+            ) as pool:
+                futures = [
+                    pool.submit(
+                        imagehelper.shared.resize_shared,
+                        source,
+                        resizerConfig,
+                        [size],
+                    )
+                    for size in sizes
+                ]
+                resized = {}
+                for future in futures:
+                    shared_resizes = future.result()
+                    resized.update(registry.collect(shared_resizes))
+                    registry.release(source)
+                    # the worker's segments are unlinked by `collect`
+                    for _descriptor in shared_resizes.values():
+                        with self.assertRaises(FileNotFoundError):
+                            imagehelper.shared._segment_attach(_descriptor["name"])
+
+            # the source is unlinked after the last consumer releases it
+            self.assertEqual(registry.active_segments, [])
+            with self.assertRaises(FileNotFoundError):
+                imagehelper.shared._segment_attach(source["name"])
+
+        self.assertEqual(sorted(resized.keys()), sorted(sizes))
+        _expected = wrapped.resize(resizesSchema["thumb1"])
+        self.assertEqual(resized["thumb1"].file_md5, _expected.file_md5)
+        self.assertEqual(resized["thumb1"].width, _expected.width)
+
+    def test_registry_close(self):
+        wrapped = imagehelper.image_wrapper.ImageWrapper(get_imagefile())
+        with imagehelper.shared.SharedSegmentRegistry() as registry:
+            source = registry.share_image(wrapped.get_original(), consumers=3)
+            rebuilt = imagehelper.shared.image_wrapper_from_shared(source)
+            self.assertEqual(
+                rebuilt.get_original().file_md5, wrapped.get_original().file_md5
+            )
+            self.assertFalse(registry.release(source))
+        with self.assertRaises(FileNotFoundError):
+            imagehelper.shared._segment_attach(source["name"])
+
+    def test_segment_write__error(self):
+        original = imagehelper.image_wrapper.ImageWrapper(
+            get_imagefile()
+        ).get_original()
+        # the memoized size no longer matches the file, so the copy fails
+        original._file_size = 10
+        segments = []
+        segment_create = imagehelper.shared._segment_create
+
+        def _segment_create(size):
+            segments.append(segment_create(size))
+            return segments[-1]
+
+        with mock.patch.object(imagehelper.shared, "_segment_create", _segment_create):
+            with self.assertRaises(ValueError):
+                imagehelper.shared._segment_write(original)
+        self.assertEqual(len(segments), 1)
+        with self.assertRaises(FileNotFoundError):
+            imagehelper.shared._segment_attach(segments[0].name)
+
+
+class TestBatchResizer(unittest.TestCase):
+    def test_batch_resize(self):
+        resizerConfig = newResizerConfig(
+            optimize_original=False, optimize_resized=False
+        )
+        inputs = [
+            "tests/test-data/henry.jpg",
+            ("bytes", get_imagefile().getvalue()),
+            ("invalid", b"not an image"),
+            get_imagefile(),
+        ]
+        batchResizer = imagehelper.batch.BatchResizer(
+            resizerConfig, max_workers=2, max_inflight=2, ordered=True
+        )
+        results = list(batchResizer.resize(inputs))
+
+        # ordered by input
+        keys = [r[0] for r in results]
+        self.assertEqual(keys, ["tests/test-data/henry.jpg", "bytes", "invalid", 3])
+        self.assertIsInstance(results[2][1], imagehelper.errors.ImageError_Parsing)
+        (result_file, result_fileobj) = (results[0][1], results[3][1])
+        if not isinstance(result_file, imagehelper.resizer.ResizerResultset):
+            self.fail("expected a `ResizerResultset`, got %r" % result_file)
+        if not isinstance(result_fileobj, imagehelper.resizer.ResizerResultset):
+            self.fail("expected a `ResizerResultset`, got %r" % result_fileobj)
+        self.assertEqual(
+            result_file.resized["thumb1"].file_md5,
+            result_fileobj.resized["thumb1"].file_md5,
+        )
+
+        stats = batchResizer.stats.as_dict()
+        self.assertEqual(stats["images"], 3)
+        self.assertEqual(stats["errors"], 1)
+        self.assertGreater(stats["images_per_second"], 0)
+        self.assertIn("resize", stats["stage_seconds"])
+
+    def test_batch_resize__bounded(self):
+        resizerConfig = newResizerConfig(
+            optimize_original=False, optimize_resized=False
+        )
+        consumed = []
+
+        def _inputs():
+            for i in range(6):
+                consumed.append(i)
+                yield get_imagefile().getvalue()
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+            batchResizer = imagehelper.batch.BatchResizer(
+                resizerConfig, max_inflight=2, executor=executor
+            )
+            results = batchResizer.resize(_inputs())
+            next(results)
+            # backpressure: the input is only read as results are yielded
+            self.assertLessEqual(len(consumed), 3)
+            self.assertEqual(len(list(results)), 5)
+
+
+class FakeS3Client(object):
+    """
+    A minimal in-memory stand-in for a boto3 s3 client.
+    `fail_keys` will raise on upload.
+    `fail_delete_keys` will be reported as `Errors` on delete.
+    the first `slowdowns` uploads will raise a `SlowDown` error.
+    """
+
+    def __init__(
+        self, fail_keys=None, upload_delay=0, fail_delete_keys=None, slowdowns=0
+    ):
+        self.slowdowns = slowdowns
+        self.objects = {}
+        self.calls = []
+        self.fail_keys = fail_keys or ()
+        self.fail_delete_keys = fail_delete_keys or ()
+        self.transfer_configs = {}
+        self.upload_delay = upload_delay
+        self._lock = threading.Lock()
+        # uploads in flight; `active_max` is the high-water mark
+        self.active = 0
+        self.active_max = 0
+
+    def upload_fileobj(self, fileobj, bucket_name, key, ExtraArgs=None, **kwargs):
+        import boto3.exceptions
+        import botocore.exceptions
+
+        try:
+            self._upload(
+                "upload_fileobj",
+                fileobj,
+                bucket_name,
+                key,
+                ExtraArgs,
+                kwargs.get("Config"),
+            )
+        except botocore.exceptions.ClientError as exc:
+            # as boto3's transfer manager does
+            raise boto3.exceptions.S3UploadFailedError(
+                "Failed to upload to %s/%s: %s" % (bucket_name, key, exc)
+            )
+
+    def put_object(self, Bucket=None, Key=None, Body=None, ContentMD5=None, **kwargs):
+        if isinstance(Body, bytes):
+            Body = io.BytesIO(Body)
+        data = Body.read()
+        Body.seek(0)
+        if ContentMD5 is not None:
+            assert ContentMD5 == base64.b64encode(hashlib.md5(data).digest()).decode()
+        self._upload("put_object", Body, Bucket, Key, kwargs, None)
+
+    def get_object(self, Bucket=None, Key=None):
+        import botocore.exceptions
+
+        with self._lock:
+            self.calls.append(("get_object", Bucket, Key))
+            if (Bucket, Key) not in self.objects:
+                raise botocore.exceptions.ClientError(
+                    {"Error": {"Code": "NoSuchKey", "Message": "Not Found"}},
+                    "GetObject",
+                )
+            (data, ExtraArgs) = self.objects[(Bucket, Key)]
+            return {"Body": io.BytesIO(data)}
+
+    def _upload(self, method, fileobj, bucket_name, key, ExtraArgs, Config):
+        with self._lock:
+            self.active += 1
+            self.active_max = max(self.active, self.active_max)
+        try:
+            if self.upload_delay:
+                time.sleep(self.upload_delay)
+            with self._lock:
+                self.calls.append((method, bucket_name, key))
+                if self.slowdowns:
+                    import botocore.exceptions
+
+                    self.slowdowns -= 1
+                    raise botocore.exceptions.ClientError(
+                        {"Error": {"Code": "SlowDown", "Message": "Slow Down"}},
+                        "PutObject",
+                    )
+                if key in self.fail_keys:
+                    raise IOError("upload failed: %s" % key)
+                self.objects[(bucket_name, key)] = (fileobj.read(), ExtraArgs)
+                self.transfer_configs[(bucket_name, key)] = Config
+        finally:
+            with self._lock:
+                self.active -= 1
+
+    def head_object(self, Bucket=None, Key=None):
+        import botocore.exceptions
+
+        with self._lock:
+            self.calls.append(("head_object", Bucket, Key))
+            if (Bucket, Key) not in self.objects:
+                raise botocore.exceptions.ClientError(
+                    {"Error": {"Code": "404", "Message": "Not Found"}}, "HeadObject"
+                )
+            (data, ExtraArgs) = self.objects[(Bucket, Key)]
+            return {
+                "ETag": '"%s"' % hashlib.md5(data).hexdigest(),
+                "Metadata": (ExtraArgs or {}).get("Metadata", {}),
+            }
+
+    def delete_objects(self, Bucket=None, Delete=None):
+        with self._lock:
+            self.calls.append(("delete_objects", Bucket, len(Delete["Objects"])))
+            assert len(Delete["Objects"]) <= 1000
+            deleted = []
+            errors = []
+            for _obj in Delete["Objects"]:
+                if _obj["Key"] in self.fail_delete_keys:
+                    errors.append(
+                        {"Key": _obj["Key"], "Code": "AccessDenied", "Message": "no"}
+                    )
+                    continue
+                self.objects.pop((Bucket, _obj["Key"]), None)
+                deleted.append({"Key": _obj["Key"]})
+            response = {"Deleted": deleted}
+            if errors:
+                response["Errors"] = errors
+            return response
+
+    def get_paginator(self, operation_name):
+        assert operation_name == "list_objects_v2"
+        return FakeS3Paginator(self)
+
+
+class FakeS3Paginator(object):
+    """a single page `list_objects_v2` listing"""
+
+    def __init__(self, s3_client):
+        self.s3_client = s3_client
+
+    def paginate(self, Bucket=None, Prefix=""):
+        with self.s3_client._lock:
+            self.s3_client.calls.append(("list_objects_v2", Bucket, Prefix))
+            keys = sorted(
+                key
+                for (bucket_name, key) in self.s3_client.objects
+                if (bucket_name == Bucket) and key.startswith(Prefix)
+            )
+        yield {"Contents": [{"Key": key} for key in keys]}
+
+
+def newSaverManager_FakeS3(
+    s3_client, saverLogger=None, saverConfig=None, resizerConfig=None
+):
+    saverManager = imagehelper.saver.s3.SaverManager(
+        saverConfig=saverConfig or newSaverConfig(),
+        saverLogger=saverLogger or CustomSaverLogger(),
+        resizerConfig=resizerConfig
+        or newResizerConfig(optimize_original=False, optimize_resized=False),
+    )
+    saverManager._s3_client = s3_client
+    return saverManager
+
+
+class TestAsyncio(unittest.TestCase):
+    def test_aresize(self):
+        resizerConfig = newResizerConfig()
+        resizer = imagehelper.resizer.Resizer(resizerConfig=resizerConfig)
+        resizedImages = asyncio.run(resizer.aresize(imagefile=get_imagefile()))
+        self.assertEqual(sorted(resizedImages.resized.keys()), sorted(selected_resizes))
+        self.assertNotEqual(resizedImages.resized["thumb1"].file_size, 0)
+
+    def test_aoptimize(self):
+        wrapped = imagehelper.image_wrapper.ImageWrapper(get_imagefile())
+        resized = wrapped.resize(resizesSchema["t4"])
+        resized_sync = wrapped.resize(resizesSchema["t4"])
+        asyncio.run(resized.aoptimize())
+        resized_sync.optimize()
+        self.assertEqual(resized.optimizations, resized_sync.optimizations)
+        self.assertEqual(resized.file_md5, resized_sync.file_md5)
+
+    def test_afiles_save(self):
+        s3_client = FakeS3Client()
+        saverLogger = CustomSaverLogger()
+        saverManager = newSaverManager_FakeS3(s3_client, saverLogger=saverLogger)
+        resizer = imagehelper.resizer.Resizer(resizerConfig=saverManager._resizerConfig)
+        resizedImages = resizer.resize(imagefile=get_imagefile())
+
+        uploaded = asyncio.run(saverManager.afiles_save(resizedImages, "123"))
+        self.assertEqual(
+            uploaded, saverManager.generate_filenames(resizedImages, "123")
+        )
+        self.assertEqual(len(s3_client.objects), len(uploaded))
+        self.assertEqual(len(saverLogger._saves), len(uploaded))
+
+        deleted = asyncio.run(saverManager.afiles_delete(uploaded))
+        self.assertEqual(deleted, {})
+        self.assertEqual(s3_client.objects, {})
+
+    def test_afiles_save__concurrency(self):
+        s3_client = FakeS3Client(upload_delay=0.02)
+        saverConfig = newSaverConfig()
+        saverConfig.upload_concurrency = 3
+        saverManager = newSaverManager_FakeS3(s3_client, saverConfig=saverConfig)
+        resizer = imagehelper.resizer.Resizer(resizerConfig=saverManager._resizerConfig)
+        resizedImages = resizer.resize(imagefile=get_imagefile())
+
+        uploaded = asyncio.run(saverManager.afiles_save(resizedImages, "123"))
+        self.assertEqual(s3_client.active_max, 3)
+        self.assertEqual(len(s3_client.objects), len(uploaded))
+
+    def test_afiles_save__client(self):
+        # the client is created once, before the uploads are fanned out
+        s3_clients = []
+
+        def _s3_client_new(saverConfig):
+            s3_clients.append(FakeS3Client(upload_delay=0.02))
+            return s3_clients[-1]
+
+        saverManager = newSaverManager_FakeS3(None)
+        resizer = imagehelper.resizer.Resizer(resizerConfig=saverManager._resizerConfig)
+        resizedImages = resizer.resize(imagefile=get_imagefile())
+        with mock.patch.object(imagehelper.saver.s3, "s3_client_new", _s3_client_new):
+            uploaded = asyncio.run(
+                saverManager.afiles_save(resizedImages, "123", concurrency=4)
+            )
+        self.assertEqual(len(s3_clients), 1)
+        self.assertEqual(len(s3_clients[0].objects), len(uploaded))
+
+    def test_afiles_save__manifest_merge(self):
+        s3_client = FakeS3Client()
+        saverConfig = newSaverConfig()
+        saverConfig.write_manifest = True
+        saverManager = newSaverManager_FakeS3(s3_client, saverConfig=saverConfig)
+        resizer = imagehelper.resizer.Resizer(resizerConfig=saverManager._resizerConfig)
+        resizedImages = resizer.resize(imagefile=get_imagefile())
+        saverManager.files_save(resizedImages, "123")
+
+        asyncio.run(
+            saverManager.afiles_save(
+                resizedImages, "123", selected_resizes=["t4"], manifest_merge=True
+            )
+        )
+        manifest = saverManager.manifest_load("123")
+        self.assertEqual(
+            sorted(manifest["files"].keys()), sorted(selected_resizes + ["@archive"])
+        )
+
+        asyncio.run(
+            saverManager.afiles_save(resizedImages, "123", selected_resizes=["t4"])
+        )
+        manifest = saverManager.manifest_load("123")
+        self.assertNotIn("thumb1", manifest["files"])
+
+    def test_afiles_save__rollback(self):
+        s3_client = FakeS3Client(fail_keys=("123-t2.pdf",))
+        saverManager = newSaverManager_FakeS3(s3_client)
+        resizer = imagehelper.resizer.Resizer(resizerConfig=saverManager._resizerConfig)
+        resizedImages = resizer.resize(imagefile=get_imagefile())
+
+        with self.assertRaises(imagehelper.errors.ImageError_S3Upload):
+            asyncio.run(saverManager.afiles_save(resizedImages, "123"))
+        self.assertEqual(s3_client.objects, {})
+
+    def test_afiles_save__cancelled(self):
+        s3_client = FakeS3Client(upload_delay=0.05)
+        saverManager = newSaverManager_FakeS3(s3_client)
+        resizer = imagehelper.resizer.Resizer(resizerConfig=saverManager._resizerConfig)
+        resizedImages = resizer.resize(imagefile=get_imagefile())
+
+        async def _run():
+            task = asyncio.ensure_future(
+                saverManager.afiles_save(resizedImages, "123", concurrency=2)
+            )
+            await asyncio.sleep(0.07)
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+        asyncio.run(_run())
+        # something was uploaded, then rolled back
+        self.assertTrue(s3_client.calls)
+        self.assertEqual(s3_client.objects, {})
+
+    def test_afiles_save__cancelled_manifest(self):
+        s3_client = FakeS3Client()
+        saverConfig = newSaverConfig()
+        saverConfig.write_manifest = True
+        saverManager = newSaverManager_FakeS3(s3_client, saverConfig=saverConfig)
+        resizer = imagehelper.resizer.Resizer(resizerConfig=saverManager._resizerConfig)
+        resizedImages = resizer.resize(imagefile=get_imagefile())
+
+        manifest_save = saverManager._manifest_save
+        started = threading.Event()
+
+        def _manifest_save(guid, dry_run=False):
+            started.set()
+            time.sleep(0.05)
+            return manifest_save(guid, dry_run=dry_run)
+
+        async def _run():
+            task = asyncio.ensure_future(saverManager.afiles_save(resizedImages, "123"))
+            while not started.is_set():
+                await asyncio.sleep(0.001)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        # cancelled while the manifest is written, after every upload
+        with mock.patch.object(saverManager, "_manifest_save", _manifest_save):
+            asyncio.run(_run())
+        # the manifest was written, then rolled back
+        self.assertIn("123.manifest.json", [call[2] for call in s3_client.calls])
+        self.assertEqual(s3_client.objects, {})
+
+    def test_afiles_save__manifest_error(self):
+        s3_client = FakeS3Client(fail_keys=("123.manifest.json",))
+        saverConfig = newSaverConfig()
+        saverConfig.write_manifest = True
+        saverManager = newSaverManager_FakeS3(s3_client, saverConfig=saverConfig)
+        resizer = imagehelper.resizer.Resizer(resizerConfig=saverManager._resizerConfig)
+        resizedImages = resizer.resize(imagefile=get_imagefile())
+
+        with self.assertRaises(imagehelper.errors.ImageError_S3Upload):
+            asyncio.run(saverManager.afiles_save(resizedImages, "123"))
+        self.assertEqual(s3_client.objects, {})
+
+
+class TestStreaming(unittest.TestCase):
+    def test_iter_resize(self):
+        resizerConfig = newResizerConfig()
+        resizer = imagehelper.resizer.Resizer(resizerConfig=resizerConfig)
+        streamed = resizer.iter_resize(imagefile=get_imagefile())
+        (size, resized) = next(streamed)
+        self.assertEqual(size, resizerConfig.selected_resizes[0])
+        self.assertNotEqual(resized.file_size, 0)
+        # the original is registered before the first size is yielded
+        self.assertIsNotNone(resizer.get_original())
+        sizes = [size] + [_size for (_size, _resized) in streamed]
+        self.assertEqual(sizes, resizerConfig.selected_resizes)
+
+    def test_files_save_stream(self):
+        s3_client = FakeS3Client()
+        saverLogger = CustomSaverLogger()
+        saverManager = newSaverManager_FakeS3(s3_client, saverLogger=saverLogger)
+        resizer = imagehelper.resizer.Resizer(resizerConfig=saverManager._resizerConfig)
+        resizer.register_image_file(imagefile=get_imagefile())
+
+        uploaded = saverManager.files_save_stream(
+            resizer, "123", selected_resizes=selected_resizes, concurrency=2
+        )
+        resizedImages = resizer.resize(selected_resizes=selected_resizes)
+        self.assertEqual(
+            uploaded, saverManager.generate_filenames(resizedImages, "123")
+        )
+        self.assertEqual(len(s3_client.objects), len(uploaded))
+        self.assertEqual(len(saverLogger._saves), len(uploaded))
+
+    def test_files_save_stream__rollback(self):
+        s3_client = FakeS3Client(fail_keys=("123-t2.pdf",))
+        saverManager = newSaverManager_FakeS3(s3_client)
+        resizer = imagehelper.resizer.Resizer(resizerConfig=saverManager._resizerConfig)
+        resizer.register_image_file(imagefile=get_imagefile())
+
+        with self.assertRaises(imagehelper.errors.ImageError_S3Upload):
+            saverManager.files_save_stream(
+                resizer, "123", selected_resizes=selected_resizes
+            )
+        self.assertTrue(s3_client.calls)
+        self.assertEqual(s3_client.objects, {})
+
+    def test_files_save_stream__resize_error(self):
+        s3_client = FakeS3Client()
+        saverManager = newSaverManager_FakeS3(s3_client)
+        resizer = imagehelper.resizer.Resizer(resizerConfig=saverManager._resizerConfig)
+        resizer.register_image_file(imagefile=get_imagefile())
+        wrappedImage = resizer._wrappedImage
+        if wrappedImage is None:
+            self.fail("the image was not registered")
+
+        def _iter_resize(**kwargs):
+            yield ("thumb1", wrappedImage.resize(resizesSchema["thumb1"]))
+            raise imagehelper.errors.ImageError_ResizeError("bad resize")
+
+        with mock.patch.object(resizer, "iter_resize", _iter_resize):
+            with self.assertRaises(imagehelper.errors.ImageError_ResizeError):
+                saverManager.files_save_stream(
+                    resizer, "123", selected_resizes=selected_resizes
+                )
+        # the archive and first size were uploaded, then rolled back
+        self.assertTrue(s3_client.calls)
+        self.assertEqual(s3_client.objects, {})
+
+
+class TestConcurrentUploads(unittest.TestCase):
+    def test_files_save(self):
+        s3_client = FakeS3Client(upload_delay=0.02)
+        saverLogger = CustomSaverLogger()
+        saverConfig = newSaverConfig()
+        saverConfig.upload_concurrency = 3
+        saverManager = newSaverManager_FakeS3(
+            s3_client, saverLogger=saverLogger, saverConfig=saverConfig
+        )
+        resizer = imagehelper.resizer.Resizer(resizerConfig=saverManager._resizerConfig)
+        resizedImages = resizer.resize(imagefile=get_imagefile())
+
+        uploaded = saverManager.files_save(resizedImages, "123")
+        self.assertEqual(
+            uploaded, saverManager.generate_filenames(resizedImages, "123")
+        )
+        self.assertEqual(s3_client.active_max, 3)
+        self.assertEqual(len(s3_client.objects), len(uploaded))
+        self.assertEqual(len(saverLogger._saves), len(uploaded))
+
+    def test_files_save__rollback(self):
+        s3_client = FakeS3Client(fail_keys=("123-t2.pdf",), upload_delay=0.02)
+        saverLogger = CustomSaverLogger()
+        saverManager = newSaverManager_FakeS3(s3_client, saverLogger=saverLogger)
+        resizer = imagehelper.resizer.Resizer(resizerConfig=saverManager._resizerConfig)
+        resizedImages = resizer.resize(imagefile=get_imagefile())
+
+        with self.assertRaises(imagehelper.errors.ImageError_S3Upload):
+            saverManager.files_save(resizedImages, "123", concurrency=2)
+        self.assertEqual(s3_client.objects, {})
+        # every logged save was also logged as deleted
+        self.assertEqual(len(saverLogger._saves), len(saverLogger._deletes))
+
+    def test_upload_concurrency__invalid(self):
+        with self.assertRaises(ValueError):
+            imagehelper.saver.s3.SaverConfig(upload_concurrency=0)
+
+
+class TestBatchedDeletes(unittest.TestCase):
+    def _files_saved(self, s3_client, count):
+        files_saved = {}
+        for idx in range(count):
+            key = "%s.jpg" % idx
+            bucket_name = AWS_BUCKET_PUBLIC if (idx % 2) else AWS_BUCKET_ARCHIVE
+            s3_client.objects[(bucket_name, key)] = (b"", {})
+            files_saved["size-%s" % idx] = (key, bucket_name)
+        return files_saved
+
+    def test_files_delete(self):
+        s3_client = FakeS3Client()
+        saverLogger = CustomSaverLogger()
+        saverManager = newSaverManager_FakeS3(s3_client, saverLogger=saverLogger)
+        files_saved = self._files_saved(s3_client, 2500)
+
+        remaining = saverManager.files_delete(files_saved)
+        self.assertEqual(remaining, {})
+        self.assertEqual(s3_client.objects, {})
+        self.assertEqual(len(saverLogger._deletes), 2500)
+        # 1250 keys per bucket; 2 requests each
+        self.assertEqual(len(s3_client.calls), 4)
+        self.assertEqual(
+            sorted(call[2] for call in s3_client.calls), [250, 250, 1000, 1000]
+        )
+
+    def test_files_delete__errors(self):
+        s3_client = FakeS3Client(fail_delete_keys=("3.jpg",))
+        saverLogger = CustomSaverLogger()
+        saverManager = newSaverManager_FakeS3(s3_client, saverLogger=saverLogger)
+        files_saved = self._files_saved(s3_client, 10)
+
+        remaining = saverManager.files_delete(files_saved)
+        self.assertEqual(remaining, {"size-3": ("3.jpg", AWS_BUCKET_PUBLIC)})
+        self.assertEqual(list(s3_client.objects.keys()), [(AWS_BUCKET_PUBLIC, "3.jpg")])
+        self.assertEqual(len(saverLogger._deletes), 9)
+        self.assertNotIn((AWS_BUCKET_PUBLIC, "3.jpg"), saverLogger._deletes)
+
+    def test_files_delete__request_error(self):
+        s3_client = FakeS3Client()
+        saverLogger = CustomSaverLogger()
+        saverManager = newSaverManager_FakeS3(s3_client, saverLogger=saverLogger)
+        files_saved = self._files_saved(s3_client, 10)
+        delete_objects = s3_client.delete_objects
+
+        def _delete_objects(Bucket=None, Delete=None):
+            if Bucket == AWS_BUCKET_ARCHIVE:
+                raise ValueError("request failed")
+            return delete_objects(Bucket=Bucket, Delete=Delete)
+
+        with mock.patch.object(s3_client, "delete_objects", _delete_objects):
+            with self.assertRaises(ValueError):
+                saverManager.files_delete(files_saved)
+        # the other bucket was still deleted
+        self.assertEqual(
+            sorted(set(bucket_name for (bucket_name, _key) in s3_client.objects)),
+            [AWS_BUCKET_ARCHIVE],
+        )
+        self.assertEqual(len(files_saved), len(s3_client.objects))
+        self.assertEqual(len(saverLogger._deletes), 10 - len(files_saved))
+
+
+class TestS3ClientPool(unittest.TestCase):
+    def _newFactory(self, saverConfig=None):
+        return imagehelper.saver.s3.SaverManagerFactory(
+            saverConfig=saverConfig or newSaverConfig(),
+            saverLogger=CustomSaverLogger(),
+            resizerConfig=newResizerConfig(),
+        )
+
+    def test_shared(self):
+        saverConfig = newSaverConfig()
+        saverConfig.upload_concurrency = 20
+        factory = self._newFactory(saverConfig=saverConfig)
+        client = factory.manager().s3_client
+        self.assertIs(factory.manager().s3_client, client)
+        self.assertIs(factory.simple_access().s3_client, client)
+        # sized for the uploads, plus the deletes
+        self.assertEqual(
+            client.meta.config.max_pool_connections,
+            20 + imagehelper.saver.s3.DELETE_MAX_WORKERS,
+        )
+        # a manager without the factory still gets its own client
+        saverManager = imagehelper.saver.s3.SaverManager(
+            saverConfig=saverConfig,
+            saverLogger=CustomSaverLogger(),
+            resizerConfig=newResizerConfig(),
+        )
+        self.assertIsNot(saverManager.s3_client, client)
+
+    def test_max_pool_connections(self):
+        saverConfig = newSaverConfig()
+        saverConfig.max_pool_connections = 3
+        factory = self._newFactory(saverConfig=saverConfig)
+        self.assertEqual(
+            factory.manager().s3_client.meta.config.max_pool_connections, 3
+        )
+
+    def test_reset(self):
+        factory = self._newFactory()
+        client = factory.manager().s3_client
+        imagehelper.saver.s3._s3_client_pools_reset()
+        self.assertIsNot(factory.manager().s3_client, client)
+
+    @unittest.skipUnless(hasattr(os, "fork"), "requires `os.fork`")
+    def test_fork(self):
+        factory = self._newFactory()
+        client_id = id(factory.manager().s3_client)
+        (fd_read, fd_write) = os.pipe()
+        pid = os.fork()
+        if pid == 0:  # pragma: no cover
+            try:
+                _shared = factory._s3ClientPool._client is not None
+                _client = factory.manager().s3_client
+                os.write(fd_write, b"1" if (not _shared and _client) else b"0")
+            finally:
+                os._exit(0)
+        os.close(fd_write)
+        os.waitpid(pid, 0)
+        self.assertEqual(os.read(fd_read, 1), b"1")
+        os.close(fd_read)
+        self.assertEqual(id(factory.manager().s3_client), client_id)
+
+
+class TestTransferConfig(unittest.TestCase):
+    def test_multipart(self):
+        s3_client = FakeS3Client()
+        saverConfig = newSaverConfig()
+        saverConfig.multipart_threshold = 5 * 1024 * 1024
+        saverConfig.multipart_chunksize = 6 * 1024 * 1024
+        saverConfig.multipart_max_concurrency = 3
+        saverConfig.put_object_threshold = 0
+        saverManager = newSaverManager_FakeS3(s3_client, saverConfig=saverConfig)
+        resizer = imagehelper.resizer.Resizer(resizerConfig=saverManager._resizerConfig)
+        resizedImages = resizer.resize(imagefile=get_imagefile())
+        # pretend the original is large
+        resizedImages.original._file_size = 100 * 1024 * 1024
+
+        uploaded = saverManager.files_save(resizedImages, "123")
+        for size, (key, bucket_name) in uploaded.items():
+            transfer_config = s3_client.transfer_configs[(bucket_name, key)]
+            self.assertEqual(transfer_config.multipart_threshold, 5 * 1024 * 1024)
+            if size == "@archive":
+                self.assertTrue(transfer_config.use_threads)
+                self.assertEqual(transfer_config.multipart_chunksize, 6 * 1024 * 1024)
+                self.assertEqual(transfer_config.max_concurrency, 3)
+            else:
+                # a single request, without the transfer threads
+                self.assertFalse(transfer_config.use_threads)
+
+
+class TestPutObject(unittest.TestCase):
+    def test_threshold(self):
+        s3_client = FakeS3Client()
+        saverConfig = newSaverConfig()
+        saverConfig.put_object_threshold = 10000
+        saverManager = newSaverManager_FakeS3(s3_client, saverConfig=saverConfig)
+        resizer = imagehelper.resizer.Resizer(resizerConfig=saverManager._resizerConfig)
+        resizedImages = resizer.resize(imagefile=get_imagefile())
+
+        uploaded = saverManager.files_save(resizedImages, "123")
+        methods = {(call[1], call[2]): call[0] for call in s3_client.calls}
+        for size, (key, bucket_name) in uploaded.items():
+            if size == "@archive":
+                wrapped = resizedImages.original
+            else:
+                wrapped = resizedImages.resized[size]
+            (data, ExtraArgs) = s3_client.objects[(bucket_name, key)]
+            self.assertEqual(len(data), wrapped.file_size)
+            if wrapped.format is None:
+                self.fail("`%s` has no format" % size)
+            self.assertEqual(
+                ExtraArgs["ContentType"],
+                imagehelper.utils.PIL_type_to_content_type(wrapped.format),
+            )
+            if wrapped.file_size < 10000:
+                self.assertEqual(methods[(bucket_name, key)], "put_object")
+                if size != "@archive":
+                    self.assertEqual(ExtraArgs["ACL"], "public-read")
+            else:
+                self.assertEqual(methods[(bucket_name, key)], "upload_fileobj")
+            # the file is still usable
+            self.assertFalse(wrapped.file.closed)
+        self.assertIn("put_object", methods.values())
+        self.assertIn("upload_fileobj", methods.values())
+
+    def test_md5_hex_to_b64(self):
+        self.assertEqual(
+            imagehelper.utils.md5_hex_to_b64("d41d8cd98f00b204e9800998ecf8427e"),
+            "1B2M2Y8AsgTpgAmY7PhCfg==",
+        )
+
+    def test_upload_twice(self):
+        # the file must be rewound before each upload, on both paths
+        for put_object_threshold in (0, 1048576):
+            s3_client = FakeS3Client()
+            saverConfig = newSaverConfig()
+            saverConfig.put_object_threshold = put_object_threshold
+            saverManager = newSaverManager_FakeS3(s3_client, saverConfig=saverConfig)
+            resizer = imagehelper.resizer.Resizer(
+                resizerConfig=saverManager._resizerConfig
+            )
+            resizedImages = resizer.resize(imagefile=get_imagefile())
+            saverManager.files_save(resizedImages, "123")
+            uploaded = saverManager.files_save(resizedImages, "456")
+            (key, bucket_name) = uploaded["t4"]
+            self.assertEqual(
+                len(s3_client.objects[(bucket_name, key)][0]),
+                resizedImages.resized["t4"].file_size,
+            )
+
+
+class TestSkipUnchanged(unittest.TestCase):
+    def _newSaverManager(self, s3_client, skip_unchanged=True):
+        saverConfig = newSaverConfig()
+        saverConfig.skip_unchanged = skip_unchanged
+        return newSaverManager_FakeS3(s3_client, saverConfig=saverConfig)
+
+    def _resize(self, saverManager):
+        resizer = imagehelper.resizer.Resizer(resizerConfig=saverManager._resizerConfig)
+        return resizer.resize(imagefile=get_imagefile())
+
+    def _uploads(self, s3_client):
+        return [call for call in s3_client.calls if call[0] != "head_object"]
+
+    def test_skip(self):
+        s3_client = FakeS3Client()
+        saverManager = self._newSaverManager(s3_client)
+        resizedImages = self._resize(saverManager)
+
+        uploaded = saverManager.files_save(resizedImages, "123")
+        self.assertEqual(
+            set(saverManager.files_status.values()),
+            {imagehelper.saver.s3.FILE_STATUS_WRITTEN},
+        )
+        for data, ExtraArgs in s3_client.objects.values():
+            self.assertIn(imagehelper.saver.s3.METADATA_MD5, ExtraArgs["Metadata"])
+
+        s3_client.calls = []
+        uploaded_again = saverManager.files_save(resizedImages, "123")
+        self.assertEqual(uploaded_again, uploaded)
+        self.assertEqual(
+            set(saverManager.files_status.values()),
+            {imagehelper.saver.s3.FILE_STATUS_SKIPPED},
+        )
+        self.assertEqual(self._uploads(s3_client), [])
+
+    def test_changed(self):
+        s3_client = FakeS3Client()
+        saverManager = self._newSaverManager(s3_client)
+        resizedImages = self._resize(saverManager)
+        uploaded = saverManager.files_save(resizedImages, "123")
+
+        (key, bucket_name) = uploaded["t4"]
+        s3_client.objects[(bucket_name, key)] = (b"different", {})
+        saverManager.files_save(resizedImages, "123")
+        self.assertEqual(
+            saverManager.files_status["t4"], imagehelper.saver.s3.FILE_STATUS_CHANGED
+        )
+        self.assertEqual(
+            saverManager.files_status["t2"], imagehelper.saver.s3.FILE_STATUS_SKIPPED
+        )
+
+    def test_etag(self):
+        # objects uploaded without the metadata are compared by their ETag
+        s3_client = FakeS3Client()
+        saverManager = self._newSaverManager(s3_client, skip_unchanged=False)
+        resizedImages = self._resize(saverManager)
+        saverManager.files_save(resizedImages, "123")
+
+        saverManager._saverConfig.skip_unchanged = True
+        saverManager.files_save(resizedImages, "123")
+        self.assertEqual(
+            set(saverManager.files_status.values()),
+            {imagehelper.saver.s3.FILE_STATUS_SKIPPED},
+        )
+
+    def test_rollback(self):
+        s3_client = FakeS3Client()
+        saverManager = self._newSaverManager(s3_client)
+        resizedImages = self._resize(saverManager)
+        uploaded = saverManager.files_save(resizedImages, "123")
+
+        # one size is missing, and can not be uploaded
+        (key, bucket_name) = uploaded["t2"]
+        del s3_client.objects[(bucket_name, key)]
+        s3_client.fail_keys = (key,)
+        for concurrency in (1, 3):
+            with self.assertRaises(imagehelper.errors.ImageError_S3Upload):
+                saverManager.files_save(resizedImages, "123", concurrency=concurrency)
+            # the skipped objects predate the failed upload, so they remain
+            self.assertEqual(len(s3_client.objects), len(uploaded) - 1)
+
+
+class TestUploadThrottle(unittest.TestCase):
+    def test_token_bucket(self):
+        now = [0.0]
+        bucket = imagehelper.saver.throttle.TokenBucket(
+            10, burst=2, clock=lambda: now[0]
+        )
+        self.assertEqual(bucket.try_acquire(), 0)
+        self.assertEqual(bucket.try_acquire(), 0)
+        self.assertAlmostEqual(bucket.try_acquire(), 0.1)
+        now[0] += 0.1
+        self.assertEqual(bucket.try_acquire(), 0)
+        # refills are capped at `burst`
+        now[0] += 100
+        self.assertEqual(bucket.try_acquire(2), 0)
+        self.assertNotEqual(bucket.try_acquire(), 0)
+
+    def test_adaptive_limiter(self):
+        limiter = imagehelper.saver.throttle.AdaptiveLimiter(
+            initial=4, maximum=8, latency_target=1.0
+        )
+        # additive increase: one per window of `limit` successes
+        for _ in range(4):
+            limiter.acquire()
+            limiter.release(latency=0.1)
+        self.assertEqual(limiter.limit, 4)
+        limiter.acquire()
+        limiter.release(latency=0.1)
+        self.assertEqual(limiter.limit, 5)
+        # multiplicative decrease, on throttling or slow responses
+        limiter.acquire()
+        limiter.release(congested=True)
+        self.assertEqual(limiter.limit, 2)
+        limiter.acquire()
+        limiter.release(latency=5)
+        self.assertEqual(limiter.limit, 1)
+        limiter.acquire()
+        limiter.release(congested=True)
+        self.assertEqual(limiter.limit, 1)
+        self.assertEqual(limiter.active, 0)
+
+    def test_is_throttling_error(self):
+        import botocore.exceptions
+
+        is_throttling_error = imagehelper.saver.throttle.is_throttling_error
+        self.assertTrue(
+            is_throttling_error(
+                botocore.exceptions.ClientError(
+                    {"Error": {"Code": "SlowDown"}}, "PutObject"
+                )
+            )
+        )
+        self.assertTrue(
+            is_throttling_error(
+                botocore.exceptions.ClientError(
+                    {"Error": {}, "ResponseMetadata": {"HTTPStatusCode": 503}},
+                    "PutObject",
+                )
+            )
+        )
+        self.assertFalse(
+            is_throttling_error(
+                botocore.exceptions.ClientError(
+                    {"Error": {"Code": "AccessDenied"}}, "PutObject"
+                )
+            )
+        )
+        self.assertFalse(is_throttling_error(IOError("nope")))
+
+        # raised by boto3's transfer manager while handling the `ClientError`
+        import boto3.exceptions
+
+        for code in ("SlowDown", "AccessDenied"):
+            try:
+                try:
+                    raise botocore.exceptions.ClientError(
+                        {"Error": {"Code": code}}, "PutObject"
+                    )
+                except botocore.exceptions.ClientError:
+                    raise boto3.exceptions.S3UploadFailedError("Failed to upload")
+            except boto3.exceptions.S3UploadFailedError as exc:
+                self.assertEqual(is_throttling_error(exc), code == "SlowDown")
+
+    def _newSaverManager(self, s3_client, upload_throttle):
+        saverConfig = newSaverConfig()
+        saverConfig.upload_concurrency = 4
+        saverConfig.upload_throttle = upload_throttle
+        return newSaverManager_FakeS3(s3_client, saverConfig=saverConfig)
+
+    def test_files_save__slowdown(self):
+        s3_client = FakeS3Client(slowdowns=3)
+        upload_throttle = imagehelper.saver.throttle.UploadThrottle(
+            rate=1000, backoff_base=0.001
+        )
+        saverManager = self._newSaverManager(s3_client, upload_throttle)
+        resizer = imagehelper.resizer.Resizer(resizerConfig=saverManager._resizerConfig)
+        resizedImages = resizer.resize(imagefile=get_imagefile())
+
+        # retried, rather than rolled back
+        uploaded = saverManager.files_save(resizedImages, "123")
+        self.assertEqual(len(s3_client.objects), len(uploaded))
+        self.assertEqual(upload_throttle.stats["throttled"], 3)
+        self.assertEqual(upload_throttle.stats["retries"], 3)
+        self.assertLess(upload_throttle.limiter.limit, 4)
+
+    def test_files_save__slowdown_upload_fileobj(self):
+        s3_client = FakeS3Client(slowdowns=3)
+        upload_throttle = imagehelper.saver.throttle.UploadThrottle(
+            rate=1000, backoff_base=0.001
+        )
+        saverManager = self._newSaverManager(s3_client, upload_throttle)
+        saverManager._saverConfig.put_object_threshold = 0
+        resizer = imagehelper.resizer.Resizer(resizerConfig=saverManager._resizerConfig)
+        resizedImages = resizer.resize(imagefile=get_imagefile())
+
+        uploaded = saverManager.files_save(resizedImages, "123")
+        self.assertEqual(len(s3_client.objects), len(uploaded))
+        self.assertEqual(
+            {call[0] for call in s3_client.calls if call[0] != "delete_objects"},
+            {"upload_fileobj"},
+        )
+        self.assertEqual(upload_throttle.stats["throttled"], 3)
+        self.assertEqual(upload_throttle.stats["retries"], 3)
+
+    def test_files_save__retries_exhausted(self):
+        s3_client = FakeS3Client(slowdowns=100)
+        upload_throttle = imagehelper.saver.throttle.UploadThrottle(
+            retries=2, backoff_base=0.001
+        )
+        saverManager = self._newSaverManager(s3_client, upload_throttle)
+        resizer = imagehelper.resizer.Resizer(resizerConfig=saverManager._resizerConfig)
+        resizedImages = resizer.resize(imagefile=get_imagefile())
+
+        with self.assertRaises(imagehelper.errors.ImageError_S3Upload):
+            saverManager.files_save(resizedImages, "123")
+        self.assertEqual(s3_client.objects, {})
+
+
+class TestManifest(unittest.TestCase):
+    def _newSaverManager(self, s3_client):
+        saverConfig = newSaverConfig()
+        saverConfig.write_manifest = True
+        return newSaverManager_FakeS3(s3_client, saverConfig=saverConfig)
+
+    def _resize(self, saverManager):
+        resizer = imagehelper.resizer.Resizer(resizerConfig=saverManager._resizerConfig)
+        return resizer.resize(imagefile=get_imagefile())
+
+    def test_files_save(self):
+        s3_client = FakeS3Client()
+        saverManager = self._newSaverManager(s3_client)
+        resizedImages = self._resize(saverManager)
+
+        uploaded = saverManager.files_save(resizedImages, "123")
+        self.assertEqual(
+            uploaded["@manifest"], ("123.manifest.json", AWS_BUCKET_ARCHIVE)
+        )
+        self.assertEqual(len(s3_client.objects), len(uploaded))
+        # the manifest is written last
+        self.assertEqual(s3_client.calls[-1][2], "123.manifest.json")
+
+        (data, ExtraArgs) = s3_client.objects[uploaded["@manifest"][::-1]]
+        manifest = json.loads(data)
+        self.assertEqual(manifest["guid"], "123")
+        self.assertEqual(
+            sorted(manifest["files"].keys()),
+            sorted(k for k in uploaded.keys() if k != "@manifest"),
+        )
+        self.assertEqual(
+            manifest["files"]["t4"]["digests"], resizedImages.resized["t4"].digests
+        )
+        self.assertEqual(
+            manifest["schema_fingerprint"],
+            saverManager._resizerConfig.schema_fingerprint(),
+        )
+        self.assertEqual(ExtraArgs["ContentType"], "application/json")
+
+    def test_files_save_stream(self):
+        s3_client = FakeS3Client()
+        saverManager = self._newSaverManager(s3_client)
+        resizer = imagehelper.resizer.Resizer(resizerConfig=saverManager._resizerConfig)
+        resizer.register_image_file(imagefile=get_imagefile())
+        uploaded = saverManager.files_save_stream(resizer, "123")
+        self.assertIn("@manifest", uploaded)
+        self.assertEqual(len(s3_client.objects), len(uploaded))
+
+    def test_s3_bucketnames(self):
+        saverConfig = newSaverConfig()
+        saverConfig.bucket_manifest_name = "bucket-manifest"
+        saverManager = newSaverManager_FakeS3(FakeS3Client(), saverConfig=saverConfig)
+        self.assertNotIn("@manifest", saverManager.s3_bucketnames)
+        self.assertNotIn("bucket-manifest", saverManager.s3_bucketnames)
+
+        saverManager = self._newSaverManager(FakeS3Client())
+        self.assertEqual(saverManager.s3_bucketnames["@manifest"], AWS_BUCKET_ARCHIVE)
+
+    def test_files_delete_by_guid(self):
+        s3_client = FakeS3Client()
+        saverManager = self._newSaverManager(s3_client)
+        saverManager.files_save(self._resize(saverManager), "123")
+
+        # a manager with a different schema can still delete everything
+        saverManager_other = self._newSaverManager(s3_client)
+        saverManager_other._resizerConfig = imagehelper.resizer.ResizerConfig(
+            resizesSchema={"other": resizesSchema["t4"]},
+        )
+        remaining = saverManager_other.files_delete_by_guid("123")
+        self.assertEqual(remaining, {})
+        self.assertEqual(s3_client.objects, {})
+
+        with self.assertRaises(imagehelper.errors.ImageError_MissingFile):
+            saverManager.files_delete_by_guid("123")
+
+    def test_files_delete_by_guid__errors(self):
+        s3_client = FakeS3Client()
+        saverManager = self._newSaverManager(s3_client)
+        uploaded = saverManager.files_save(self._resize(saverManager), "123")
+
+        (key, bucket_name) = uploaded["t2"]
+        s3_client.fail_delete_keys = (key,)
+        remaining = saverManager.files_delete_by_guid("123")
+        self.assertEqual(remaining, {"t2": (key, bucket_name)})
+        # the manifest is kept, so the purge can be re-run
+        self.assertEqual(
+            sorted(s3_client.objects.keys()),
+            sorted([(bucket_name, key), uploaded["@manifest"][::-1]]),
+        )
+        s3_client.fail_delete_keys = ()
+        self.assertEqual(saverManager.files_delete_by_guid("123"), {})
+        self.assertEqual(s3_client.objects, {})
+
+
+class TestPurgePlan(unittest.TestCase):
+    def test_purge_plan(self):
+        saverManager = newSaverManager_FakeS3(FakeS3Client())
+        resizer = imagehelper.resizer.Resizer(resizerConfig=saverManager._resizerConfig)
+        for guid, original_filename in (("123456789", "a.gif"), ("abc", "b.jpg")):
+            fakedResizedImages = resizer.fake_resize(original_filename)
+            expected = saverManager.generate_filenames(fakedResizedImages, guid)
+            original_format = original_filename.split(".")[-1]
+            planned = list(saverManager.purge_plan([(guid, original_format)]))
+            self.assertEqual(
+                sorted(planned),
+                sorted((bucket_name, key) for (key, bucket_name) in expected.values()),
+            )
+
+    def test_purge_plan__lazy(self):
+        saverManager = newSaverManager_FakeS3(FakeS3Client())
+        consumed = []
+
+        def _items():
+            for i in itertools.count():
+                consumed.append(i)
+                yield ("guid-%s" % i, "png")
+
+        plan = saverManager.purge_plan(_items(), archive_original=False)
+        keys = list(itertools.islice(plan, 12))
+        self.assertEqual(len(keys), 12)
+        self.assertLessEqual(len(consumed), 3)
+        self.assertIn((AWS_BUCKET_PUBLIC, "guid-0---t4.png"), keys)
+
+    def test_purge_plan__invalid(self):
+        saverManager = newSaverManager_FakeS3(FakeS3Client())
+        # raised on the call, not on the first iteration
+        with self.assertRaises(imagehelper.errors.ImageError_ConfigError):
+            saverManager.purge_plan([], selected_resizes=["missing"])
+
+    def test_files_purge(self):
+        s3_client = FakeS3Client()
+        saverLogger = CustomSaverLogger()
+        saverManager = newSaverManager_FakeS3(s3_client, saverLogger=saverLogger)
+        resizer = imagehelper.resizer.Resizer(resizerConfig=saverManager._resizerConfig)
+        resizedImages = resizer.resize(imagefile=get_imagefile())
+        for guid in ("123", "456"):
+            saverManager.files_save(resizedImages, guid)
+        self.assertEqual(len(s3_client.objects), 12)
+        saverLogger._deletes = []
+
+        stats = saverManager.files_purge(
+            saverManager.purge_plan([("123", "jpg"), ("456", "jpg")])
+        )
+        self.assertEqual(s3_client.objects, {})
+        self.assertEqual(stats.keys, 12)
+        self.assertEqual(stats.deleted, 12)
+        self.assertEqual(stats.failed, [])
+        # one request per bucket
+        self.assertEqual(stats.requests, 2)
+        self.assertEqual(len(saverLogger._deletes), 12)
+
+    def test_files_purge__batches(self):
+        s3_client = FakeS3Client(fail_delete_keys=("key-3",))
+        saverManager = newSaverManager_FakeS3(s3_client)
+        keys = (("bucket-%s" % (i % 2), "key-%s" % i) for i in range(11))
+        with mock.patch.object(imagehelper.saver.s3, "DELETE_BATCH_SIZE", 2):
+            stats = saverManager.files_purge(keys, max_workers=2)
+        self.assertEqual(stats.keys, 11)
+        self.assertEqual(stats.deleted, 10)
+        self.assertEqual(stats.requests, 6)
+        self.assertEqual(stats.failed, [("bucket-1", "key-3", "AccessDenied: no")])
+        for call in s3_client.calls:
+            self.assertLessEqual(call[2], 2)
+
+    def test_files_purge__dry_run(self):
+        s3_client = FakeS3Client()
+        saverManager = newSaverManager_FakeS3(s3_client)
+        stats = saverManager.files_purge(
+            saverManager.purge_plan([("123", "jpg")]), dry_run=True
+        )
+        self.assertEqual(stats.keys, 6)
+        self.assertEqual(stats.requests, 2)
+        self.assertEqual(s3_client.calls, [])
+
+
+class TestFilenameTokens(unittest.TestCase):
+    def _resizerConfig(self):
+        _resizesSchema: ResizesSchema = {
+            "hashed": {
+                "width": 60,
+                "height": 60,
+                "format": "PNG",
+                "constraint-method": "fit-within",
+                "filename_template": "%(guid)s-%(md5_8)s-%(width)sx%(height)s.%(format)s",
+            },
+            "sourced": {
+                "width": 60,
+                "height": 60,
+                "format": "JPEG",
+                "constraint-method": "fit-within",
+                "filename_template": "%(guid)s-%(source_width)sx%(source_height)s-%(sha256)s.%(format)s",
+                "boto3_ExtraArgs": {"CacheControl": "max-age=60"},
+            },
+            "plain": {
+                "width": 60,
+                "height": 60,
+                "format": "JPEG",
+                "constraint-method": "fit-within",
+            },
+        }
+        return imagehelper.resizer.ResizerConfig(
+            resizesSchema=_resizesSchema,
+            optimize_original=False,
+            optimize_resized=False,
+        )
+
+    def test_digest_token_parse(self):
+        parse = imagehelper.saver.utils.digest_token_parse
+        self.assertEqual(parse("md5"), ("md5", 0))
+        self.assertEqual(parse("sha256_12"), ("sha256", 12))
+        self.assertEqual(parse("sha3_256"), ("sha3_256", 0))
+        self.assertEqual(parse("sha3_256_8"), ("sha3_256", 8))
+        self.assertEqual(parse("crc32"), ("crc32", 0))
+        self.assertIsNone(parse("guid"))
+        self.assertIsNone(parse("md5_"))
+        self.assertIsNone(parse("md5_0"))
+        self.assertIsNone(parse("shake_128"))
+
+        is_content_addressed = (
+            imagehelper.saver.utils.filename_template_is_content_addressed
+        )
+        self.assertTrue(is_content_addressed("%(guid)s-%(md5_8)s.%(format)s"))
+        self.assertFalse(is_content_addressed("%(guid)s-%(suffix)s.%(format)s"))
+
+    def test_generate_filenames(self):
+        resizerConfig = self._resizerConfig()
+        resizer = imagehelper.resizer.Resizer(resizerConfig=resizerConfig)
+        resizedImages = resizer.resize(imagefile=get_imagefile())
+        saverManager = imagehelper.saver.s3.SaverManager(
+            saverConfig=newSaverConfig(),
+            saverLogger=CustomSaverLogger(),
+            resizerConfig=resizerConfig,
+        )
+        filenames = saverManager.generate_filenames(resizedImages, "123")
+        hashed = resizedImages.resized["hashed"]
+        sourced = resizedImages.resized["sourced"]
+        original = resizedImages.original
+        self.assertEqual(
+            filenames["hashed"][0],
+            "123-%s-%sx%s.png" % (hashed.file_md5[:8], hashed.width, hashed.height),
+        )
+        self.assertEqual(
+            filenames["sourced"][0],
+            "123-%sx%s-%s.jpg"
+            % (original.width, original.height, sourced.digest("sha256")),
+        )
+        self.assertEqual(filenames["plain"][0], "123-plain.jpg")
+
+        # the tokens need the files
+        fakedResizedImages = resizer.fake_resize("a.jpg")
+        with self.assertRaises(imagehelper.errors.ImageError_ConfigError):
+            saverManager.generate_filenames(fakedResizedImages, "123")
+        # before anything is purged
+        with self.assertRaises(imagehelper.errors.ImageError_ConfigError):
+            saverManager.purge_plan(iter(()))
+
+        # unknown tokens are still an error
+        saverManager.filename_template_archive = "%(guid)s-%(unknown)s.%(format)s"
+        with self.assertRaises(KeyError):
+            saverManager.generate_filenames(resizedImages, "123")
+
+    def test_files_save_stream(self):
+        resizerConfig = self._resizerConfig()
+        s3_client = FakeS3Client()
+        saverManager = newSaverManager_FakeS3(s3_client, resizerConfig=resizerConfig)
+        saverManager.filename_template_archive = "%(sha256)s.%(format)s"
+        resizer = imagehelper.resizer.Resizer(resizerConfig=resizerConfig)
+        resizer.register_image_file(imagefile=get_imagefile())
+
+        uploaded = saverManager.files_save_stream(resizer, "123")
+        resizedImages = resizer.resize()
+        self.assertEqual(
+            uploaded, saverManager.generate_filenames(resizedImages, "123")
+        )
+        self.assertEqual(len(s3_client.objects), len(uploaded))
+
+    def test_cache_control(self):
+        resizerConfig = self._resizerConfig()
+        resizer = imagehelper.resizer.Resizer(resizerConfig=resizerConfig)
+        resizedImages = resizer.resize(imagefile=get_imagefile())
+        s3_client = FakeS3Client()
+        saverManager = newSaverManager_FakeS3(s3_client, resizerConfig=resizerConfig)
+        saverManager.filename_template_archive = "%(sha256)s.%(format)s"
+        uploaded = saverManager.files_save(resizedImages, "123")
+
+        def _ExtraArgs(size):
+            (key, bucket_name) = uploaded[size]
+            return s3_client.objects[(bucket_name, key)][1]
+
+        self.assertEqual(
+            _ExtraArgs("hashed")["CacheControl"],
+            imagehelper.saver.s3.CACHE_CONTROL_IMMUTABLE,
+        )
+        # the schema wins
+        self.assertEqual(_ExtraArgs("sourced")["CacheControl"], "max-age=60")
+        self.assertNotIn("CacheControl", _ExtraArgs("plain"))
+        self.assertEqual(
+            uploaded["@archive"][0],
+            "%s.jpg" % resizedImages.original.digest("sha256"),
+        )
+        self.assertEqual(
+            _ExtraArgs("@archive")["CacheControl"],
+            imagehelper.saver.s3.CACHE_CONTROL_IMMUTABLE,
+        )
+
+
+class TestArchiveContentAddressed(unittest.TestCase):
+    def _newSaverManager(self, s3_client, archive_index=None, write_manifest=False):
+        saverConfig = newSaverConfig()
+        saverConfig.archive_content_addressed = True
+        saverConfig.archive_index = archive_index
+        saverConfig.write_manifest = write_manifest
+        return newSaverManager_FakeS3(s3_client, saverConfig=saverConfig)
+
+    def _resize(self, saverManager):
+        resizer = imagehelper.resizer.Resizer(resizerConfig=saverManager._resizerConfig)
+        return resizer.resize(imagefile=get_imagefile())
+
+    def _archive_uploads(self, s3_client):
+        return [
+            call
+            for call in s3_client.calls
+            if (call[0] in ("upload_fileobj", "put_object"))
+            and (call[1] == AWS_BUCKET_ARCHIVE)
+            and not call[2].endswith(".json")
+            and ".references/" not in call[2]
+        ]
+
+    def test_s3(self):
+        s3_client = FakeS3Client()
+        saverManager = self._newSaverManager(s3_client)
+        resizedImages = self._resize(saverManager)
+        sha256 = resizedImages.original.digest("sha256")
+
+        uploaded = saverManager.files_save(resizedImages, "123")
+        # shared by other guids, so it is not returned
+        self.assertNotIn("@archive", uploaded)
+        self.assertEqual(
+            uploaded["@archive_pointer"], ("123.archive.json", AWS_BUCKET_ARCHIVE)
+        )
+        self.assertIn((AWS_BUCKET_ARCHIVE, "%s.jpg" % sha256), s3_client.objects)
+        self.assertEqual(len(self._archive_uploads(s3_client)), 1)
+
+        # a duplicate original only writes the pointer
+        uploaded = saverManager.files_save(self._resize(saverManager), "456")
+        self.assertNotIn("@archive", uploaded)
+        self.assertEqual(
+            saverManager.files_status["@archive"],
+            imagehelper.saver.s3.FILE_STATUS_SKIPPED,
+        )
+        self.assertEqual(len(self._archive_uploads(s3_client)), 1)
+
+        pointer = saverManager.archive_pointer_load("456")
+        self.assertEqual(pointer["guid"], "456")
+        self.assertEqual(pointer["key"], "%s.jpg" % sha256)
+        self.assertEqual(pointer["bucket"], AWS_BUCKET_ARCHIVE)
+        self.assertEqual(pointer["digests"]["sha256"], sha256)
+        with self.assertRaises(imagehelper.errors.ImageError_MissingFile):
+            saverManager.archive_pointer_load("789")
+
+    def test_s3__archive_index(self):
+        s3_client = FakeS3Client()
+        archive_index: Set[str] = set()
+        saverManager = self._newSaverManager(s3_client, archive_index=archive_index)
+        saverManager.files_save(self._resize(saverManager), "123")
+        self.assertEqual(len(archive_index), 1)
+
+        s3_client.calls = []
+        saverManager.files_save(self._resize(saverManager), "456")
+        self.assertNotIn("head_object", [call[0] for call in s3_client.calls])
+        self.assertEqual(self._archive_uploads(s3_client), [])
+
+    def _archive(self, saverManager, guid):
+        pointer = saverManager.archive_pointer_load(guid)
+        return (pointer["bucket"], pointer["key"])
+
+    def test_s3__rollback(self):
+        s3_client = FakeS3Client()
+        saverManager = self._newSaverManager(s3_client)
+        saverManager.files_save(self._resize(saverManager), "123")
+        archive = self._archive(saverManager, "123")
+
+        s3_client.fail_keys = ("456---t4.png",)
+        with self.assertRaises(imagehelper.errors.ImageError_S3Upload):
+            saverManager.files_save(self._resize(saverManager), "456")
+        # the shared archive is kept
+        self.assertIn(archive, s3_client.objects)
+
+    def test_s3__files_delete(self):
+        # the same original, under two guids
+        s3_client = FakeS3Client()
+        saverManager = self._newSaverManager(s3_client)
+        saverManager.files_save(self._resize(saverManager), "abc")
+        uploaded = saverManager.files_save(self._resize(saverManager), "def")
+        archive = self._archive(saverManager, "abc")
+
+        self.assertEqual(saverManager.files_delete(uploaded), {})
+        self.assertIn(archive, s3_client.objects)
+        self.assertEqual(self._archive(saverManager, "abc"), archive)
+        with self.assertRaises(imagehelper.errors.ImageError_MissingFile):
+            saverManager.archive_pointer_load("def")
+
+    def test_s3__purge_plan(self):
+        s3_client = FakeS3Client()
+        saverManager = self._newSaverManager(s3_client)
+        saverManager.files_save(self._resize(saverManager), "abc")
+        saverManager.files_save(self._resize(saverManager), "def")
+        archive = self._archive(saverManager, "abc")
+
+        s3_client.calls = []
+        keys = list(saverManager.purge_plan([("abc", "jpg")]))
+        self.assertIn((AWS_BUCKET_ARCHIVE, "abc.archive.json"), keys)
+        self.assertIn(
+            saverManager.archive_reference_filename("abc", *archive)[::-1], keys
+        )
+        # still used by "def"
+        self.assertNotIn(archive, keys)
+        self.assertNotIn((AWS_BUCKET_ARCHIVE, "abc.jpg"), keys)
+        # only the references of the original are listed; no other pointer is read
+        self.assertEqual(
+            [call for call in s3_client.calls if call[0] != "head_object"],
+            [
+                ("get_object", AWS_BUCKET_ARCHIVE, "abc.archive.json"),
+                ("list_objects_v2", AWS_BUCKET_ARCHIVE, archive[1] + ".references/"),
+            ],
+        )
+        stats = saverManager.files_purge(keys)
+        self.assertEqual(stats.failed, [])
+        self.assertIn(archive, s3_client.objects)
+
+        keys = list(saverManager.purge_plan([("def", "jpg")]))
+        self.assertIn((AWS_BUCKET_ARCHIVE, "def.archive.json"), keys)
+        self.assertIn(archive, keys)
+        saverManager.files_purge(keys)
+        self.assertEqual(s3_client.objects, {})
+
+        # two guids purged together
+        saverManager.files_save(self._resize(saverManager), "abc")
+        saverManager.files_save(self._resize(saverManager), "def")
+        saverManager.files_purge(
+            saverManager.purge_plan([("abc", "jpg"), ("def", "jpg"), ("xyz", "jpg")])
+        )
+        self.assertEqual(s3_client.objects, {})
+
+        # an original without a reference index is kept
+        saverManager.files_save(self._resize(saverManager), "abc")
+        del s3_client.objects[
+            saverManager.archive_reference_filename("abc", *archive)[::-1]
+        ]
+        keys = list(saverManager.purge_plan([("abc", "jpg")]))
+        self.assertNotIn(archive, keys)
+
+    def test_s3__files_delete_by_guid(self):
+        s3_client = FakeS3Client()
+        saverManager = self._newSaverManager(s3_client, write_manifest=True)
+        saverManager.files_save(self._resize(saverManager), "123")
+        archive = self._archive(saverManager, "123")
+        manifest = saverManager.manifest_load("123")
+        self.assertIn("@archive_pointer", manifest["files"])
+
+        self.assertEqual(saverManager.files_delete_by_guid("123"), {})
+        self.assertEqual(list(s3_client.objects.keys()), [archive])
+
+    def test_localfile(self):
+        with tempfile.TemporaryDirectory() as filedir:
+            saverConfig = imagehelper.saver.localfile.SaverConfig(
+                archive_original=True,
+                filedir=filedir,
+                archive_content_addressed=True,
+            )
+            saver = imagehelper.saver.localfile.SaverManager(
+                saverConfig=saverConfig,
+                saverLogger=imagehelper.saver.localfile.SaverLogger(),
+                resizerConfig=newResizerConfig(
+                    optimize_original=False, optimize_resized=False
+                ),
+            )
+            resizer = imagehelper.resizer.Resizer(resizerConfig=saver._resizerConfig)
+            resizedImages = resizer.resize(imagefile=get_imagefile())
+            sha256 = resizedImages.original.digest("sha256")
+
+            saved = saver.files_save(resizedImages, "123")
+            self.assertNotIn("@archive", saved)
+            self.assertEqual(saved["@archive_pointer"], ("123.archive.json", "archive"))
+            archive_file = os.path.join(filedir, "archive", "%s.jpg" % sha256)
+            os.utime(archive_file, (0, 0))
+
+            resizer = imagehelper.resizer.Resizer(resizerConfig=saver._resizerConfig)
+            resizedImages = resizer.resize(imagefile=get_imagefile())
+            saved = saver.files_save(resizedImages, "456")
+            self.assertNotIn("@archive", saved)
+            # not re-written
+            self.assertEqual(os.stat(archive_file).st_mtime, 0)
+            self.assertEqual(
+                sorted(os.listdir(os.path.join(filedir, "archive"))),
+                sorted(["%s.jpg" % sha256, "123.archive.json", "456.archive.json"]),
+            )
+
+            pointer = saver.archive_pointer_load("456")
+            self.assertEqual(pointer["key"], "%s.jpg" % sha256)
+            self.assertEqual(pointer["digests"]["sha256"], sha256)
+            with self.assertRaises(imagehelper.errors.ImageError_MissingFile):
+                saver.archive_pointer_load("789")
+
+            # deleting one guid keeps the original of the other
+            self.assertEqual(saver.files_delete(saved), {})
+            self.assertEqual(
+                sorted(os.listdir(os.path.join(filedir, "archive"))),
+                sorted(["%s.jpg" % sha256, "123.archive.json"]),
+            )
+
+
+class TestResizeCache(unittest.TestCase):
+    def _resize(self, resizeCache, **kwargs):
+        resizerConfig = newResizerConfig(
+            optimize_original=False, optimize_resized=False
+        )
+        resizer = imagehelper.resizer.Resizer(
+            resizerConfig=resizerConfig, resizeCache=resizeCache
+        )
+        return (resizer, resizer.resize(imagefile=get_imagefile(), **kwargs))
+
+    def test_hit(self):
+        resizeCache = imagehelper.cache.ResizeCache()
+        (resizer_1, resultset_1) = self._resize(resizeCache)
+        self.assertEqual(resizeCache.stats.misses, 6)
+        self.assertEqual(resizeCache.stats.hits, 0)
+
+        (resizer_2, resultset_2) = self._resize(resizeCache)
+        self.assertEqual(resizeCache.stats.hits, 6)
+        # the image was not decoded
+        self.assertIsNone(resizer_2._wrappedImage)
+        self.assertEqual(
+            list(resultset_2.resized.keys()), list(resultset_1.resized.keys())
+        )
+        for size, resized in resultset_1.resized.items():
+            cached = resultset_2.resized[size]
+            self.assertIsInstance(cached, imagehelper.image_wrapper.ResizedImage)
+            self.assertIsNot(cached.file, resized.file)
+            self.assertEqual(cached.file_md5, resized.file_md5)
+            self.assertEqual(cached.format, resized.format)
+            self.assertEqual(
+                (cached.width, cached.height), (resized.width, resized.height)
+            )
+        self.assertEqual(resultset_2.original.file_md5, resultset_1.original.file_md5)
+        self.assertEqual(resizeCache.stats.as_dict()["hit_rate"], 0.5)
+
+    def test_partial(self):
+        resizeCache = imagehelper.cache.ResizeCache()
+        self._resize(resizeCache, selected_resizes=["thumb1", "t2"])
+        self.assertEqual(resizeCache.stats.misses, 3)
+
+        (resizer, resultset) = self._resize(resizeCache)
+        self.assertEqual(resizeCache.stats.hits, 3)
+        self.assertEqual(resizeCache.stats.misses, 6)
+        self.assertEqual(len(resultset.resized), len(selected_resizes))
+
+        # different instructions are different entries
+        self._resize(resizeCache, selected_resizes=["thumb1"], optimize_resized=True)
+        self.assertEqual(resizeCache.stats.misses, 7)
+
+    def test_original_options(self):
+        resizeCache = imagehelper.cache.ResizeCache()
+        self._resize(resizeCache, selected_resizes=["thumb1"])
+        self.assertEqual(resizeCache.stats.misses, 2)
+
+        # the original is not reused across `digest_algorithms`
+        resizerConfig = newResizerConfig(
+            optimize_original=False, optimize_resized=False
+        )
+        resizerConfig.digest_algorithms = ("md5", "sha256")
+        resizer = imagehelper.resizer.Resizer(
+            resizerConfig=resizerConfig, resizeCache=resizeCache
+        )
+        resultset = resizer.resize(
+            imagefile=get_imagefile(), selected_resizes=["thumb1"]
+        )
+        self.assertEqual(resizeCache.stats.misses, 4)
+        self.assertEqual(
+            resultset.original.digest("sha256"),
+            hashlib.sha256(get_imagefile().read()).hexdigest(),
+        )
+
+    def test_eviction(self):
+        resizeCache = imagehelper.cache.ResizeCache(max_bytes=20000)
+        self._resize(resizeCache)
+        self.assertGreater(resizeCache.stats.evictions, 0)
+        self.assertLessEqual(resizeCache.bytes, 20000)
+        self.assertLess(len(resizeCache), 6)
+
+    def test_disk(self):
+        with tempfile.TemporaryDirectory() as directory:
+            resizeCache = imagehelper.cache.ResizeCache(directory=directory)
+            (_resizer, resultset_1) = self._resize(resizeCache)
+            self.assertEqual(resizeCache.stats.disk_writes, 6)
+
+            # a new process
+            resizeCache = imagehelper.cache.ResizeCache(directory=directory)
+            (resizer, resultset_2) = self._resize(resizeCache)
+            self.assertEqual(resizeCache.stats.disk_hits, 6)
+            self.assertIsNone(resizer._wrappedImage)
+            self.assertEqual(
+                resultset_2.resized["t4"].file_md5, resultset_1.resized["t4"].file_md5
+            )
+
+            # and then from memory
+            self._resize(resizeCache)
+            self.assertEqual(resizeCache.stats.hits, 6)
+
+    def test_disk_corrupt(self):
+        with tempfile.TemporaryDirectory() as directory:
+            resizeCache = imagehelper.cache.ResizeCache(directory=directory)
+            self._resize(resizeCache)
+            # a header that is not json, in every entry
+            for filename in os.listdir(directory):
+                with open(os.path.join(directory, filename), "r+b") as fh:
+                    fh.seek(8)
+                    fh.write(b"\x00")
+
+            resizeCache = imagehelper.cache.ResizeCache(directory=directory)
+            with self.assertLogs("imagehelper.cache", "WARNING"):
+                (resizer, resultset) = self._resize(resizeCache)
+            self.assertEqual(resizeCache.stats.disk_hits, 0)
+            self.assertEqual(resizeCache.stats.misses, 6)
+            self.assertEqual(len(resultset.resized), len(selected_resizes))
+
+
+class TestPerceptualHash(unittest.TestCase):
+    def _variant(self):
+        # a downscaled, recompressed copy of the test image
+        pilObject = Image.open(get_imagefile())
+        pilObject = pilObject.resize((pilObject.size[0] // 3, pilObject.size[1] // 3))
+        fileobj = io.BytesIO()
+        pilObject.save(fileobj, "JPEG", quality=40)
+        fileobj.seek(0)
+        return fileobj
+
+    def _other(self):
+        return open("tests/test-data/spiral_animation.gif", _io.FileReadArgs)
+
+    def _assert_near_duplicates(self, algorithm):
+        perceptual = imagehelper.perceptual
+        hash_original = perceptual.hash_file(get_imagefile(), algorithm=algorithm)
+        hash_variant = perceptual.hash_file(self._variant(), algorithm=algorithm)
+        with self._other() as fh:
+            hash_other = perceptual.hash_file(fh, algorithm=algorithm)
+        self.assertLessEqual(perceptual.hamming(hash_original, hash_variant), 6)
+        self.assertGreater(perceptual.hamming(hash_original, hash_other), 16)
+
+    def test_dhash(self):
+        self._assert_near_duplicates("dhash")
+
+    @unittest.skipIf(
+        imagehelper.perceptual.numpy is None, "`numpy` was not available for import"
+    )
+    def test_phash(self):
+        self._assert_near_duplicates("phash")
+
+    def test_phash_requires_numpy(self):
+        if imagehelper.perceptual.numpy is not None:
+            raise unittest.SkipTest("`numpy` is available")
+        with self.assertRaises(imagehelper.perceptual.NoNumpy):
+            imagehelper.perceptual.hash_file(get_imagefile(), algorithm="phash")
+
+    def test_image_wrapper(self):
+        imageWrapper = imagehelper.image_wrapper.ImageWrapper(get_imagefile())
+        hash_wrapper = imageWrapper.perceptual_hash()
+        self.assertIs(hash_wrapper, imageWrapper.perceptual_hash())
+        self.assertLess(hash_wrapper.bit_length(), 65)
+        # the original is draft-decoded, as by `hash_file`
+        hash_file = imagehelper.perceptual.hash_file(get_imagefile())
+        self.assertEqual(hash_wrapper, hash_file)
+        self.assertEqual(imageWrapper.basicImage.file.tell(), 0)
+        # an `icc_to_srgb` conversion is hashed from the raster
+        imageWrapper._perceptual_hashes = None
+        with mock.patch.object(imageWrapper, "icc_converted", True):
+            hash_raster = imageWrapper.perceptual_hash()
+        self.assertLessEqual(imagehelper.perceptual.hamming(hash_raster, hash_file), 6)
+        with self.assertRaises(ValueError):
+            imageWrapper.perceptual_hash("ahash")
+
+    def test_hash_file(self):
+        perceptual = imagehelper.perceptual
+        fileobj = get_imagefile()
+        fileobj.seek(10)
+        hash_fileobj = perceptual.hash_file(fileobj)
+        # the stream is read in place, and rewound
+        self.assertEqual(fileobj.tell(), 0)
+        self.assertFalse(fileobj.closed)
+        self.assertEqual(
+            perceptual.hash_file("tests/test-data/henry.jpg"), hash_fileobj
+        )
+        with self.assertRaises(imagehelper.errors.ImageError_Parsing):
+            perceptual.hash_file(io.BytesIO(b"not an image"))
+
+    def test_bktree(self):
+        tree = imagehelper.perceptual.BKTree()
+        hashes = {
+            "a": 0b0000,
+            "b": 0b0001,
+            "c": 0b0011,
+            "d": 0b1111,
+            "e": 0b0001,
+        }
+        for value, hash_ in hashes.items():
+            tree.add(hash_, value)
+        self.assertEqual(len(tree), 5)
+        results = tree.search(0b0000, 1)
+        self.assertEqual(sorted(r[2] for r in results), ["a", "b", "e"])
+        self.assertEqual(results[0], (0, 0b0000, "a"))
+        results = tree.search(0b0111, 1)
+        self.assertEqual(sorted(r[2] for r in results), ["c", "d"])
+        self.assertEqual(imagehelper.perceptual.BKTree().search(0, 64), [])
+
+    def test_bktree_matches_linear_scan(self):
+        _random = random.Random(45)
+        hashes = [_random.getrandbits(64) for i in range(500)]
+        tree = imagehelper.perceptual.BKTree()
+        for idx, hash_ in enumerate(hashes):
+            tree.add(hash_, idx)
+        needle = hashes[7] ^ 0b1011
+        expected = sorted(
+            idx
+            for idx, hash_ in enumerate(hashes)
+            if imagehelper.perceptual.hamming(needle, hash_) <= 12
+        )
+        found = sorted(r[2] for r in tree.search(needle, 12))
+        self.assertEqual(found, expected)
+        self.assertIn(7, found)
+
+
+class TestSchemaDiff(unittest.TestCase):
+    def _resizerConfig(self, schema):
+        return imagehelper.resizer.ResizerConfig(
+            resizesSchema=schema, selected_resizes=selected_resizes
+        )
+
+    def test_size_fingerprint(self):
+        resizerConfig = self._resizerConfig(resizesSchema)
+        fingerprints = resizerConfig.size_fingerprints()
+        self.assertEqual(sorted(fingerprints.keys()), sorted(selected_resizes))
+        self.assertEqual(len(set(fingerprints.values())), len(selected_resizes))
+
+        # stable across instances and key order
+        schema: Dict[str, Dict[str, object]] = {
+            size: dict(reversed(list(instructions.items())))
+            for (size, instructions) in resizesSchema.items()
+        }
+        self.assertEqual(self._resizerConfig(schema).size_fingerprints(), fingerprints)
+
+        # options that change the output change every size
+        resizerConfig.optimize_resized = True
+        self.assertNotEqual(resizerConfig.size_fingerprint("t2"), fingerprints["t2"])
+
+    def test_diff(self):
+        resizerConfig_old = self._resizerConfig(resizesSchema)
+        schema = copy.deepcopy(resizesSchema)
+        schema["t2"]["save_quality"] = 10
+        resizerConfig_new = self._resizerConfig(schema)
+        diff = resizerConfig_new.diff(resizerConfig_old)
+        self.assertTrue(diff)
+        self.assertEqual(diff.changed, ["t2"])
+        self.assertEqual(diff.regenerate, ["t2"])
+        self.assertEqual(diff.added, [])
+        self.assertEqual(diff.removed, [])
+        self.assertEqual(len(diff.unchanged), len(selected_resizes) - 1)
+
+        # added and removed sizes
+        resizerConfig_new.selected_resizes = ["thumb1", "t2", "t4"]
+        previous = resizerConfig_old.size_fingerprints(["t2", "t4", "t5"])
+        diff = resizerConfig_new.diff(previous)
+        self.assertEqual(diff.added, ["thumb1"])
+        self.assertEqual(diff.changed, ["t2"])
+        self.assertEqual(diff.removed, ["t5"])
+        self.assertEqual(diff.regenerate, ["t2", "thumb1"])
+
+        self.assertFalse(resizerConfig_old.diff(resizerConfig_old))
+
+    def test_manifest(self):
+        s3_client = FakeS3Client()
+        saverConfig = newSaverConfig()
+        saverConfig.write_manifest = True
+        saverManager = newSaverManager_FakeS3(s3_client, saverConfig=saverConfig)
+        resizer = imagehelper.resizer.Resizer(resizerConfig=saverManager._resizerConfig)
+        saverManager.files_save(resizer.resize(imagefile=get_imagefile()), "123")
+
+        manifest = saverManager.manifest_load("123")
+        self.assertEqual(
+            manifest["size_fingerprints"],
+            saverManager._resizerConfig.size_fingerprints(),
+        )
+        self.assertEqual(
+            manifest["files"]["t4"]["fingerprint"],
+            saverManager._resizerConfig.size_fingerprint("t4"),
+        )
+        self.assertNotIn("fingerprint", manifest["files"]["@archive"])
+        self.assertFalse(saverManager.manifest_diff("123"))
+
+        schema = copy.deepcopy(resizesSchema)
+        schema["t4"]["width"] = 10
+        saverManager._resizerConfig = self._resizerConfig(schema)
+        self.assertEqual(saverManager.manifest_diff("123").regenerate, ["t4"])
+
+
+class TestRebuild(unittest.TestCase):
+    sizes = ["thumb1", "t4"]
+
+    def _config(self, directory, schema, name="config.json"):
+        config = {
+            "resizesSchema": {size: schema[size] for size in self.sizes},
+            "optimize_original": False,
+            "optimize_resized": False,
+            "saver": {
+                "type": "localfile",
+                "filedir": directory,
+                "archive_original": True,
+            },
+        }
+        path = os.path.join(directory, name)
+        with open(path, "w") as fh:
+            json.dump(config, fh)
+        return path
+
+    def _save_originals(self, config_path, guids):
+        config = commands.config_load(config_path)
+        resizerConfig = commands.resizerConfig_from_config(config)
+        saverManager = commands.saverManager_from_config(config, resizerConfig)
+        for guid in guids:
+            resizer = imagehelper.resizer.Resizer(resizerConfig=resizerConfig)
+            saverManager.files_save(resizer.resize(imagefile=get_imagefile()), guid)
+
+    def _run(self, argv):
+        stdout = io.StringIO()
+        stderr = io.StringIO()
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            status = rebuild.main(argv)
+        if not stdout.getvalue():
+            return (status, None)
+        return (status, json.loads(stdout.getvalue()))
+
+    def test_localfile(self):
+        with tempfile.TemporaryDirectory() as directory:
+            config_old = self._config(directory, resizesSchema, "old.json")
+            self._save_originals(config_old, ["a", "b"])
+            path_t4 = os.path.join(directory, "public", "a---t4.png")
+            path_thumb1 = os.path.join(directory, "public", "a.jpg")
+            mtime_thumb1 = os.stat(path_thumb1).st_mtime_ns
+
+            schema = copy.deepcopy(resizesSchema)
+            schema["t4"]["width"] = schema["t4"]["height"] = 60
+            config_new = self._config(directory, schema, "new.json")
+            checkpoint = os.path.join(directory, "checkpoint")
+            argv = [
+                config_new,
+                "--changed-from",
+                config_old,
+                "--checkpoint",
+                checkpoint,
+                "--workers",
+                "1",
+            ]
+            (status, stats) = self._run(argv)
+            self.assertEqual(status, 0)
+            self.assertEqual(stats["sizes"], ["t4"])
+            self.assertEqual((stats["rebuilt"], stats["skipped"]), (2, 0))
+            with Image.open(path_t4) as pilObject:
+                self.assertEqual(pilObject.size, (60, 60))
+            # unchanged sizes are not rendered
+            self.assertEqual(os.stat(path_thumb1).st_mtime_ns, mtime_thumb1)
+
+            # a resumed job skips finished guids
+            (status, stats) = self._run(argv)
+            self.assertEqual((stats["rebuilt"], stats["skipped"]), (0, 2))
+
+            # a different job can not use the checkpoint
+            (status, stats) = self._run(argv[:1] + argv[3:])
+            self.assertEqual(status, 2)
+            self.assertIsNone(stats)
+
+    def test_checkpoint(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "checkpoint")
+            checkpoint = rebuild.Checkpoint(path, "job")
+            checkpoint.add("a")
+            checkpoint.close()
+            # a killed job left a partial line
+            with open(path, "a") as fh:
+                fh.write("b")
+            checkpoint = rebuild.Checkpoint(path, "job")
+            self.assertEqual(checkpoint.done, {"a"})
+            checkpoint.add("c")
+            checkpoint.close()
+            self.assertEqual(rebuild.Checkpoint(path, "job").done, {"a", "c"})
+            with self.assertRaises(imagehelper.errors.ImageError_ConfigError):
+                rebuild.Checkpoint(path, "other")
+
+    def test_s3(self):
+        s3_client = FakeS3Client()
+        saverConfig = newSaverConfig()
+        saverConfig.write_manifest = True
+        saverManager = newSaverManager_FakeS3(s3_client, saverConfig=saverConfig)
+        resizerConfig = saverManager._resizerConfig
+        for guid in ("a", "b"):
+            resizer = imagehelper.resizer.Resizer(resizerConfig=resizerConfig)
+            saverManager.files_save(resizer.resize(imagefile=get_imagefile()), guid)
+        manifest = saverManager.manifest_load("a")
+
+        s3_client.calls = []
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+            stats = rebuild.rebuild(
+                resizerConfig, saverManager, ["t4"], executor=executor
+            )
+        self.assertEqual(stats.as_dict()["rebuilt"], 2)
+        uploaded = sorted(
+            key for (method, bucket, key) in s3_client.calls if method == "put_object"
+        )
+        self.assertEqual(
+            uploaded,
+            ["a---t4.png", "a.manifest.json", "b---t4.png", "b.manifest.json"],
+        )
+        # the manifest keeps the sizes which were not rendered
+        self.assertEqual(saverManager.manifest_load("a")["files"], manifest["files"])
+
+    def test_s3__files_delete_by_guid(self):
+        # a rebuild of every size keeps the archive in the manifest
+        for content_addressed in (False, True):
+            with self.subTest(content_addressed=content_addressed):
+                s3_client = FakeS3Client()
+                saverConfig = newSaverConfig()
+                saverConfig.write_manifest = True
+                saverConfig.archive_content_addressed = content_addressed
+                saverManager = newSaverManager_FakeS3(
+                    s3_client, saverConfig=saverConfig
+                )
+                resizerConfig = saverManager._resizerConfig
+                resizer = imagehelper.resizer.Resizer(resizerConfig=resizerConfig)
+                saverManager.files_save(resizer.resize(imagefile=get_imagefile()), "a")
+                manifest = saverManager.manifest_load("a")
+
+                with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+                    stats = rebuild.rebuild(
+                        resizerConfig,
+                        saverManager,
+                        resizerConfig.selected_resizes,
+                        executor=executor,
+                    )
+                self.assertEqual(stats.as_dict()["rebuilt"], 1)
+                self.assertEqual(
+                    sorted(saverManager.manifest_load("a")["files"].keys()),
+                    sorted(manifest["files"].keys()),
+                )
+
+                self.assertEqual(saverManager.files_delete_by_guid("a"), {})
+                remaining = list(s3_client.objects.keys())
+                if content_addressed:
+                    # shared by other guids; only the pointer is deleted
+                    archive = manifest["files"]["@archive"]
+                    self.assertEqual(remaining, [(archive["bucket"], archive["key"])])
+                else:
+                    self.assertEqual(remaining, [])
+
+
+class TestResizeCommand(unittest.TestCase):
+    def _run(self, argv):
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            status = resize.main(argv)
+        return (status, json.loads(stdout.getvalue()))
+
+    def _inputs(self, directory):
+        directory_in = os.path.join(directory, "in")
+        os.mkdir(directory_in)
+
+        shutil.copy("tests/test-data/henry.jpg", directory_in)
+        Image.new("RGB", (300, 200), (0, 128, 255)).save(
+            os.path.join(directory_in, "blue.png")
+        )
+        with open(os.path.join(directory_in, "invalid.png"), "wb") as fh:
+            fh.write(b"not an image")
+        return directory_in
+
+    def _schema(self, directory):
+        # a bare `ResizesSchema`
+        path = os.path.join(directory, "schema.json")
+        with open(path, "w") as fh:
+            json.dump(
+                {"thumb1": resizesSchema["thumb1"], "t4": resizesSchema["t4"]}, fh
+            )
+        return path
+
+    def test_resize(self):
+        with tempfile.TemporaryDirectory() as directory:
+            directory_in = self._inputs(directory)
+            directory_out = os.path.join(directory, "out")
+            argv = [
+                self._schema(directory),
+                directory_in,
+                "--output",
+                directory_out,
+                "--workers",
+                "1",
+                "--no-optimize",
+                "--json",
+            ]
+            (status, stats) = self._run(argv)
+            self.assertEqual(status, 1)
+            self.assertEqual(stats["saved"], 2)
+            self.assertEqual(
+                list(stats["failed"].keys()), [directory_in + "/invalid.png"]
+            )
+            self.assertGreater(stats["images_per_second"], 0)
+            self.assertEqual(
+                sorted(stats["stage_seconds"].keys()),
+                ["decode", "read", "resize", "save"],
+            )
+            self.assertEqual(
+                sorted(os.listdir(os.path.join(directory_out, "public"))),
+                ["blue---t4.png", "blue.jpg", "henry---t4.png", "henry.jpg"],
+            )
+
+    def test_dry_run(self):
+        with tempfile.TemporaryDirectory() as directory:
+            directory_in = self._inputs(directory)
+            directory_out = os.path.join(directory, "out")
+            argv = [
+                self._schema(directory),
+                os.path.join(directory_in, "*.jpg"),
+                "--output",
+                directory_out,
+                "--workers",
+                "1",
+                "--sizes",
+                "t4",
+                "--dry-run",
+                "--json",
+            ]
+            (status, stats) = self._run(argv)
+            self.assertEqual(status, 0)
+            self.assertEqual(stats["saved"], 1)
+            self.assertFalse(os.path.exists(directory_out))
+
+    def test_archive(self):
+        with tempfile.TemporaryDirectory() as directory:
+            directory_in = self._inputs(directory)
+            directory_out = os.path.join(directory, "out")
+            config = os.path.join(directory, "config.json")
+            with open(config, "w") as fh:
+                json.dump(
+                    {
+                        "resizesSchema": {"t4": resizesSchema["t4"]},
+                        "saver": {"filedir": directory_out, "archive_original": True},
+                    },
+                    fh,
+                )
+            (status, stats) = self._run(
+                [config, os.path.join(directory_in, "*.*g"), "--workers", "1", "--json"]
+            )
+            self.assertEqual(status, 1)
+            self.assertEqual(stats["saved"], 2)
+            # a PNG original is still readable after its resizer is gone
+            self.assertEqual(
+                sorted(os.listdir(os.path.join(directory_out, "archive"))),
+                ["blue.png", "henry.jpg"],
+            )
+
+            # the flag overrides the config
+            shutil.rmtree(directory_out)
+            (status, stats) = self._run(
+                [
+                    config,
+                    os.path.join(directory_in, "*.*g"),
+                    "--workers",
+                    "1",
+                    "--no-archive-original",
+                    "--json",
+                ]
+            )
+            self.assertEqual(stats["saved"], 2)
+            self.assertFalse(os.path.exists(os.path.join(directory_out, "archive")))
+
+    def test_config_localfile(self):
+        config_s3 = {"saver": {"type": "s3", "bucket_public_name": AWS_BUCKET_PUBLIC}}
+        self.assertEqual(
+            resize.config_localfile(config_s3, output="out")["saver"],
+            {"type": "localfile", "archive_original": False, "filedir": "out"},
+        )
+        # the other options are kept
+        config = {"saver": {"archive_original": True}, "optimize_resized": False}
+        self.assertEqual(
+            resize.config_localfile(config),
+            {
+                "saver": {
+                    "type": "localfile",
+                    "archive_original": True,
+                    "filedir": resize.DEFAULT_OUTPUT,
+                },
+                "optimize_resized": False,
+            },
+        )